@@ -1,212 +1,226 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, has_app_context, stream_with_context
 import sqlite3
 import datetime
+import base64
+import hmac
+import json
+import queue
+import threading
 import os
+from collections import namedtuple
 from dotenv import load_dotenv
-import openai
+from jinja2 import FileSystemBytecodeCache
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import db
+import group_commit
+import password_service
+import mood_rollups
+import mood_search
+import population_rollups
+import schema
+import export
+import safety_matcher
+import recommendations
+import questionnaires
+import screenings
+import conversation_store
+import prompt_builder
+import chat_client
+import chat_cache
+import chat_gateway
+import assets
+import metrics
+import page_cache
+import session_store
+import ratelimit_storage  # noqa: F401  registers the sqlite:// limiter storage
 
 
-load_dotenv()
-
-PHQ9_QUESTIONS = [
-    "Little interest or pleasure in doing things?",
-    "Feeling down, depressed, or hopeless?",
-    "Trouble falling/staying asleep, or sleeping too much?",
-    "Feeling tired or having little energy?",
-    "Poor appetite or overeating?",
-    "Feeling bad about yourself - worthlessness?",
-    "Trouble concentrating on things?",
-    "Moving/speaking slowly or being fidgety?",
-    "Thoughts of self-harm or suicide?"
-]
-
-GAD7_QUESTIONS = [
-    "Feeling nervous, anxious, or on edge?",
-    "Not being able to stop worrying?",
-    "Worrying too much about different things?",
-    "Trouble relaxing?",
-    "Being so restless it's hard to sit still?",
-    "Becoming easily annoyed/irritable?",
-    "Feeling afraid of something awful happening?"
-]
-
-def get_phq9_recommendation(score):
-    if score <= 4:
-        return {
-            "severity": "Minimal Depression",
-            "recommendations": [
-                "Daily Practice: Maintain mood journaling with focus on positive experiences",
-                "Behavioral Activation: Schedule 1 pleasurable activity daily (e.g., 15-min walk, creative hobby)",
-                "Sleep Hygiene: Consistent sleep schedule (7-9 hours), no screens 1 hour before bed",
-                "Social Connection: Weekly social activity with friends/family",
-                "Monitoring: Retake PHQ-9 in 2 weeks or if symptoms worsen"
-            ]
-        }
-    elif score <= 9:
-        return {
-            "severity": "Mild Depression",
-            "recommendations": [
-                "Structured Program: 6-week online CBT program (30 mins/day) focusing on cognitive restructuring",
-                "Behavioral Activation: Graded task scheduling starting with small achievable goals",
-                "Physical Activity: 150 mins/week moderate exercise (e.g., brisk walking, yoga)",
-                "Social Prescription: Join local peer support group meeting weekly",
-                "Professional Check-in: Consult GP for baseline health check within 2 weeks"
-            ]
-        }
-    elif score <= 14:
-        return {
-            "severity": "Moderate Depression",
-            "recommendations": [
-                "Therapist Referral: Weekly CBT sessions for 8-12 weeks (45 mins/session)",
-                "Medication Options: Discuss SSRI antidepressants with psychiatrist",
-                "Safety Plan: Create crisis plan including emergency contacts",
-                "Workplace Support: Request occupational health assessment",
-                "Monitoring: Weekly PHQ-9 tracking with automatic alerts to designated contact"
-            ]
-        }
-    elif score <= 19:
-        return {
-            "severity": "Moderately Severe Depression",
-            "recommendations": [
-                "Urgent Care: Same-day mental health team assessment",
-                "Combination Therapy: SSRI medication + twice-weekly therapy sessions",
-                "Daily Check-ins: Automated safety check system with crisis team",
-                "Functional Support: Apply for temporary disability accommodations",
-                "Crisis Plan: 24/7 access to crisis hotline and emergency contacts"
-            ]
-        }
-    else:
-        return {
-            "severity": "Severe Depression",
-            "recommendations": [
-                "Immediate Care: Emergency psychiatric evaluation within 24 hours",
-                "Intensive Treatment: Consider day program or inpatient care",
-                "Medication Management: Daily monitoring of antidepressant regimen",
-                "Social Support: Activate caregiver support network",
-                "Safety Protocol: Remove access to potential self-harm means"
-            ]
-        }
-
-def get_gad7_recommendation(score):
-    if score <= 4:
-        return {
-            "severity": "Minimal Anxiety",
-            "recommendations": [
-                "Preventive Practice: Daily 10-min mindfulness breathing exercises",
-                "Worry Management: Scheduled 15-min 'worry time' with journaling",
-                "Stress Reduction: Progressive muscle relaxation before bed",
-                "Lifestyle Balance: Maintain consistent work/leisure ratio",
-                "Education: Complete online anxiety psychoeducation course"
-            ]
-        }
-    elif score <= 9:
-        return {
-            "severity": "Mild Anxiety",
-            "recommendations": [
-                "CBT Tools: 8-week anxiety workbook with weekly exercises",
-                "Exposure Therapy: Gradual hierarchy practice for top 3 fears",
-                "Sleep Protocol: Implement strict caffeine curfew (none after 2pm)",
-                "Physical Regulation: Daily diaphragmatic breathing (4-7-8 technique)",
-                "Social Support: Bi-weekly anxiety management workshop"
-            ]
-        }
-    elif score <= 14:
-        return {
-            "severity": "Moderate Anxiety",
-            "recommendations": [
-                "Specialist Referral: Weekly therapy (CBT or ACT) for 12 weeks",
-                "Medication Options: Consider short-term anxiolytic use",
-                "Workplace Adjustments: Flexible hours during treatment phase",
-                "Sensory Regulation: Daily weighted blanket use (20 mins)",
-                "Crisis Prevention: Install panic button app with GPS alerts"
-            ]
-        }
-    else:
-        return {
-            "severity": "Severe Anxiety",
-            "recommendations": [
-                "Immediate Intervention: Daily therapist check-ins for 1 week",
-                "Medication Plan: SSRI/SNRI trial with weekly psychiatrist reviews",
-                "Functional Support: Temporary medical leave authorization",
-                "Safety Measures: 24/7 crisis text line integration",
-                "Intensive Program: 4-week anxiety disorder day treatment"
-            ]
-        }
-
 app = Flask(__name__)
 
-# Ensure we have a secure key or create a temporary one for development
-if os.getenv("SECRET_KEY"):
-    app.secret_key = os.getenv("SECRET_KEY")
-else:
-    # For development only - do not use in production
-    app.secret_key = 'dev-temporary-key-for-testing-only'
-    print("WARNING: Using temporary development key. Set SECRET_KEY in .env for production.")
-
-app.config.update(
-    SECRET_KEY=os.getenv("SECRET_KEY", 'dev-key'),
-    SESSION_COOKIE_SECURE=False,  # True in production
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SAMESITE='Lax',
-    PERMANENT_SESSION_LIFETIME=3600  # 1 hour
-)
+def load_config():
+    """Settings from the environment (and .env), the defaults for create_app()."""
+    load_dotenv()
+    return dict(
+        SECRET_KEY=os.getenv('SECRET_KEY'),
+        SESSION_COOKIE_SECURE=False,  # True in production
+        SESSION_COOKIE_HTTPONLY=True,
+        SESSION_COOKIE_SAMESITE='Lax',
+        PERMANENT_SESSION_LIFETIME=3600,  # 1 hour
+        JINJA_CACHE_DIR=os.getenv('JINJA_CACHE_DIR') or None,
+        DATABASE=os.getenv('DATABASE_PATH', 'mental_health.db'),
+        DB_POOL_SIZE=int(os.getenv('DB_POOL_SIZE', 8)),
+        WRITE_MODE=os.getenv('WRITE_MODE', 'direct'),  # 'group' for group commit
+        GROUP_COMMIT_DELAY_MS=float(os.getenv('GROUP_COMMIT_DELAY_MS', 2)),
+        # Counters live in a SQLite file so every worker on the host shares them;
+        # use memory:// for a single-process dev server
+        RATELIMIT_STORAGE_URI=os.getenv('RATELIMIT_STORAGE_URI', 'sqlite:///ratelimit.db'),
+        RATELIMIT_STRATEGY=os.getenv('RATELIMIT_STRATEGY', 'sliding-window-counter'),
+        PASSWORD_HASH_METHOD=os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'),
+        PASSWORD_WORKERS=int(os.getenv('PASSWORD_WORKERS', 2)),  # 0 hashes inline
+        PASSWORD_MAX_PENDING=int(os.getenv('PASSWORD_MAX_PENDING', 64)),
+        OPENAI_API_KEY=os.getenv('OPENAI_API_KEY'),
+        OPENAI_BASE_URL=os.getenv('OPENAI_BASE_URL'),
+        OPENAI_MAX_CONNECTIONS=int(os.getenv('OPENAI_MAX_CONNECTIONS', 20)),
+        CHAT_MAX_CONCURRENCY=int(os.getenv('CHAT_MAX_CONCURRENCY', 4)),
+        CHAT_MAX_QUEUE=int(os.getenv('CHAT_MAX_QUEUE', 16)),
+        CHAT_JOB_DATABASE=os.getenv('CHAT_JOB_DATABASE', 'chat_jobs.db'),
+        # Request threads per worker process (e.g. gunicorn --threads); at most
+        # half of them may wait on a chat answer
+        WEB_THREADS=int(os.getenv('WEB_THREADS', 8)),
+        CHAT_CACHE=os.getenv('CHAT_CACHE', 'off'),  # 'memory' or 'sqlite' to enable
+        CHAT_CACHE_SIZE=int(os.getenv('CHAT_CACHE_SIZE', 1024)),
+        CHAT_CACHE_TTL=int(os.getenv('CHAT_CACHE_TTL', 86400)),
+        CHAT_PROMPT_BUDGET=int(os.getenv('CHAT_PROMPT_BUDGET', 1500)),  # tokens per prompt, reply excluded
+        CHAT_HISTORY_MESSAGES=int(os.getenv('CHAT_HISTORY_MESSAGES', 40)),
+        PAGE_CACHE_SIZE=int(os.getenv('PAGE_CACHE_SIZE', 256)),
+        PAGE_CACHE_MAX_AGE=int(os.getenv('PAGE_CACHE_MAX_AGE', 300)),
+        SESSION_STORE=os.getenv('SESSION_STORE', 'sqlite'),  # 'cookie' for Flask's signed cookie
+        SESSION_DATABASE=os.getenv('SESSION_DATABASE', 'sessions.db'),
+        SESSION_CACHE_SIZE=int(os.getenv('SESSION_CACHE_SIZE', 1024)),
+        MOOD_INSIGHTS_CACHE_SIZE=int(os.getenv('MOOD_INSIGHTS_CACHE_SIZE', 256)),
+        SCREENING_BATCH_MAX_ROWS=int(os.getenv('SCREENING_BATCH_MAX_ROWS', 10000)),
+        SCREENING_MAX_BYTES=int(os.getenv('SCREENING_MAX_BYTES', 2 * 1024 * 1024)),
+        SLOW_REQUEST_MS=float(os.getenv('SLOW_REQUEST_MS', 0)),  # 0 disables the slow-request log
+        METRICS_TOKEN=os.getenv('METRICS_TOKEN'),  # unset limits /metrics to loopback clients
+        CLINICAL_API_TOKEN=os.getenv('CLINICAL_API_TOKEN'),  # unset disables /api/population and /api/screenings
+        SAFETY_LEXICON=os.getenv('SAFETY_LEXICON') or os.path.join(app.root_path, 'safety_lexicon.json'),
+        SAFETY_RELOAD_SECONDS=float(os.getenv('SAFETY_RELOAD_SECONDS', 5)),  # 0 disables hot reload
+    )
 
+# Registered before the limiter so rejected requests are timed as well
+metrics.init_app(app)
+db.init_app(app)
+
+def count_rate_limit_breach(request_limit):
+    metrics.RATELIMIT_REJECTIONS.inc(request.endpoint or 'unmatched')
+
+# Storage and strategy come from RATELIMIT_* in the config at create_app()
 limiter = Limiter(
-    app=app,
     key_func=get_remote_address,
-    default_limits=["300 per minute"]
+    default_limits=["300 per minute"],
+    on_breach=count_rate_limit_breach
 )
 
 @app.after_request
 def add_rate_limit_headers(response):
-    if limiter.current_limit:
-        response.headers["X-RateLimit-Limit"] = str(limiter.current_limit.limit)
-        response.headers["X-RateLimit-Remaining"] = str(limiter.current_limit.remaining)
-        response.headers["X-RateLimit-Reset"] = str(limiter.current_limit.reset_at)
+    current = limiter.current_limit
+    if current:
+        response.headers["X-RateLimit-Limit"] = str(current.limit)
+        response.headers["X-RateLimit-Remaining"] = str(current.remaining)
+        response.headers["X-RateLimit-Reset"] = str(current.reset_at)
     return response
 
-DATABASE = 'mental_health.db'
+static_assets = assets.Assets()
+pages = page_cache.PageCache()
+
+# Built from the config by create_app()
+passwords = None
+safety_gate = None
+upstream = None
+gateway = None
+
+def create_app(config=None):
+    """Configure the app from the environment plus ``config`` and return it.
+
+    Runs once per process: it builds the services the views share and brings
+    the database schema up to date. The OpenAI SDK and NumPy are not imported
+    here; the first chat and insights requests load them.
+    """
+    global passwords, safety_gate, upstream, gateway
+    if app.extensions.get('configured'):
+        raise RuntimeError('create_app() has already configured this app')
+    app.config.update(load_config())
+    app.config.update(config or {})
+
+    if not app.config['SECRET_KEY']:
+        # For development only - do not use in production
+        app.config['SECRET_KEY'] = 'dev-temporary-key-for-testing-only'
+        print("WARNING: Using temporary development key. Set SECRET_KEY in .env for production.")
+
+    # Compiled templates are kept on disk so new workers skip recompiling them
+    app.jinja_options = {
+        **app.jinja_options,
+        'bytecode_cache': FileSystemBytecodeCache(app.config['JINJA_CACHE_DIR']),
+    }
+    app.add_template_global(static_assets.url, 'asset_url')
+
+    limiter.init_app(app)
+    if app.config['SESSION_STORE'] == 'sqlite':
+        app.session_interface = session_store.ServerSessionInterface(session_store.SQLiteSessionStore(
+            app.config['SESSION_DATABASE'], cache_size=app.config['SESSION_CACHE_SIZE']))
+    pages.max_entries = app.config['PAGE_CACHE_SIZE']
+
+    # Hash/verify run in a bounded process pool, started on first use
+    passwords = password_service.PasswordService(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        max_workers=app.config['PASSWORD_WORKERS'],
+        max_pending=app.config['PASSWORD_MAX_PENDING']
+    )
+    safety_gate = safety_matcher.SafetyGate(app.config['SAFETY_LEXICON'],
+                                            check_interval=app.config['SAFETY_RELOAD_SECONDS'])
+    # Shared by every chat request so connections are kept alive between calls
+    upstream = chat_client.UpstreamClient(
+        api_key=app.config['OPENAI_API_KEY'],
+        base_url=app.config['OPENAI_BASE_URL'],
+        timeout=10,  # 10 second timeout
+        max_connections=app.config['OPENAI_MAX_CONNECTIONS']
+    )
+    # Caps concurrent upstream calls across the process; see chat_gateway
+    gateway = chat_gateway.ChatGateway(
+        chat_gateway.SQLiteJobStore(app.config['CHAT_JOB_DATABASE']),
+        chat_error,
+        max_workers=app.config['CHAT_MAX_CONCURRENCY'],
+        max_queue=app.config['CHAT_MAX_QUEUE'],
+        max_blocking=max(1, app.config['WEB_THREADS'] // 2)
+    )
+
+    with app.app_context():
+        init_db()
+    app.extensions['configured'] = True
+    return app
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Inside a request this is the pooled connection for the app context;
+    # it is returned to the pool on teardown, so callers must not close it.
+    if has_app_context():
+        return db.get_db()
+    return db.connect(app.config['DATABASE'])
+
+def run_write(fn):
+    """Run ``fn(conn)`` in its own transaction and return its result.
+
+    With WRITE_MODE=group the write is handed to the group-commit writer and
+    this returns once the group holding it has committed; otherwise it runs
+    on the request's pooled connection and commits immediately.
+    """
+    if app.config['WRITE_MODE'] == 'group':
+        return get_group_writer().submit(fn)
+    conn = get_db_connection()
+    with conn:
+        return fn(conn)
+
+def get_group_writer():
+    if 'group_writer' not in app.extensions:
+        with _group_writer_lock:
+            if 'group_writer' not in app.extensions:
+                app.extensions['group_writer'] = group_commit.GroupCommitWriter(
+                    app.config['DATABASE'],
+                    max_delay=app.config['GROUP_COMMIT_DELAY_MS'] / 1000)
+    return app.extensions['group_writer']
+
+_group_writer_lock = threading.Lock()
 
 def init_db():
-    with get_db_connection() as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS assessments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                assessment_type TEXT CHECK(assessment_type IN ('phq9', 'gad7')) NOT NULL,
-                score INTEGER NOT NULL CHECK(score >= 0),
-                recommendation TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS mood_entries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                mood INTEGER NOT NULL CHECK(mood BETWEEN 1 AND 5),
-                notes TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+    return schema.init_db(get_db_connection())
+
+@app.errorhandler(password_service.PasswordServiceBusy)
+def password_service_busy(e):
+    message = 'We are handling a lot of sign-ins right now. Please try again in a moment.'
+    if request.endpoint in ('login', 'signup'):
+        flash(message)
+        return render_template(f'{request.endpoint}.html'), 503
+    return render_template('error.html', error_message=message), 503
 
 def login_required(f):
     def decorated_function(*args, **kwargs):
@@ -217,6 +231,18 @@ def login_required(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
+def clinical_token_required(f):
+    """Bearer-token access for clinical endpoints; off until CLINICAL_API_TOKEN is set."""
+    def decorated_function(*args, **kwargs):
+        token = app.config['CLINICAL_API_TOKEN']
+        if not token:
+            return jsonify({'error': 'Not found'}), 404
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
@@ -228,24 +254,72 @@ def signup():
         if not username or not email or not password:
             error = 'All fields are required.'
         
-        with get_db_connection() as conn:
-            try:
-                if error is None:
-                    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
-                    conn.execute('''
-                        INSERT INTO users (username, email, password)
-                        VALUES (?, ?, ?)
-                    ''', (username, email, hashed_password))
-                    conn.commit()
-                    flash('Account created successfully! Please log in.')
-                    return redirect(url_for('login'))
-            except sqlite3.IntegrityError:
-                error = 'Username or email already exists.'
-            finally:
-                if error:
-                    flash(error)
+        try:
+            if error is None:
+                hashed_password = passwords.hash(password)
+                run_write(lambda conn: conn.execute('''
+                    INSERT INTO users (username, email, password)
+                    VALUES (?, ?, ?)
+                ''', (username, email, hashed_password)))
+                flash('Account created successfully! Please log in.')
+                return redirect(url_for('login'))
+        except sqlite3.IntegrityError:
+            error = 'Username or email already exists.'
+        finally:
+            if error:
+                flash(error)
     return render_template('signup.html')
 
+metrics.registry.snapshot_histogram(
+    'openai_request_duration_seconds', 'Latency of each OpenAI API attempt.',
+    lambda: upstream.latency.snapshot())
+metrics.registry.snapshot_histogram(
+    'group_commit_duration_seconds', 'Time to apply and commit one write group.',
+    lambda: (app.extensions['group_writer'].commit_latency.snapshot()
+             if 'group_writer' in app.extensions else None))
+GATEWAY_CALLS = metrics.registry.gauge(
+    'chat_gateway_calls', 'Chat calls held by the gateway.', labels=('state',))
+BREAKER_OPEN = metrics.registry.gauge(
+    'openai_circuit_open', 'Whether the OpenAI circuit breaker is open (1) or not (0).')
+
+@metrics.registry.collector
+def collect_chat_gauges():
+    stats = gateway.stats()
+    GATEWAY_CALLS.set(stats['in_flight'], 'in_flight')
+    GATEWAY_CALLS.set(stats['queued'], 'queued')
+    BREAKER_OPEN.set(int(upstream.breaker.state != chat_client.CircuitBreaker.CLOSED))
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+def metrics_token_required(f):
+    """Bearer METRICS_TOKEN for operational endpoints; without one, loopback clients only."""
+    def decorated_function(*args, **kwargs):
+        token = app.config['METRICS_TOKEN']
+        if token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                return jsonify({'error': 'Unauthorized'}), 401
+        # A proxy on the same host also connects from loopback, but adds X-Forwarded-For
+        elif request.remote_addr not in LOOPBACK_ADDRESSES or 'X-Forwarded-For' in request.headers:
+            return jsonify({'error': 'Forbidden; set METRICS_TOKEN to allow remote access'}), 403
+        return f(*args, **kwargs)
+    decorated_function.__name__ = f.__name__
+    return decorated_function
+
+@app.route('/metrics')
+@limiter.exempt
+@metrics_token_required
+def prometheus_metrics():
+    return app.response_class(metrics.registry.render(),
+                              mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/writer-stats')
+@metrics_token_required
+def debug_writer_stats():
+    """Group-commit writer counters; same access rule as /metrics."""
+    if app.config['WRITE_MODE'] != 'group':
+        return jsonify({'write_mode': app.config['WRITE_MODE']})
+    return jsonify({'write_mode': 'group', **get_group_writer().stats()})
+
 @app.route('/debug/login-form')
 def debug_login_form():
     return render_template('login.html')
@@ -265,10 +339,16 @@ def login():
 
         if user is None:
             error = 'Invalid username.'
-        elif not check_password_hash(user['password'], password):
+        elif not passwords.verify(user['password'], password):
             error = 'Invalid password.'
 
         if error is None:
+            # Upgrade hashes made with an older algorithm or cost while the
+            # plaintext is at hand
+            if passwords.needs_rehash(user['password']):
+                new_hash = passwords.hash(password)
+                run_write(lambda conn: conn.execute(
+                    'UPDATE users SET password = ? WHERE id = ?', (new_hash, user['id'])))
             session.clear()
             session['user_id'] = user['id']
             session['username'] = user['username']
@@ -298,7 +378,7 @@ def profile():
                 'SELECT * FROM users WHERE id = ?', (session['user_id'],)
             ).fetchone()
 
-            if not check_password_hash(user['password'], old_password):
+            if not passwords.verify(user['password'], old_password):
                 error = 'Current password is incorrect.'
             
             existing_user = conn.execute(
@@ -322,7 +402,7 @@ def profile():
                 
                 if new_password:
                     update_fields.append('password = ?')
-                    params.append(generate_password_hash(new_password))
+                    params.append(passwords.hash(new_password))
                 
                 if update_fields:
                     query = 'UPDATE users SET ' + ', '.join(update_fields) + ' WHERE id = ?'
@@ -343,10 +423,12 @@ def profile():
     return render_template('profile.html', user=user)
 
 @app.route('/')
+@page_cache.cached_page(pages)
 def home():
     return render_template('index.html')
 
 @app.route('/resources')
+@page_cache.cached_page(pages)
 def resources():
     return render_template('resources.html')
 
@@ -355,23 +437,19 @@ def resources():
 @login_required
 def assessment(assessment_type=None):
     if not assessment_type:
-        return render_template('assessment.html')
+        return render_template('assessment.html', questionnaires=questionnaires.REGISTRY)
     
     try:
-        assessment_type = assessment_type.lower()
+        questionnaire = questionnaires.get(assessment_type)
+        if not questionnaire:
+            flash('Invalid assessment type')
+            return redirect(url_for('assessment'))
+        assessment_type = questionnaire.key
         
         if request.method == 'POST':
-            if assessment_type not in ['phq9', 'gad7']:
-                flash('Invalid assessment type')
-                return redirect(url_for('assessment'))
-            
-            questions = PHQ9_QUESTIONS if assessment_type == 'phq9' else GAD7_QUESTIONS
-            
-            # Validate and calculate score
-            total = 0
-            for i in range(1, len(questions)+1):
-                answer = request.form.get(f'q{i}', '0')
-                total += max(0, min(3, int(answer)))  # Ensure score stays 0-3 per question
+            # Validate and calculate score; each answer is clamped to the answer range
+            total = questionnaire.score(
+                int(request.form.get(f'q{i}', '0')) for i in range(1, len(questionnaire.items) + 1))
             
             # Store assessment in session for chat context
             session['last_assessment'] = {
@@ -379,25 +457,27 @@ def assessment(assessment_type=None):
                 'score': total,
                 'timestamp': datetime.datetime.now().isoformat()
             }
+            # A new result starts a new chat conversation
+            session.pop('conversation_id', None)
+
+            band = recommendations.lookup(assessment_type, total)
+            user_id = session['user_id']
 
-            with get_db_connection() as conn:
-                recommendation_func = get_phq9_recommendation if assessment_type == 'phq9' else get_gad7_recommendation
-                conn.execute('''
-                    INSERT INTO assessments (user_id, assessment_type, score, recommendation)
+            def insert_assessment(conn):
+                assessment_id = conn.execute('''
+                    INSERT INTO assessments (user_id, assessment_type, score, band_id)
                     VALUES (?, ?, ?, ?)
-                ''', (session['user_id'], assessment_type, total, str(recommendation_func(total))))
-                conn.commit()
+                ''', (user_id, assessment_type, total, band.id)).lastrowid
+                population_rollups.record_assessment(conn, assessment_id)
+
+            run_write(insert_assessment)
 
             return redirect(url_for('assessment_result', type=assessment_type, score=total))
 
-        if assessment_type not in ['phq9', 'gad7']:
-            flash('Invalid assessment type')
-            return redirect(url_for('assessment'))
-            
-        questions = PHQ9_QUESTIONS if assessment_type == 'phq9' else GAD7_QUESTIONS
         return render_template('assessment.html',
                             assessment_type=assessment_type,
-                            questions=enumerate(questions, 1))
+                            questionnaire=questionnaire,
+                            questions=enumerate(questionnaire.items, 1))
 
     except Exception as e:
         flash(f'Error processing assessment: {str(e)}')
@@ -407,40 +487,94 @@ def assessment(assessment_type=None):
 @login_required
 def assessment_result():
     try:
-        assessment_type = request.args.get('type', '').lower()
+        questionnaire = questionnaires.get(request.args.get('type'))
         score = int(request.args.get('score', 0))
         
-        # Validate score ranges
-        max_score = 27 if assessment_type == 'phq9' else 21
-        score = max(0, min(score, max_score))
-        
-        if assessment_type not in ['phq9', 'gad7']:
+        if not questionnaire:
             flash('Invalid assessment type')
             return redirect(url_for('home'))
+
+        # Validate score ranges
+        score = max(0, min(score, questionnaire.max_score))
         
-        recommendation_data = (get_phq9_recommendation(score) 
-                            if assessment_type == 'phq9' 
-                            else get_gad7_recommendation(score))
-        
-        # Store in session for chat context
-        session['current_recommendations'] = recommendation_data['recommendations']
-        
+        recommendation_data = recommendations.as_dict(recommendations.lookup(questionnaire.key, score))
+
         return render_template('assessment_result.html',
-                            assessment_type=assessment_type,
+                            assessment_type=questionnaire.key,
+                            questionnaire=questionnaire,
                             score=score,
-                            max_score=max_score,
+                            max_score=questionnaire.max_score,
                             recommendation=recommendation_data)
 
     except ValueError:
         flash('Invalid score parameter')
         return redirect(url_for('home'))
 
+MOOD_PAGE_SIZE = 20
+MOOD_PAGE_MAX = 100
+MOOD_CHART_DEFAULT_DAYS = 90
+MOOD_CHART_MAX_POINTS = 500
+MOOD_BATCH_MAX = 500
+# Deeper pages re-rank more matches each time; narrow the query or dates instead
+MOOD_SEARCH_MAX_OFFSET = 1000
+
+def get_mood_insights():
+    # Built on first use, so workers only import NumPy once insights are requested
+    if 'mood_insights' not in app.extensions:
+        with _mood_insights_lock:
+            if 'mood_insights' not in app.extensions:
+                import mood_analytics
+                app.extensions['mood_insights'] = mood_analytics.InsightsCache(
+                    max_users=app.config['MOOD_INSIGHTS_CACHE_SIZE'])
+    return app.extensions['mood_insights']
+
+_mood_insights_lock = threading.Lock()
+
+def loaded_mood_insights():
+    """The insights cache if it was built; until then writes have nothing to patch."""
+    return app.extensions.get('mood_insights')
+
+def encode_mood_cursor(entry):
+    raw = f"{entry['timestamp']}|{entry['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_mood_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    timestamp, entry_id = base64.urlsafe_b64decode(padded).decode().rsplit('|', 1)
+    return timestamp, int(entry_id)
+
+def fetch_mood_page(conn, user_id, before=None, limit=MOOD_PAGE_SIZE):
+    """Return one page of entries, newest first, and the cursor for the next.
+
+    Keyset pagination on (timestamp, id) so every page is an index range scan
+    on idx_mood_user_timestamp no matter how deep the user scrolls.
+    """
+    if before is None:
+        rows = conn.execute('''
+            SELECT id, mood, notes, timestamp
+            FROM mood_entries
+            WHERE user_id = ?
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', (user_id, limit + 1)).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT id, mood, notes, timestamp
+            FROM mood_entries
+            WHERE user_id = ? AND (timestamp, id) < (?, ?)
+            ORDER BY timestamp DESC, id DESC
+            LIMIT ?
+        ''', (user_id, *before, limit + 1)).fetchall()
+
+    next_cursor = encode_mood_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
 @app.route('/mood', methods=['GET', 'POST'])
 @login_required
 def mood():
     try:
         conn = get_db_connection()
-        
+
         if request.method == 'POST':
             mood = request.form.get('mood')
             notes = request.form.get('notes', '')
@@ -449,156 +583,717 @@ def mood():
                 flash('Please select a valid mood value (1-5)')
                 return redirect(url_for('mood'))
             
-            conn.execute('''
-                INSERT INTO mood_entries (user_id, mood, notes)
-                VALUES (?, ?, ?)
-            ''', (session['user_id'], int(mood), notes))
-            conn.commit()
-
-        entries = conn.execute('''
-            SELECT * FROM mood_entries 
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-        ''', (session['user_id'],)).fetchall()
-        
-        chart_data = conn.execute('''
-            SELECT timestamp, mood FROM mood_entries
-            WHERE user_id = ?
-            ORDER BY timestamp
-        ''', (session['user_id'],)).fetchall()
-        
-        dates = []
-        moods = []
-        for entry in chart_data:
-            try:
-                dt = datetime.datetime.strptime(entry['timestamp'], "%Y-%m-%d %H:%M:%S")
-                dates.append(dt.strftime("%Y-%m-%d"))
-                moods.append(entry['mood'])
-            except Exception as e:
-                print(f"Date processing error: {str(e)}")
+            user_id = session['user_id']
+
+            def insert_mood(conn):
+                entry = conn.execute('''
+                    INSERT INTO mood_entries (user_id, mood, notes)
+                    VALUES (?, ?, ?)
+                    RETURNING id, timestamp
+                ''', (user_id, int(mood), notes)).fetchone()
+                mood_rollups.record_mood(conn, entry['id'])
+                population_rollups.record_mood(conn, entry['id'])
+                return entry
+
+            entry = run_write(insert_mood)
+            insights = loaded_mood_insights()
+            if insights is not None:
+                insights.record_mood(user_id, entry['id'], entry['timestamp'], int(mood))
+
+        entries, next_cursor = fetch_mood_page(conn, session['user_id'])
+        chart = mood_rollups.chart_series(conn, session['user_id'], days=MOOD_CHART_DEFAULT_DAYS)
 
         return render_template('mood.html',
                             mood_entries=entries,
-                            dates=dates,
-                            moods=moods)
+                            next_cursor=next_cursor,
+                            chart=chart,
+                            chart_days=MOOD_CHART_DEFAULT_DAYS)
 
     except Exception as e:
         flash(f'Error accessing mood tracker: {str(e)}')
         return redirect(url_for('home'))
-    finally:
-        if conn:
-            conn.close()
+
+@app.route('/api/mood')
+@login_required
+def api_mood():
+    try:
+        limit = max(1, min(int(request.args.get('limit', MOOD_PAGE_SIZE)), MOOD_PAGE_MAX))
+        cursor = request.args.get('before')
+        before = decode_mood_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+
+    entries, next_cursor = fetch_mood_page(get_db_connection(), session['user_id'],
+                                           before=before, limit=limit)
+    return jsonify({
+        'entries': [
+            {'id': e['id'], 'mood': e['mood'], 'notes': e['notes'], 'timestamp': e['timestamp']}
+            for e in entries
+        ],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/mood/search')
+@login_required
+def api_mood_search():
+    """Search the user's notes, best matches first.
+
+    ``q`` is free text (every word must match, ``word*`` matches a prefix);
+    ``start``/``end`` are inclusive ``YYYY-MM-DD`` bounds. Pages are
+    addressed by ``offset``, and ``next_offset`` is null on the last one.
+    """
+    query = mood_search.build_query(request.args.get('q'))
+    if not query:
+        return jsonify({'error': 'Expected a search term in "q"'}), 400
+    try:
+        start, end = export.parse_date_range(request.args.get('start'), request.args.get('end'))
+        limit = max(1, min(int(request.args.get('limit', MOOD_PAGE_SIZE)), MOOD_PAGE_MAX))
+        offset = max(0, min(int(request.args.get('offset', 0)), MOOD_SEARCH_MAX_OFFSET))
+    except ValueError:
+        return jsonify({'error': 'Invalid search parameters'}), 400
+
+    rows, has_more = mood_search.search(get_db_connection(), session['user_id'], query,
+                                        start, end, limit=limit, offset=offset)
+    return jsonify({
+        'results': [
+            {'id': r['id'], 'mood': r['mood'], 'timestamp': r['timestamp'],
+             'snippet_html': mood_search.highlight(r['snippet'])}
+            for r in rows
+        ],
+        'next_offset': offset + limit if has_more and offset + limit <= MOOD_SEARCH_MAX_OFFSET else None
+    })
+
+def parse_mood_value(value):
+    # Same 1-5 rule as the /mood form, for form strings and JSON numbers alike
+    value = str(value) if isinstance(value, (int, str)) and not isinstance(value, bool) else ''
+    if not value.isdigit() or not (1 <= int(value) <= 5):
+        raise ValueError('mood must be an integer from 1 to 5')
+    return int(value)
+
+def parse_client_timestamp(value):
+    """Normalize an ISO 8601 client timestamp to the stored UTC format."""
+    dt = datetime.datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return dt.strftime('%Y-%m-%d %H:%M:%S')
+
+@app.route('/api/mood/batch', methods=['POST'])
+@login_required
+def api_mood_batch():
+    """Insert many offline mood entries in one transaction.
+
+    Expects ``{"entries": [{"mood", "timestamp", "key", "notes"?}, ...]}``.
+    ``key`` is the client's idempotency key: entries whose key was already
+    stored (or repeats within the batch) are reported as duplicates, so a
+    client can safely replay a batch after a dropped response.
+    """
+    data = request.get_json(silent=True)
+    entries = data.get('entries') if isinstance(data, dict) else None
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'Expected a non-empty "entries" list'}), 400
+    if len(entries) > MOOD_BATCH_MAX:
+        return jsonify({'error': f'At most {MOOD_BATCH_MAX} entries per batch'}), 413
+
+    user_id = session['user_id']
+    rows, errors, repeated = {}, [], []
+    for index, entry in enumerate(entries):
+        try:
+            if not isinstance(entry, dict):
+                raise ValueError('entry must be an object')
+            key = entry.get('key')
+            if not isinstance(key, str) or not 0 < len(key) <= 128:
+                raise ValueError('key must be a string of 1-128 characters')
+            notes = entry.get('notes') or ''
+            if not isinstance(notes, str):
+                raise ValueError('notes must be a string')
+            if not isinstance(entry.get('timestamp'), str):
+                raise ValueError('timestamp must be an ISO 8601 string')
+            row = (user_id, parse_mood_value(entry.get('mood')), notes,
+                   parse_client_timestamp(entry['timestamp']), key)
+            if key in rows:
+                repeated.append(key)
+            else:
+                rows[key] = row
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+
+    conn = get_db_connection()
+    keys = list(rows)
+    duplicates = set()
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        duplicates.update(row[0] for row in conn.execute(f'''
+            SELECT client_key FROM mood_entries
+            WHERE user_id = ? AND client_key IN ({', '.join('?' * len(chunk))})
+        ''', (user_id, *chunk)))
+    new_rows = [row for key, row in rows.items() if key not in duplicates]
+
+    def insert_batch(conn):
+        """Insert ``new_rows``; returns the keys a concurrent replay already stored."""
+        timestamps = [row[3] for row in new_rows]
+        weeks_before = population_rollups.mood_weeks(conn, user_id, timestamps)
+        ignored = []
+        for row in new_rows:
+            # rowcount excludes trigger changes, so it is 0 exactly when the key was taken
+            if conn.execute('''
+                INSERT OR IGNORE INTO mood_entries (user_id, mood, notes, timestamp, client_key)
+                VALUES (?, ?, ?, ?, ?)
+            ''', row).rowcount == 0:
+                ignored.append(row[4])
+        mood_rollups.refresh_buckets(conn, user_id, timestamps)
+        population_rollups.apply_mood_weeks(conn, user_id, weeks_before)
+        return ignored
+
+    if new_rows:
+        duplicates.update(run_write(insert_batch))
+        if len(duplicates) < len(rows):
+            insights = loaded_mood_insights()
+            if insights is not None:
+                insights.invalidate(user_id)
+
+    return jsonify({
+        'inserted': len(rows) - len(duplicates),
+        'duplicates': sorted(duplicates) + repeated,
+        'errors': errors
+    })
+
+@app.route('/api/mood/chart')
+@login_required
+def api_mood_chart():
+    try:
+        days = request.args.get('days', str(MOOD_CHART_DEFAULT_DAYS))
+        days = None if days == 'all' else max(1, int(days))
+        points = max(3, min(int(request.args.get('points', mood_rollups.DEFAULT_POINTS)),
+                            MOOD_CHART_MAX_POINTS))
+    except ValueError:
+        return jsonify({'error': 'Invalid chart parameters'}), 400
+
+    return jsonify(mood_rollups.chart_series(get_db_connection(), session['user_id'],
+                                             days=days, max_points=points))
+
+@app.route('/api/mood/insights')
+@login_required
+def api_mood_insights():
+    return jsonify(get_mood_insights().get(get_db_connection(), session['user_id']))
 
 @app.route('/delete_mood/<int:entry_id>', methods=['POST'])
 @login_required
 def delete_mood(entry_id):
     try:
-        with get_db_connection() as conn:
-            conn.execute('DELETE FROM mood_entries WHERE id = ? AND user_id = ?',
-                       (entry_id, session['user_id']))
-            conn.commit()
+        user_id = session['user_id']
+
+        def delete_entry(conn):
+            entry = conn.execute('SELECT timestamp FROM mood_entries WHERE id = ? AND user_id = ?',
+                                 (entry_id, user_id)).fetchone()
+            if entry:
+                weeks_before = population_rollups.mood_weeks(conn, user_id, [entry['timestamp']])
+                conn.execute('DELETE FROM mood_entries WHERE id = ? AND user_id = ?',
+                           (entry_id, user_id))
+                mood_rollups.remove_mood(conn, user_id, entry['timestamp'])
+                population_rollups.apply_mood_weeks(conn, user_id, weeks_before)
+            return entry is not None
+
+        if run_write(delete_entry):
+            insights = loaded_mood_insights()
+            if insights is not None:
+                insights.remove_mood(user_id, entry_id)
         flash('Entry deleted successfully')
     except Exception as e:
         flash('Error deleting entry')
     return redirect(url_for('mood'))
 
+@app.route('/export/<dataset>.<fmt>')
+@login_required
+@limiter.limit("10/minute")
+def export_data(dataset, fmt):
+    """Stream the user's mood or assessment history as CSV or NDJSON.
+
+    ``start`` and ``end`` (inclusive ``YYYY-MM-DD``) narrow the range; the
+    body is gzipped on the fly when the client accepts it.
+    """
+    if dataset not in export.DATASETS or fmt not in export.FORMATS:
+        return jsonify({'error': 'Unknown export'}), 404
+    try:
+        start, end = export.parse_date_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {e}'}), 400
+
+    gzip = request.accept_encodings['gzip'] > 0
+    chunks = export.stream(get_db_connection(), dataset, fmt, session['user_id'],
+                           start, end, gzip=gzip)
+    response = app.response_class(stream_with_context(chunks), mimetype=export.FORMATS[fmt])
+    filename = f'{dataset}-{datetime.date.today().isoformat()}.{fmt}'
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.vary.add('Accept-Encoding')
+    if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@app.route('/api/screenings/<questionnaire_key>', methods=['POST'])
+@clinical_token_required
+@login_required
+@limiter.limit("10/minute")
+def score_screenings(questionnaire_key):
+    """Validate, score and store a whole batch of questionnaire responses.
+
+    The body is CSV (``respondent,q1..qN``) or NDJSON (``{"respondent",
+    "answers"}`` per line), named by Content-Type. The batch is stored only if
+    every row is valid; otherwise the response lists the invalid rows. Scores,
+    bands and item flags come back in the upload's format. Needs both the
+    clinical API token and a login, which owns the stored batch.
+    """
+    questionnaire = questionnaires.get(questionnaire_key)
+    if not questionnaire:
+        return jsonify({'error': 'Unknown questionnaire'}), 404
+    fmt = next((name for name, mimetype in export.FORMATS.items()
+                if request.mimetype == mimetype), None)
+    if not fmt:
+        return jsonify({'error': f'Content-Type must be one of {", ".join(export.FORMATS.values())}'}), 415
+    max_bytes = app.config['SCREENING_MAX_BYTES']
+    body = request.stream.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        return jsonify({'error': f'Upload is larger than {max_bytes} bytes'}), 413
+    try:
+        text = body.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        return jsonify({'error': 'Upload must be UTF-8'}), 400
+
+    import bulk_scoring  # NumPy is only loaded once a batch arrives
+    try:
+        batch = bulk_scoring.score_upload(questionnaire, fmt, text, app.config['SCREENING_BATCH_MAX_ROWS'])
+    except OverflowError as e:
+        return jsonify({'error': str(e)}), 413
+    except bulk_scoring.BatchError as e:
+        return jsonify({'error': 'Invalid upload; nothing was stored',
+                        'invalid_rows': e.invalid_rows, 'errors': e.errors}), 422
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = bulk_scoring.result_rows(batch)
+    user_id = session['user_id']
+    batch_id = run_write(lambda conn: screenings.store(
+        conn, user_id, questionnaire.key, fmt, batch.answers.tolist(), results))
+
+    if fmt == 'csv':
+        results = [(*row[:-1], ';'.join(row[-1])) for row in results]
+        chunks = export.csv_chunks(screenings.RESULT_COLUMNS, [results])
+    else:
+        chunks = export.ndjson_chunks(screenings.RESULT_COLUMNS, [results])
+    response = app.response_class(''.join(chunks), status=201, mimetype=export.FORMATS[fmt])
+    response.headers['X-Screening-Batch'] = str(batch_id)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+POPULATION_DEFAULT_WEEKS = 12
+POPULATION_MAX_WEEKS = 520
+
+def population_weeks():
+    """The requested weeks as (first, last, labels); raises ValueError."""
+    weeks = int(request.args.get('weeks', POPULATION_DEFAULT_WEEKS))
+    if not 1 <= weeks <= POPULATION_MAX_WEEKS:
+        raise ValueError(weeks)
+    first, last = population_rollups.week_range(get_db_connection(), weeks)
+    start = datetime.date.fromisoformat(first)
+    return first, last, [(start + datetime.timedelta(weeks=i)).isoformat() for i in range(weeks)]
+
+@app.route('/api/population/bands/<assessment_type>')
+@clinical_token_required
+def population_bands(assessment_type):
+    """Assessments per severity band for each of the last ``weeks`` weeks."""
+    questionnaire = questionnaires.get(assessment_type)
+    if not questionnaire:
+        return jsonify({'error': 'Unknown questionnaire'}), 404
+    try:
+        first, last, labels = population_weeks()
+    except ValueError:
+        return jsonify({'error': f'weeks must be from 1 to {POPULATION_MAX_WEEKS}'}), 400
+
+    counts = {label: {band.id: 0 for band in questionnaire.bands} for label in labels}
+    for week, band_id, count in population_rollups.band_counts(
+            get_db_connection(), questionnaire.key, first, last):
+        counts[week][band_id] = count
+    return jsonify({
+        'assessment_type': questionnaire.key,
+        'bands': [{'id': band.id, 'severity': band.severity} for band in questionnaire.bands],
+        'weeks': [{'week': week, 'total': sum(by_band.values()), 'counts': list(by_band.values())}
+                  for week, by_band in counts.items()]
+    })
+
+@app.route('/api/population/moves/<assessment_type>')
+@clinical_token_required
+def population_moves(assessment_type):
+    """Repeat assessments per week that moved to a more or less severe band, or stayed."""
+    questionnaire = questionnaires.get(assessment_type)
+    if not questionnaire:
+        return jsonify({'error': 'Unknown questionnaire'}), 404
+    try:
+        first, last, labels = population_weeks()
+    except ValueError:
+        return jsonify({'error': f'weeks must be from 1 to {POPULATION_MAX_WEEKS}'}), 400
+
+    rank = {band.id: i for i, band in enumerate(questionnaire.bands)}
+    moves = {label: {'up': 0, 'down': 0, 'same': 0} for label in labels}
+    for week, from_band, to_band, count in population_rollups.band_moves(
+            get_db_connection(), questionnaire.key, first, last):
+        step = rank[to_band] - rank[from_band]
+        moves[week]['up' if step > 0 else 'down' if step < 0 else 'same'] += count
+    return jsonify({
+        'assessment_type': questionnaire.key,
+        'weeks': [{'week': week, **counts} for week, counts in moves.items()]
+    })
+
+@app.route('/api/population/mood')
+@clinical_token_required
+def population_mood():
+    """Mean mood, entry count and active users for each of the last ``weeks`` weeks."""
+    try:
+        first, last, labels = population_weeks()
+    except ValueError:
+        return jsonify({'error': f'weeks must be from 1 to {POPULATION_MAX_WEEKS}'}), 400
+
+    trend = {label: {'week': label, 'entries': 0, 'users': 0, 'mean_mood': None} for label in labels}
+    for week, entries, mood_sum, users in population_rollups.mood_trend(get_db_connection(), first, last):
+        trend[week].update(entries=entries, users=users, mean_mood=round(mood_sum / entries, 2))
+    return jsonify({'weeks': list(trend.values())})
+
 @app.route('/contact')
+@page_cache.cached_page(pages)
 def contact():
     return render_template('contact.html')
 
+@app.route('/assets/<path:filename>')
+@limiter.exempt
+def asset(filename):
+    return static_assets.send(filename)
+
+
+safety_log = app.logger.getChild('safety')
+SAFETY_MATCHES = metrics.registry.counter(
+    'safety_matches_total', 'Chat messages stopped by the safety gate.', labels=('category',))
+
+def audit_safety_match(user_id, version, matches):
+    # Log what matched, never the message itself
+    for category in sorted({m.category for m in matches}):
+        SAFETY_MATCHES.inc(category)
+    safety_log.warning('Safety gate tripped for user %s (lexicon %s): %s', user_id, version,
+                       ', '.join(f'{m.category}/{m.language} "{m.phrase}" at {m.start}-{m.end}'
+                                 for m in matches))
+
+CRISIS_RESPONSE = ('❗ Emergency Resources:\n'
+                   '1. National Suicide Prevention Lifeline: 1-800-273-8255\n'
+                   '2. Crisis Text Line: Text HOME to 741741\n'
+                   '3. Local Emergency Services: 911')
+
+class ChatRequestError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+ChatTurn = namedtuple('ChatTurn', 'conversation_id message messages crisis_response cache_key')
+
+PROMPT_TOKENS = metrics.registry.histogram(
+    'chat_prompt_tokens', 'Locally counted tokens per chat prompt.',
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 4000))
+PROMPT_DROPPED = metrics.registry.counter(
+    'chat_prompt_dropped_messages_total', 'History messages left out of chat prompts to fit the budget.')
+
+def current_conversation(user_id, last_assessment):
+    """Return the session's conversation id, starting one if needed."""
+    conversation_id = session.get('conversation_id')
+    if conversation_id is not None and conversation_store.owns(get_db_connection(), conversation_id, user_id):
+        return conversation_id
+    conversation_id = run_write(lambda conn: conversation_store.start(
+        conn, user_id, last_assessment['type'], last_assessment['score']))
+    session['conversation_id'] = conversation_id
+    return conversation_id
+
+def record_turn(turn, answer):
+    """Append a question and its answer to the conversation. Safe on gateway workers."""
+    with app.app_context():
+        run_write(lambda conn: conversation_store.append_turn(
+            conn, turn.conversation_id, turn.message, answer))
+
+def prepare_chat(data):
+    """Validate a chat request and build the completion messages.
+
+    The client sends only the new message; earlier turns come from the
+    stored conversation, fitted into CHAT_PROMPT_BUDGET tokens. Returns a
+    ChatTurn: ``crisis_response`` is set (and ``messages`` None) when the
+    safety gate trips, and ``cache_key`` is set when the answer may be served
+    from and stored in the chat cache. Raises ChatRequestError for invalid
+    requests.
+    """
+    # Validate session existence
+    if 'user_id' not in session or 'last_assessment' not in session:
+        raise ChatRequestError('Please complete an assessment first!', 401)
+
+    # Validate request structure
+    if not data or not isinstance(data.get('message'), str) or not data['message'].strip():
+        raise ChatRequestError('Invalid request format', 400)
+
+    # Get session data
+    user_id = session['user_id']
+    last_assessment = session['last_assessment']
+    message = data['message']
+
+    # Older clients still send their context; it must match the session
+    context = data.get('context')
+    if context is not None and (
+            not isinstance(context, dict) or
+            str(context.get('user_id')) != str(user_id) or
+            context.get('type') != last_assessment['type']):
+        raise ChatRequestError('Session mismatch. Please restart assessment.', 403)
+
+    conversation_id = current_conversation(user_id, last_assessment)
+
+    # Content safety check
+    lexicon_version, matches = safety_gate.scan(message)
+    if matches:
+        audit_safety_match(user_id, lexicon_version, matches)
+        return ChatTurn(conversation_id, message, None, CRISIS_RESPONSE, None)
+
+    assessment_type = last_assessment['type']
+    score = last_assessment['score']
+    band = recommendations.lookup(assessment_type, score)
+    top_recommendations = band.recommendations[:3]
+    history = conversation_store.recent_messages(
+        get_db_connection(), conversation_id, app.config['CHAT_HISTORY_MESSAGES'])
+
+    # First-turn questions are cacheable; their prompt carries only the shared
+    # severity band so a cached answer never embeds one user's details
+    cache_key = None
+    if get_chat_cache() and not history:
+        cache_key = chat_cache.cache_key(assessment_type, band.severity, top_recommendations, message)
+        assessment = f"{assessment_type.upper()} ({band.severity})"
+    else:
+        max_score = questionnaires.get(assessment_type).max_score
+        assessment = f"{assessment_type.upper()} ({score}/{max_score})"
+
+    try:
+        prompt = prompt_builder.build(prompt_builder.system_prompt(assessment, top_recommendations),
+                                      history, message, app.config['CHAT_PROMPT_BUDGET'])
+    except prompt_builder.PromptTooLong:
+        raise ChatRequestError('Message is too long. Please shorten it.', 413)
+    PROMPT_TOKENS.observe(prompt.tokens)
+    if prompt.dropped:
+        PROMPT_DROPPED.inc(amount=prompt.dropped)
+    return ChatTurn(conversation_id, message, prompt.messages, None, cache_key)
+
+def get_chat_cache():
+    if 'chat_cache' not in app.extensions:
+        with _chat_cache_lock:
+            if 'chat_cache' not in app.extensions:
+                app.extensions['chat_cache'] = chat_cache.from_config(
+                    app.config['CHAT_CACHE'], app.config['DATABASE'],
+                    app.config['CHAT_CACHE_SIZE'], app.config['CHAT_CACHE_TTL'])
+    return app.extensions['chat_cache']
+
+_chat_cache_lock = threading.Lock()
+
+def chat_error(e):
+    """Map an exception from the chat path to its (message, status) pair."""
+    if isinstance(e, ChatRequestError):
+        return e.message, e.status
+    if isinstance(e, chat_gateway.GatewayBusyError):
+        app.logger.warning(f"Chat gateway full: {str(e)}")
+        return 'Chat is busy. Please retry shortly.', 429
+    if isinstance(e, chat_client.CircuitOpenError):
+        app.logger.warning("OpenAI circuit open, failing fast")
+        return 'AI service unavailable', 503
+    import openai  # Deferred, see chat_client; loaded by the time an upstream call has failed
+    if isinstance(e, openai.APIConnectionError):
+        app.logger.error(f"OpenAI connection error: {str(e)}")
+        return 'Connection failed. Check internet.', 503
+    if isinstance(e, openai.RateLimitError):
+        app.logger.error(f"OpenAI rate limit: {str(e)}")
+        return 'Too many requests. Wait 1 minute.', 429
+    if isinstance(e, openai.APIError):
+        app.logger.error(f"OpenAI API error: {str(e)}")
+        return 'AI service unavailable', 503
+    app.logger.error(f"General error: {str(e)}")
+    return 'Internal server error', 500
+
+def create_completion(messages, stream=False):
+    options = {'stream_options': {'include_usage': True}} if stream else {}
+    return upstream.create_chat_completion(
+        model="gpt-3.5-turbo",
+        messages=messages,
+        temperature=0.7,
+        max_tokens=250,
+        top_p=0.9,
+        stream=stream,
+        **options
+    )
+
+def complete_chat(turn):
+    """Run one completion, then cache and record the answer. Executed on a gateway worker."""
+    response = create_completion(turn.messages)
+    metrics.record_token_usage(response.usage)
+    answer = response.choices[0].message.content.strip()
+    if turn.cache_key:
+        get_chat_cache().set(turn.cache_key, answer)
+    record_turn(turn, answer)
+    return answer
+
+def chat_error_response(e):
+    message, status = chat_error(e)
+    response = jsonify({'error': message})
+    response.status_code = status
+    if isinstance(e, chat_gateway.GatewayBusyError):
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
 
 @app.route('/chat', methods=['POST'])
 @limiter.limit("10/minute")
 @login_required
 def handle_chat():
     try:
-        # Validate session existence
-        if 'user_id' not in session or 'last_assessment' not in session:
-            return jsonify({'error': 'Please complete an assessment first!'}), 401
-
-        # Validate request structure
-        data = request.json
-        if not data or 'message' not in data or 'context' not in data:
-            return jsonify({'error': 'Invalid request format'}), 400
-
-        # Get session data
-        user_id = session['user_id']
-        last_assessment = session['last_assessment']
-
-        # Validate session consistency (FIXED LINE)
-        if (str(data['context'].get('user_id')) != str(user_id) or 
-            data['context'].get('type') != last_assessment['type']):
-            return jsonify({'error': 'Session mismatch. Please restart assessment.'}), 403
-
-        # Content safety check
-        unsafe_terms = ['suicide', 'self-harm', 'kill myself', 'end it all']
-        if any(term in data['message'].lower() for term in unsafe_terms):
-            return jsonify({
-                'response': '❗ Emergency Resources:\n'
-                            '1. National Suicide Prevention Lifeline: 1-800-273-8255\n'
-                            '2. Crisis Text Line: Text HOME to 741741\n'
-                            '3. Local Emergency Services: 911'
-            })
-
-        # Initialize OpenAI client
-        client = openai.OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            timeout=10  # 10 second timeout
-        )
-
-        # Prepare system prompt
-        assessment_type = last_assessment['type']
-        score = last_assessment['score']
-        max_score = 27 if assessment_type == 'phq9' else 21
-        
-        system_prompt = f"""You are a mental health support assistant. Context:
-- User ID: {user_id}
-- Assessment: {assessment_type.upper()} ({score}/{max_score})
-- Recommendations: {", ".join(data['context']['recommendations'][:3])}
-
-Guidelines:
-1. Provide practical, non-medical advice
-2. Focus on implementing recommendations
-3. Use simple language (8th grade level)
-4. Keep responses under 150 words
-5. Include concrete examples
-6. End with encouragement
-7. Never suggest medications"""
-
-        # Create messages array
-        messages = [
-            {"role": "system", "content": system_prompt},
-            *data.get('history', []),
-            {"role": "user", "content": data['message']}
-        ]
+        turn = prepare_chat(request.json)
+        ready_answer = turn.crisis_response or (get_chat_cache().get(turn.cache_key) if turn.cache_key else None)
+        if ready_answer:
+            record_turn(turn, ready_answer)
+            return jsonify({'response': ready_answer})
 
         # Get AI response
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=250,
-            top_p=0.9
-        )
+        with metrics.upstream_phase():
+            answer = gateway.submit(complete_chat, turn, blocking=True).result()
 
         return jsonify({
-            'response': response.choices[0].message.content.strip()
+            'response': answer
         })
 
-    except openai.APIConnectionError as e:
-        app.logger.error(f"OpenAI connection error: {str(e)}")
-        return jsonify({'error': 'Connection failed. Check internet.'}), 503
-    except openai.RateLimitError as e:
-        app.logger.error(f"OpenAI rate limit: {str(e)}")
-        return jsonify({'error': 'Too many requests. Wait 1 minute.'}), 429
-    except openai.APIError as e:
-        app.logger.error(f"OpenAI API error: {str(e)}")
-        return jsonify({'error': 'AI service unavailable'}), 503
     except Exception as e:
-        app.logger.error(f"General error: {str(e)}")
-        return jsonify({'error': 'Internal server error'}), 500 
+        return chat_error_response(e)
+
+@app.route('/chat/jobs', methods=['POST'])
+@limiter.limit("10/minute")
+@login_required
+def create_chat_job():
+    """Queue a chat request and return immediately with a job id to poll."""
+    try:
+        turn = prepare_chat(request.json)
+        ready_answer = turn.crisis_response or (get_chat_cache().get(turn.cache_key) if turn.cache_key else None)
+        if ready_answer:
+            record_turn(turn, ready_answer)
+            job_id = gateway.completed_job(session['user_id'], ready_answer)
+        else:
+            job_id = gateway.submit_job(session['user_id'], complete_chat, turn)
+    except Exception as e:
+        return chat_error_response(e)
+
+    return jsonify({
+        'job_id': job_id,
+        'status_url': url_for('get_chat_job', job_id=job_id)
+    }), 202
+
+@app.route('/chat/jobs/<job_id>')
+@login_required
+def get_chat_job(job_id):
+    job = gateway.job(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/chat/upstream')
+@metrics_token_required
+def chat_upstream_status():
+    """Breaker, gateway and cache state for operators; same access rule as /metrics."""
+    status = upstream.snapshot()
+    status['gateway'] = gateway.stats()
+    if get_chat_cache():
+        status['cache'] = get_chat_cache().stats()
+    return jsonify(status)
+
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+def pump_chat_stream(turn, events, cancelled):
+    """Read a streamed completion on a gateway worker into ``events``.
+
+    Puts ('ready', None) once the upstream accepted the request, then
+    ('token', text) per token and finally ('done', None) or ('error', exc).
+    A cancelled stream is not recorded in the conversation.
+    """
+    try:
+        stream = create_completion(turn.messages, stream=True)
+    except Exception as e:
+        events.put(('error', e))
+        return
+    events.put(('ready', None))
+    tokens = []
+    try:
+        for chunk in stream:
+            if cancelled.is_set():
+                return
+            if chunk.usage:  # Sent as a final chunk without choices
+                metrics.record_token_usage(chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                tokens.append(chunk.choices[0].delta.content)
+                events.put(('token', tokens[-1]))
+        answer = ''.join(tokens).strip()
+        if turn.cache_key:
+            get_chat_cache().set(turn.cache_key, answer)
+        record_turn(turn, answer)
+        events.put(('done', None))
+    except Exception as e:
+        events.put(('error', e))
+    finally:
+        stream.close()
+
+@app.route('/chat/stream', methods=['POST'])
+@limiter.limit("10/minute")
+@login_required
+def handle_chat_stream():
+    """Same contract as /chat, but tokens are forwarded as Server-Sent Events.
+
+    Each token arrives as a ``data: {"token": ...}`` event, followed by an
+    ``event: done`` marker. Failures before the first token keep the JSON
+    error responses of /chat; failures mid-stream become ``event: error``.
+    """
+    events = queue.Queue()
+    cancelled = threading.Event()
+    try:
+        turn = prepare_chat(request.json)
+        ready_answer = turn.crisis_response or (get_chat_cache().get(turn.cache_key) if turn.cache_key else None)
+        if ready_answer:
+            record_turn(turn, ready_answer)
+        else:
+            gateway.submit(pump_chat_stream, turn, events, cancelled, blocking=True)
+            with metrics.upstream_phase():
+                kind, error = events.get()
+            if kind == 'error':
+                raise error
+    except Exception as e:
+        return chat_error_response(e)
+
+    def generate():
+        if ready_answer:
+            yield sse_event({'token': ready_answer})
+            yield sse_event({}, event='done')
+            return
+        try:
+            while True:
+                kind, value = events.get()
+                if kind == 'token':
+                    yield sse_event({'token': value})
+                elif kind == 'done':
+                    yield sse_event({}, event='done')
+                    return
+                else:
+                    message, status = chat_error(value)
+                    yield sse_event({'error': message, 'status': status}, event='error')
+                    return
+        finally:
+            cancelled.set()
+
+    return app.response_class(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
     
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
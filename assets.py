@@ -0,0 +1,186 @@
+"""Self-hosted, fingerprinted static assets.
+
+Third-party CSS/JS is vendored into ``static/vendor`` (pinned versions,
+taken from PyPI wheels that bundle them) so pages load from our own origin
+and work without internet access. ``build`` copies every file under
+``static/vendor`` and ``static/css``/``static/js`` into ``static/dist`` with
+a content hash in its name, writes gzip (and brotli, when the ``brotli``
+package is installed) variants next to it, and records the mapping in
+``static/dist/manifest.json``. Templates call ``asset_url('vendor/...')``;
+without a manifest it falls back to the unhashed file under ``/static``.
+
+Usage: python assets.py vendor   # refresh static/vendor (needs PyPI access)
+       python assets.py build    # fingerprint and precompress into static/dist
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import urllib.parse
+import zipfile
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip alone is fine
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC = os.path.join(ROOT, 'static')
+DIST = os.path.join(STATIC, 'dist')
+MANIFEST = os.path.join(DIST, 'manifest.json')
+SOURCES = ('vendor', 'css', 'js')
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+
+# (wheel requirement, member inside the wheel, destination under static/vendor)
+VENDOR = [
+    ('bootstrap-flask==2.6.0', 'flask_bootstrap/static/bootstrap5/css/bootstrap.min.css',
+     'bootstrap/bootstrap.min.css'),  # Bootstrap 5.3.8
+    ('bootstrap-flask==2.6.0', 'flask_bootstrap/static/bootstrap5/js/bootstrap.min.js',
+     'bootstrap/bootstrap.min.js'),
+    ('bootstrap-flask==2.6.0', 'flask_bootstrap/static/bootstrap5/umd/popper.min.js',
+     'popper/popper.min.js'),  # Popper 2.11.8
+    ('django-unfold==0.91.0', 'unfold/static/unfold/js/chart/chart.js',
+     'chartjs/chart.umd.min.js'),  # Chart.js 4.4.0
+    ('django-unfold==0.91.0', 'unfold/static/unfold/js/chart/LICENSE',
+     'chartjs/LICENSE'),
+    ('fontawesomefree==6.6.0', 'fontawesomefree/static/fontawesomefree/LICENSE.txt',
+     'fontawesome/LICENSE.txt'),
+]
+FONTAWESOME = 'fontawesomefree==6.6.0'
+FONTAWESOME_SVGS = 'fontawesomefree/static/fontawesomefree/svgs/solid/'
+ICON_ALIASES = {'home': 'house'}
+ICON_UTILITIES = {'spin'}
+ICON_CSS = '''\
+/* Font Awesome Free 6.6.0 subset (icons: CC BY 4.0), generated by assets.py */
+.fas{display:inline-block;width:1em;height:1em;vertical-align:-.125em;background-color:currentColor;\
+-webkit-mask:var(--fa-icon) center/contain no-repeat;mask:var(--fa-icon) center/contain no-repeat}
+.fa-spin{animation:fa-spin 2s linear infinite}
+@keyframes fa-spin{to{transform:rotate(360deg)}}
+'''
+_SOURCE_MAP = re.compile(rb'\n?/[/*]# sourceMappingURL=\S+(?: \*/)?\s*$')
+
+
+def used_icons(template_dir=os.path.join(ROOT, 'templates')):
+    names = set()
+    for filename in os.listdir(template_dir):
+        with open(os.path.join(template_dir, filename), encoding='utf-8') as f:
+            names.update(re.findall(r'\bfa-([a-z0-9-]+)', f.read()))
+    return sorted(names - ICON_UTILITIES)
+
+
+def icon_css(wheel, icons):
+    rules = []
+    for name in icons:
+        svg = wheel.read(FONTAWESOME_SVGS + ICON_ALIASES.get(name, name) + '.svg').decode()
+        svg = re.sub(r'<!--.*?-->', '', svg).replace('"', "'")
+        data = urllib.parse.quote(svg, safe=" =:/'")
+        rules.append(f'.fa-{name}{{--fa-icon:url("data:image/svg+xml,{data}")}}')
+    return ICON_CSS + '\n'.join(rules) + '\n'
+
+
+def vendor():
+    wheels = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for requirement in sorted({r for r, _, _ in VENDOR} | {FONTAWESOME}):
+            subprocess.run([sys.executable, '-m', 'pip', 'download', '--no-deps', '--only-binary',
+                            ':all:', '-d', tmp, requirement], check=True, stdout=subprocess.DEVNULL)
+            name = requirement.split('==')[0].replace('-', '_')
+            path = next(os.path.join(tmp, f) for f in os.listdir(tmp)
+                        if f.lower().startswith(name) and f.endswith('.whl'))
+            wheels[requirement] = zipfile.ZipFile(path)
+
+        for requirement, member, dest in VENDOR:
+            write(os.path.join(STATIC, 'vendor', dest), wheels[requirement].read(member))
+            print(f'vendor/{dest}')
+        icons = used_icons()
+        css = icon_css(wheels[FONTAWESOME], icons)
+        write(os.path.join(STATIC, 'vendor', 'fontawesome', 'icons.css'), css.encode())
+        print(f'vendor/fontawesome/icons.css ({", ".join(icons)})')
+        for wheel in wheels.values():
+            wheel.close()
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build():
+    shutil.rmtree(DIST, ignore_errors=True)
+    manifest = {}
+    for source in SOURCES:
+        for dirpath, _, filenames in os.walk(os.path.join(STATIC, source)):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, STATIC).replace(os.sep, '/')
+                root, ext = os.path.splitext(filename)
+                if ext not in COMPRESSIBLE:  # Licenses and the like stay in vendor/
+                    continue
+                with open(path, 'rb') as f:
+                    # Maps are not shipped, so drop the references to them
+                    data = _SOURCE_MAP.sub(b'\n', f.read())
+                hashed = f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+                hashed = os.path.join(os.path.dirname(name), hashed).replace(os.sep, '/')
+                target = os.path.join(DIST, hashed)
+                write(target, data)
+                encodings = []
+                if brotli is not None:
+                    write(target + '.br', brotli.compress(data, quality=11))
+                    encodings.append('br')
+                write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                encodings.append('gzip')
+                manifest[name] = {'path': hashed, 'encodings': encodings}
+                print(f'{name} -> dist/{hashed} ({len(data)} bytes)')
+    write(MANIFEST, json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+
+class Assets:
+    SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+    MAX_AGE = 31536000
+
+    def __init__(self, manifest_path=MANIFEST):
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        self.encodings = {entry['path']: entry['encodings'] for entry in self.manifest.values()}
+
+    def url(self, name):
+        entry = self.manifest.get(name)
+        if entry is None:
+            return url_for('static', filename=name)
+        return url_for('asset', filename=entry['path'])
+
+    def send(self, filename):
+        """Serve a fingerprinted file, precompressed if the client accepts it."""
+        if filename not in self.encodings:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0]
+        for encoding in self.encodings[filename]:
+            if request.accept_encodings[encoding]:
+                response = send_from_directory(DIST, filename + self.SUFFIXES[encoding],
+                                               mimetype=mimetype, max_age=self.MAX_AGE)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(DIST, filename, mimetype=mimetype, max_age=self.MAX_AGE)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+
+if __name__ == '__main__':
+    commands = {'vendor': vendor, 'build': build}
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        sys.exit(__doc__.split('\n\n')[-1])
+    commands[sys.argv[1]]()
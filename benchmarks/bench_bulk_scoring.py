@@ -0,0 +1,77 @@
+"""Throughput of bulk questionnaire scoring, vectorized vs row by row.
+
+Usage: python benchmarks/bench_bulk_scoring.py [--rows 1000,10000,100000] [--questionnaire phq9]
+
+Builds a CSV upload of random responses and times parse + validate + score
+with bulk_scoring, then the same work done one row at a time the way the
+single-assessment form does it (int() per answer, Questionnaire.score,
+recommendations.lookup, Questionnaire.flagged). Both must agree on every
+total, band and flag.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import bulk_scoring  # noqa: E402
+import questionnaires  # noqa: E402
+import recommendations  # noqa: E402
+
+
+def build_upload(questionnaire, rows):
+    rng = random.Random(rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['respondent'] + [f'q{i}' for i in range(1, len(questionnaire.items) + 1)])
+    for row in range(rows):
+        writer.writerow([f'r{row}'] + [rng.randint(questionnaire.min_value, questionnaire.max_value)
+                                       for _ in questionnaire.items])
+    return buffer.getvalue()
+
+
+def score_rows(questionnaire, text):
+    results = []
+    reader = csv.reader(io.StringIO(text))
+    next(reader)
+    for row in reader:
+        answers = [int(value) for value in row[1:]]
+        if not all(questionnaire.min_value <= value <= questionnaire.max_value for value in answers):
+            raise ValueError(row)
+        total = questionnaire.score(answers)
+        band = recommendations.lookup(questionnaire.key, total)
+        results.append((row[0], total, band.id, band.severity, tuple(questionnaire.flagged(answers))))
+    return results
+
+
+def timed(fn, repeat=3):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1000,10000,100000')
+    parser.add_argument('--questionnaire', default='phq9')
+    args = parser.parse_args()
+    questionnaire = questionnaires.get(args.questionnaire)
+
+    print(f'{"rows":>8} {"vectorized ms":>14} {"row loop ms":>12} {"speedup":>8}')
+    for rows in (int(n) for n in args.rows.split(',')):
+        text = build_upload(questionnaire, rows)
+        vector_s, batch = timed(lambda: bulk_scoring.score_upload(questionnaire, 'csv', text, rows))
+        loop_s, expected = timed(lambda: score_rows(questionnaire, text))
+        assert bulk_scoring.result_rows(batch) == expected
+        print(f'{rows:>8} {vector_s * 1000:>14.1f} {loop_s * 1000:>12.1f} {loop_s / vector_s:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Exercise the shared OpenAI client against the local stub.
+
+Usage: python benchmarks/bench_chat_client.py [--calls 50] [--latency 0.01]
+
+Reports per-call latency for a fresh client per request (the old behaviour)
+vs. the shared UpstreamClient, then points the shared client at a failing
+stub and shows the breaker tripping and failing fast.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import openai  # noqa: E402
+
+import chat_client  # noqa: E402
+import stub_openai  # noqa: E402
+
+MESSAGES = [{'role': 'user', 'content': 'How do I start behavioral activation?'}]
+
+
+def timed(fn, calls):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception:
+            pass
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return (f'mean {statistics.mean(samples):7.2f} ms   '
+            f'p95 {samples[int(len(samples) * 0.95) - 1]:7.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    healthy = stub_openai.start(latency=args.latency)
+    url = stub_openai.base_url(healthy)
+
+    def fresh_client_call():
+        client = openai.OpenAI(api_key='stub', base_url=url, timeout=10)
+        client.chat.completions.create(model='gpt-3.5-turbo', messages=MESSAGES)
+
+    shared = chat_client.UpstreamClient(api_key='stub', base_url=url)
+
+    def shared_client_call():
+        shared.create_chat_completion(model='gpt-3.5-turbo', messages=MESSAGES)
+
+    print(f'client per request   {summary(timed(fresh_client_call, args.calls))}')
+    print(f'shared client        {summary(timed(shared_client_call, args.calls))}')
+
+    failing = stub_openai.start(latency=args.latency, fail_rate=1.0)
+    degraded = chat_client.UpstreamClient(
+        api_key='stub', base_url=stub_openai.base_url(failing),
+        breaker=chat_client.CircuitBreaker(min_calls=5, cooldown=60))
+
+    def degraded_call():
+        degraded.create_chat_completion(model='gpt-3.5-turbo', messages=MESSAGES)
+
+    tripping = timed(degraded_call, 5)
+    print(f'failing upstream     {summary(tripping)}   (breaker closed)')
+    open_samples = timed(degraded_call, args.calls)
+    print(f'breaker open         {summary(open_samples)}')
+    print(f'breaker state        {degraded.breaker.snapshot()}')
+    print(f'upstream latency     {degraded.latency.snapshot()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Compare request throughput with per-call connections vs. the pooled layer.
+
+Usage: python benchmarks/bench_db_pool.py [--threads 8] [--seconds 5]
+
+Each mode runs against its own scratch database, seeded through that mode's
+connection factory: WAL is persistent in the file, so the per-call baseline
+must never be opened by the pool or it would run in WAL mode too. Per-call
+connections are closed when their request ends. The /login numbers use an unknown
+username so they measure the database lookup rather than password hashing.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import closing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import g  # noqa: E402
+
+import app as app_module  # noqa: E402
+
+
+def legacy_get_db_connection():
+    conn = sqlite3.connect(app_module.app.config['DATABASE'])
+    conn.row_factory = sqlite3.Row
+    g.setdefault('legacy_connections', []).append(conn)
+    return conn
+
+
+@app_module.app.teardown_appcontext
+def close_legacy_connections(exc):
+    for conn in g.pop('legacy_connections', []):
+        conn.close()
+
+
+def seed(path, entries=500):
+    """Create and fill ``path`` through whatever get_db_connection currently is."""
+    app_module.app.config['DATABASE'] = path
+    with app_module.app.app_context():
+        app_module.init_db()
+        conn = app_module.get_db_connection()
+        conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', 'x')")
+        conn.executemany(
+            'INSERT INTO mood_entries (user_id, mood, notes, timestamp) '
+            "VALUES (1, ?, ?, datetime('now', ?))",
+            [((i % 5) + 1, f'note {i}', f'-{i} hours') for i in range(entries)])
+        conn.commit()
+
+
+def run(method, path, data, threads, seconds):
+    flask_app = app_module.app
+    counts = [0] * threads
+    stop = time.perf_counter() + seconds
+
+    def worker(idx):
+        client = flask_app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'bench'
+        while time.perf_counter() < stop:
+            client.open(path, method=method, data=data)
+            counts[idx] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / seconds
+
+
+SCENARIOS = [
+    ('GET /mood', 'GET', '/mood', None),
+    ('POST /mood', 'POST', '/mood', {'mood': '3', 'notes': 'bench'}),
+    ('POST /login', 'POST', '/login', {'username': 'nobody', 'password': 'x'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--entries', type=int, default=100,
+                        help='mood entries seeded for the benchmark user')
+    args = parser.parse_args()
+
+    pooled_get_db_connection = app_module.get_db_connection
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.create_app({'DATABASE': os.path.join(tmp, 'boot.db'), 'RATELIMIT_ENABLED': False})
+        for mode, factory in (('per-call', legacy_get_db_connection),
+                              ('pooled', pooled_get_db_connection)):
+            app_module.get_db_connection = factory
+            seed(os.path.join(tmp, f'{mode}.db'), args.entries)
+            with closing(sqlite3.connect(os.path.join(tmp, f'{mode}.db'))) as check:
+                journal_mode = check.execute('PRAGMA journal_mode').fetchone()[0]
+            print(f'{mode}: journal_mode={journal_mode}')
+            for name, method, path, data in SCENARIOS:
+                results[(mode, name)] = run(method, path, data, args.threads, args.seconds)
+            app_module.get_db_connection = pooled_get_db_connection
+            app_module.app.extensions['db_pool'].close_all()
+
+    print(f"{'route':<14}{'per-call req/s':>16}{'pooled req/s':>16}{'speedup':>10}")
+    for name, _, _, _ in SCENARIOS:
+        before, after = results[('per-call', name)], results[('pooled', name)]
+        print(f'{name:<14}{before:>16.1f}{after:>16.1f}{after / before:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""Memory and throughput of the streaming export on one large account.
+
+Usage: python benchmarks/bench_export.py [--rows 10000,100000,1000000]
+
+Seeds a single user with each number of mood entries and downloads
+/export/mood.csv and /export/mood.ndjson (plain and gzipped) through the
+test client without buffering. Peak Python memory (tracemalloc) is measured
+in a separate pass from the timing, since tracing slows allocation down.
+"fetchall" is the previous approach of materializing every row and the
+whole CSV before responding.
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import app as app_module  # noqa: E402
+import export  # noqa: E402
+
+app = app_module.app
+PASSWORD = 'benchmark-password'
+NOTES = ['slept well', 'busy day at work', 'went for a walk', 'tired', '', 'saw friends']
+
+
+def seed_account(path, rows):
+    app.config['DATABASE'] = path
+    with app.app_context():
+        app_module.init_db()
+        conn = app_module.get_db_connection()
+        rng = random.Random(rows)
+        with conn:
+            conn.execute('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                         ('exporter', 'exporter@example.com',
+                          generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')))
+            conn.executemany(
+                "INSERT INTO mood_entries (user_id, mood, notes, timestamp) "
+                "VALUES (1, ?, ?, datetime('2020-01-01', ? || ' minutes'))",
+                ((rng.randint(1, 5), rng.choice(NOTES), i) for i in range(rows)))
+
+
+def fetchall_export(rows_expected):
+    with app.app_context():
+        conn = app_module.get_db_connection()
+        start, end = export.parse_date_range(None, None)
+        rows = conn.execute(export.DATASETS['mood'][1], (1, start, end)).fetchall()
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(export.DATASETS['mood'][0])
+        writer.writerows(rows)
+        body = buffer.getvalue().encode()
+    assert len(rows) == rows_expected
+    return len(body)
+
+
+def stream_export(client, fmt, gzip):
+    headers = {'Accept-Encoding': 'gzip' if gzip else 'identity'}
+    response = client.get(f'/export/mood.{fmt}', headers=headers, buffered=False)
+    size = 0
+    for chunk in response.iter_encoded():
+        size += len(chunk)
+    response.close()
+    return size
+
+
+def measure(fn):
+    started = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='10000,100000,1000000',
+                        help='comma-separated account sizes')
+    args = parser.parse_args()
+
+    boot = tempfile.TemporaryDirectory()
+    app_module.create_app({'DATABASE': os.path.join(boot.name, 'boot.db'), 'RATELIMIT_ENABLED': False})
+    print(f'{"rows":>9} {"export":16} {"bytes":>12} {"seconds":>8} {"rows/s":>10} {"peak MB":>8}')
+    for rows in (int(n) for n in args.rows.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            seed_account(os.path.join(tmp, 'bench.db'), rows)
+            client = app.test_client()
+            client.post('/login', data={'username': 'exporter', 'password': PASSWORD})
+            cases = [('fetchall csv', lambda: fetchall_export(rows))]
+            for fmt in ('csv', 'ndjson'):
+                for gzip in (False, True):
+                    cases.append((f'stream {fmt}{" gz" if gzip else ""}',
+                                  lambda fmt=fmt, gzip=gzip: stream_export(client, fmt, gzip)))
+            for label, fn in cases:
+                size, elapsed, peak = measure(fn)
+                print(f'{rows:9d} {label:16} {size:12d} {elapsed:8.2f} {rows / elapsed:10.0f} '
+                      f'{peak / 1e6:8.2f}')
+            app.extensions.pop('db_pool').close_all()
+    app_module.passwords.shutdown()
+    boot.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Per-request commits vs. the group-commit writer under concurrent writers.
+
+Usage: python benchmarks/bench_group_commit.py [--writers 64] [--writes 50] [--synchronous NORMAL]
+
+Every writer thread inserts a mood entry and folds it into the rollups, the
+same work as a /mood POST, and waits for it to be durable. ``--synchronous
+FULL`` shows the case where every commit pays an fsync.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db  # noqa: E402
+import group_commit  # noqa: E402
+import mood_rollups  # noqa: E402
+
+SCHEMA = '''
+    CREATE TABLE mood_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        mood INTEGER NOT NULL CHECK(mood BETWEEN 1 AND 5),
+        notes TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def insert_mood(user_id):
+    def write(conn):
+        cursor = conn.execute('INSERT INTO mood_entries (user_id, mood, notes) VALUES (?, 3, ?)',
+                              (user_id, 'bench'))
+        mood_rollups.record_mood(conn, cursor.lastrowid)
+    return write
+
+
+def prepare(path, pragmas):
+    conn = db.connect(path, pragmas)
+    conn.execute(SCHEMA)
+    mood_rollups.init_schema(conn)
+    conn.commit()
+    conn.close()
+
+
+def run(writers, writes, submit_for_thread):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(idx):
+        submit = submit_for_thread(idx)
+        local = []
+        for _ in range(writes):
+            started = time.perf_counter()
+            submit(insert_mood(idx))
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'writes_per_sec': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=64)
+    parser.add_argument('--writes', type=int, default=50, help='writes per writer thread')
+    parser.add_argument('--synchronous', default='NORMAL', choices=['NORMAL', 'FULL'])
+    parser.add_argument('--delay-ms', type=float, default=2.0, help='group collection window')
+    args = parser.parse_args()
+
+    pragmas = tuple((name, args.synchronous if name == 'synchronous' else value)
+                    for name, value in db.PRAGMAS)
+    # Contending writers must wait on the lock rather than fail
+    pragmas = tuple((name, 60000 if name == 'busy_timeout' else value) for name, value in pragmas)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        direct_path = os.path.join(tmp, 'direct.db')
+        prepare(direct_path, pragmas)
+
+        def direct_submitter(idx):
+            conn = db.connect(direct_path, pragmas)
+
+            def submit(fn):
+                with conn:
+                    fn(conn)
+            return submit
+
+        direct = run(args.writers, args.writes, direct_submitter)
+
+        group_path = os.path.join(tmp, 'group.db')
+        prepare(group_path, pragmas)
+        writer = group_commit.GroupCommitWriter(group_path, max_delay=args.delay_ms / 1000,
+                                                pragmas=pragmas)
+        grouped = run(args.writers, args.writes, lambda idx: writer.submit)
+
+    print(f'{args.writers} writers x {args.writes} writes, synchronous={args.synchronous}')
+    print(f"{'mode':<14}{'writes/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, result in (('per-request', direct), ('group commit', grouped)):
+        print(f"{name:<14}{result['writes_per_sec']:>12.0f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+    stats = writer.stats()
+    batches = stats['batch_size']
+    print(f"group batches: {batches['count']}, mean size {batches['sum'] / batches['count']:.1f}, "
+          f"mean commit {stats['commit_latency_seconds']['sum'] / batches['count'] * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Mood note search at millions of notes: FTS5 vs a LIKE scan.
+
+Usage: python benchmarks/bench_mood_search.py [--rows 1000000] [--users 1000] [--heavy-rows 100000]
+
+Seeds ``--rows`` notes spread over ``--users`` accounts plus one heavy user
+with ``--heavy-rows`` notes (inserted through the sync triggers, so the seed
+time includes index maintenance), then times mood_search.search against
+``notes LIKE '%term%'`` on the same user's rows for a typical and for the
+heavy account. Also reports rebuild and optimize times and the index size.
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import db  # noqa: E402
+import mood_search  # noqa: E402
+import schema  # noqa: E402
+
+WORDS = ('slept walked park tired anxious calm work meeting friends family run gym rain sunny '
+         'coffee reading cooked dinner call therapist headache argument celebrated birthday '
+         'deadline lonely grateful journal meditation music movie beach hike stressed relaxed '
+         'breakfast garden dog cat train late early weekend holiday doctor exam presentation').split()
+# Journal text has a long tail: the everyday words above, then a Zipf-distributed
+# vocabulary of rarer ones (topic1 is common, topic20000 almost never used)
+VOCABULARY = WORDS + [f'topic{i}' for i in range(1, 20001)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+QUERIES = ('park', 'walk*', 'coffee friends', 'topic50', 'topic2000', 'topic15000', 'deadline topic300')
+LIKE_SQL = '''
+    SELECT id, mood, timestamp, notes FROM mood_entries
+    WHERE user_id = ? AND timestamp >= ? AND timestamp < ? AND {}
+    ORDER BY timestamp DESC LIMIT ?
+'''
+
+
+def note(rng):
+    return ' '.join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=rng.randint(4, 24)))
+
+
+def seed(conn, rows, users, heavy_rows):
+    rng = random.Random(rows)
+    conn.executemany('INSERT INTO users (id, username, email, password) VALUES (?, ?, ?, ?)',
+                     [(u, f'user{u}', f'user{u}@example.com', 'x') for u in range(1, users + 2)])
+    heavy = users + 1
+    owners = [rng.randint(1, users) for _ in range(rows)] + [heavy] * heavy_rows
+    batch = []
+    for day, user_id in enumerate(owners):
+        batch.append((user_id, rng.randint(1, 5), note(rng),
+                      f'20{10 + day % 15:02d}-{1 + day % 12:02d}-{1 + day % 28:02d} 12:00:00'))
+        if len(batch) == 10000:
+            with conn:
+                conn.executemany('INSERT INTO mood_entries (user_id, mood, notes, timestamp) VALUES (?, ?, ?, ?)', batch)
+            batch.clear()
+    with conn:
+        conn.executemany('INSERT INTO mood_entries (user_id, mood, notes, timestamp) VALUES (?, ?, ?, ?)', batch)
+    return heavy
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def like_clause(text):
+    terms = [term.rstrip('*') for term in text.split()]
+    return ' AND '.join(['notes LIKE ?'] * len(terms)), [f'%{term}%' for term in terms]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--heavy-rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'search.db')
+        conn = db.connect(path)
+        schema.init_db(conn)
+        started = time.perf_counter()
+        heavy = seed(conn, args.rows, args.users, args.heavy_rows)
+        total = args.rows + args.heavy_rows
+        seed_s = time.perf_counter() - started
+        print(f'seeded {total} notes through the triggers in {seed_s:.1f} s '
+              f'({seed_s / total * 1e6:.1f} us/note)')
+
+        for name, fn in (('rebuild', mood_search.rebuild), ('optimize', mood_search.optimize)):
+            started = time.perf_counter()
+            with conn:
+                fn(conn)
+            print(f'{name}: {time.perf_counter() - started:.1f} s')
+        conn.execute('VACUUM')
+        size = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'mood_notes_fts%'").fetchone()[0] \
+            if 'ENABLE_DBSTAT_VTAB' in {row[0] for row in conn.execute('PRAGMA compile_options')} else None
+        print(f'database {os.path.getsize(path) / 2**20:.0f} MiB'
+              + (f', FTS index {size / 2**20:.0f} MiB' if size else ''))
+
+        typical = random.Random(0).randint(1, args.users)
+        print(f'\n{"query":20} {"account":>8} {"fts p50/max ms":>16} {"like p50/max ms":>17} {"hits":>6}')
+        for user_id, label in ((typical, 'typical'), (heavy, 'heavy')):
+            for text in QUERIES:
+                query = mood_search.build_query(text)
+                rows = []
+                fts = timed(lambda: rows.extend(
+                    mood_search.search(conn, user_id, query, '', '9999-12-31', limit=20)[0]), args.repeat)
+                clause, params = like_clause(text)
+                like = timed(lambda: conn.execute(LIKE_SQL.format(clause),
+                                                  (user_id, '', '9999-12-31', *params, 20)).fetchall(),
+                             args.repeat)
+                print(f'{text:20} {label:>8} {fts[0]:>8.2f}/{fts[1]:<7.2f} {like[0]:>9.2f}/{like[1]:<7.2f} '
+                      f'{len(rows) // args.repeat:>6}')
+
+        started = time.perf_counter()
+        try:
+            with conn:
+                mood_search.check(conn)
+            print(f'\nintegrity-check: ok in {time.perf_counter() - started:.1f} s')
+        except sqlite3.DatabaseError as e:
+            print(f'\nintegrity-check: FAILED ({e})')
+            sys.exit(1)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
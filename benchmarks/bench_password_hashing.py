@@ -0,0 +1,105 @@
+"""Latency of ordinary routes during a login burst, inline vs. pooled hashing.
+
+Usage: python benchmarks/bench_password_hashing.py [--login-threads 16] [--seconds 10]
+
+While ``--login-threads`` clients submit valid logins as fast as they can, a
+probe client requests /resources and records its latency. Logins turned
+away with 503 by the pool's queue limit are counted separately. The run is done
+once with hashing inline on request threads and once with the process pool.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[max(0, int(len(samples) * pct) - 1)] * 1000
+
+
+def run(app_module, service, login_threads, seconds):
+    flask_app = app_module.app
+    app_module.passwords = service
+    stop = threading.Event()
+    logins = [0]
+    rejected = [0]
+    probe = []
+
+    def login_worker():
+        client = flask_app.test_client()
+        while not stop.is_set():
+            response = client.post('/login', data={'username': 'bench', 'password': 'correct horse'})
+            if response.status_code == 503:
+                rejected[0] += 1
+                time.sleep(0.05)  # A real client backs off before retrying
+            else:
+                logins[0] += 1
+
+    def probe_worker():
+        client = flask_app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get('/resources')
+            probe.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login_worker) for _ in range(login_threads)]
+    threads.append(threading.Thread(target=probe_worker))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return {
+        'logins_per_sec': logins[0] / seconds,
+        'rejected_per_sec': rejected[0] / seconds,
+        'probe_p50_ms': statistics.median(probe) * 1000,
+        'probe_p99_ms': percentile(probe, 0.99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, default=1, help='hashing processes')
+    parser.add_argument('--max-pending', type=int, default=4)
+    args = parser.parse_args()
+
+    import app as app_module
+    import password_service
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.create_app({'DATABASE': os.path.join(tmp, 'bench.db'), 'RATELIMIT_ENABLED': False})
+        inline = password_service.PasswordService(max_workers=0)
+        with app_module.app.app_context():
+            conn = app_module.get_db_connection()
+            conn.execute("INSERT INTO users (username, email, password) VALUES ('bench', 'bench@example.com', ?)",
+                         (inline.hash('correct horse'),))
+            conn.commit()
+
+        idle = password_service.PasswordService(max_workers=0)
+        results['idle'] = run(app_module, idle, 0, min(args.seconds, 3))
+        results['inline'] = run(app_module, inline, args.login_threads, args.seconds)
+        pooled = password_service.PasswordService(max_workers=args.workers,
+                                                  max_pending=args.max_pending)
+        pooled.current_method()  # Start the pool before measuring
+        results['process pool'] = run(app_module, pooled, args.login_threads, args.seconds)
+        pooled.shutdown()
+
+    print(f"{'hashing':<14}{'logins/s':>10}{'503/s':>8}{'/resources p50 ms':>20}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<14}{result['logins_per_sec']:>10.1f}{result['rejected_per_sec']:>8.1f}"
+              f"{result['probe_p50_ms']:>20.2f}{result['probe_p99_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Clinical dashboard queries: rollup reads vs ad hoc scans, as the user base grows.
+
+Usage: python benchmarks/bench_population.py [--rows 100000,1000000] [--weeks 52]
+
+Seeds a database per size with seed_data.py, then times the three
+/api/population endpoints (which read the weekly rollups) against the same
+answers computed ad hoc from assessments and mood_entries. Also times the
+chunked backfill and the per-write cost of keeping the rollups current.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as app_module  # noqa: E402
+import db  # noqa: E402
+import population_rollups  # noqa: E402
+from seed_data import seed  # noqa: E402
+
+TOKEN = 'benchmark-token'
+WEEK = population_rollups.WEEK.format(ts='timestamp')
+AD_HOC = {
+    'bands': f'''
+        SELECT {WEEK}, band_id, COUNT(*) FROM assessments
+        WHERE assessment_type = 'phq9' AND timestamp >= :first
+        GROUP BY 1, 2
+    ''',
+    'moves': f'''
+        SELECT week, from_band_id, band_id, COUNT(*) FROM (
+            SELECT {WEEK} AS week, band_id,
+                   LAG(band_id) OVER (PARTITION BY user_id ORDER BY id) AS from_band_id
+            FROM assessments WHERE assessment_type = 'phq9'
+        ) WHERE from_band_id IS NOT NULL AND week >= :first
+        GROUP BY 1, 2, 3
+    ''',
+    'mood': f'''
+        SELECT week, SUM(n), SUM(s), COUNT(*) FROM (
+            SELECT user_id, {WEEK} AS week, COUNT(*) AS n, SUM(mood) AS s
+            FROM mood_entries WHERE timestamp >= :first GROUP BY 1, 2
+        ) GROUP BY week
+    ''',
+}
+ENDPOINTS = {'bands': '/api/population/bands/phq9', 'moves': '/api/population/moves/phq9',
+             'mood': '/api/population/mood'}
+
+
+def timed(fn, repeat=5):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='100000,1000000')
+    parser.add_argument('--weeks', type=int, default=52)
+    args = parser.parse_args()
+
+    print(f'{"rows":>9} {"users":>7} {"query":>6} {"rollup ms":>10} {"ad hoc ms":>10} {"speedup":>8}')
+    with tempfile.TemporaryDirectory() as tmp:
+        app = app_module.create_app({'DATABASE': os.path.join(tmp, 'empty.db'), 'RATELIMIT_ENABLED': False,
+                                     'CLINICAL_API_TOKEN': TOKEN, 'SESSION_STORE': 'cookie'})
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {TOKEN}'}
+
+        for rows in (int(n) for n in args.rows.split(',')):
+            path = os.path.join(tmp, f'population-{rows}.db')
+            users = seed(path, rows)
+            app.config['DATABASE'] = path
+            conn = db.connect(path)
+            first = conn.execute(f"SELECT date({population_rollups.WEEK.format(ts=repr('now'))}, ?)",
+                                 (f'-{7 * (args.weeks - 1)} days',)).fetchone()[0]
+            for name, sql in AD_HOC.items():
+                url = f'{ENDPOINTS[name]}?weeks={args.weeks}'
+                assert client.get(url, headers=headers).status_code == 200
+                rollup_ms = timed(lambda: client.get(url, headers=headers))
+                ad_hoc_ms = timed(lambda: conn.execute(sql, {'first': first}).fetchall())
+                print(f'{rows:>9} {users:>7} {name:>6} {rollup_ms:>10.2f} {ad_hoc_ms:>10.2f} '
+                      f'{ad_hoc_ms / rollup_ms:>7.1f}x')
+
+            started = time.perf_counter()
+            chunks = population_rollups.backfill(conn, restart=True)
+            print(f'{"":>9} backfill: {time.perf_counter() - started:.2f} s in {chunks} chunks')
+
+            user_id = users // 2
+            timestamp = '2025-06-04 12:00:00'
+            def write(track):
+                with conn:
+                    entry_id = conn.execute(
+                        'INSERT INTO mood_entries (user_id, mood, timestamp) VALUES (?, 3, ?)',
+                        (user_id, timestamp)).lastrowid
+                    assessment_id = conn.execute('''
+                        INSERT INTO assessments (user_id, assessment_type, score, band_id)
+                        VALUES (?, 'phq9', 12, 3)
+                    ''', (user_id,)).lastrowid
+                    if track:
+                        population_rollups.record_mood(conn, entry_id)
+                        population_rollups.record_assessment(conn, assessment_id)
+            plain_ms, tracked_ms = timed(lambda: write(False), 200), timed(lambda: write(True), 200)
+            print(f'{"":>9} write (mood + assessment): {plain_ms:.3f} ms, '
+                  f'{tracked_ms:.3f} ms with rollups')
+            conn.close()
+
+
+if __name__ == '__main__':
+    main()
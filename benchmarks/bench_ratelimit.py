@@ -0,0 +1,120 @@
+"""Rate limiter overhead per check and per request, memory vs. SQLite storage.
+
+Usage: python benchmarks/bench_ratelimit.py [--checks 20000] [--requests 5000] [--workers 4]
+
+``hit`` is the raw cost of one limiter check against each storage and
+strategy. ``request`` is the added latency of the limiter (plus the rate-limit
+header hook) on a trivial Flask route. ``shared`` runs --workers processes
+against one "100/minute" limit and counts how many hits were allowed: the
+in-memory storage lets every process through 100 times, the shared one lets
+100 through in total.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask  # noqa: E402
+from flask_limiter import Limiter  # noqa: E402
+from limits import parse  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+from limits.strategies import STRATEGIES  # noqa: E402
+
+import ratelimit_storage  # noqa: E402,F401  registers the sqlite:// limiter storage
+
+
+def bench_hits(uri, strategy, checks):
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    item = parse(f'{checks * 2}/minute')
+    keys = [f'10.0.{i // 256}.{i % 256}' for i in range(64)]
+    started = time.perf_counter()
+    for i in range(checks):
+        limiter.hit(item, keys[i % len(keys)])
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def make_app(uri, strategy, enabled):
+    app = Flask(__name__)
+    limiter = Limiter(app=app, key_func=lambda: '127.0.0.1', default_limits=['1000000 per minute'],
+                      storage_uri=uri, strategy=strategy, enabled=enabled)
+
+    @app.after_request
+    def add_rate_limit_headers(response):
+        current = limiter.current_limit
+        if current:
+            response.headers['X-RateLimit-Limit'] = str(current.limit)
+            response.headers['X-RateLimit-Remaining'] = str(current.remaining)
+            response.headers['X-RateLimit-Reset'] = str(current.reset_at)
+        return response
+
+    @app.route('/')
+    def index():
+        return 'ok'
+
+    return app
+
+
+def bench_requests(uri, strategy, requests, enabled=True):
+    client = make_app(uri, strategy, enabled).test_client()
+    for _ in range(100):
+        client.get('/')
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get('/')
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def hammer(uri, strategy, attempts, results):
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    item = parse('100/minute')
+    results.put(sum(limiter.hit(item, 'shared-client') for _ in range(attempts)))
+
+
+def bench_shared(uri, strategy, workers, attempts=200):
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=hammer, args=(uri, strategy, attempts, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    allowed = sum(results.get() for _ in procs)
+    for p in procs:
+        p.join()
+    return allowed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def sqlite_uri(name):
+            return f'sqlite:///{os.path.join(tmp, name)}'
+
+        print('hit: microseconds per limiter check')
+        for strategy in ('fixed-window', 'sliding-window-counter'):
+            for label, uri in (('memory', 'memory://'), ('sqlite', sqlite_uri(f'hits-{strategy}.db'))):
+                print(f'  {strategy:24} {label:7} {bench_hits(uri, strategy, args.checks):8.1f}')
+
+        strategy = 'sliding-window-counter'
+        baseline = bench_requests('memory://', strategy, args.requests, enabled=False)
+        print(f'request: microseconds per request ({strategy})')
+        print(f'  {"limiter off":16} {baseline:8.1f}')
+        for label, uri in (('memory', 'memory://'), ('sqlite', sqlite_uri('requests.db'))):
+            per_request = bench_requests(uri, strategy, args.requests)
+            print(f'  {label:16} {per_request:8.1f}  (+{per_request - baseline:.1f})')
+
+        print(f'shared: hits allowed for 100/minute across {args.workers} processes')
+        for label, uri in (('memory', 'memory://'), ('sqlite', sqlite_uri('shared.db'))):
+            print(f'  {label:7} {bench_shared(uri, strategy, args.workers):5d}')
+
+
+if __name__ == '__main__':
+    main()
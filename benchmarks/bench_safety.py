@@ -0,0 +1,82 @@
+"""Per-message cost of the chat safety gate as the lexicon grows.
+
+Usage: python benchmarks/bench_safety.py [--patterns 200,1000,10000,50000] [--messages 2000]
+
+The shipped lexicon is padded with synthetic multi-word phrases up to each
+size. "automaton" is safety_matcher's normalize + Aho-Corasick scan; "linear"
+is the previous ``any(term in message.lower() for term in terms)`` over the
+same phrases. Messages without a match are the worst case for the linear
+scan and the common case in production.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import safety_matcher  # noqa: E402
+
+LEXICON = os.path.join(os.path.dirname(__file__), '..', 'safety_lexicon.json')
+MESSAGES = {
+    'short': "Any tips for sleeping better?",
+    'typical': ("I've been feeling pretty low this week and I'm not sleeping well. Work is "
+                "stressful and I keep worrying about everything. Any tips for calming down "
+                "before bed?"),
+    'long': ("Today started fine but by the afternoon I was exhausted again, and I noticed I "
+             "kept replaying conversations from work in my head. ") * 15,
+    'crisis': "Honestly some days I just want to end it all and I don't know who to talk to.",
+}
+
+
+def synthetic_lexicon(size, seed=7):
+    with open(LEXICON, encoding='utf-8') as f:
+        lexicon = json.load(f)
+    rng = random.Random(seed)
+    syllables = ['ka', 'lo', 'mi', 'ren', 'tus', 'vo', 'zel', 'qua', 'nor', 'bri', 'dex', 'hul']
+    shipped = sum(1 for _ in safety_matcher.lexicon_phrases(lexicon))
+    padding = [' '.join(''.join(rng.choices(syllables, k=rng.randint(2, 4)))
+                        for _ in range(rng.randint(1, 3)))
+               for _ in range(max(0, size - shipped))]
+    lexicon['categories']['synthetic'] = {'xx': padding}
+    return lexicon
+
+
+def per_message(fn, message, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(message)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patterns', default='200,1000,10000,50000')
+    parser.add_argument('--messages', type=int, default=2000, help='scans per measurement')
+    args = parser.parse_args()
+
+    print(f'{"phrases":>8} {"keys":>7} {"build ms":>9} {"message":8} {"chars":>6} '
+          f'{"automaton us":>13} {"linear us":>10}')
+    for size in (int(n) for n in args.patterns.split(',')):
+        lexicon = synthetic_lexicon(size)
+        started = time.perf_counter()
+        matcher = safety_matcher.SafetyMatcher(lexicon)
+        build_ms = (time.perf_counter() - started) * 1000
+        terms = [phrase.rstrip('*') for phrase, _, _ in safety_matcher.lexicon_phrases(lexicon)]
+
+        def linear(message):
+            lowered = message.lower()
+            return any(term in lowered for term in terms)
+
+        for name, message in MESSAGES.items():
+            fast = per_message(matcher.scan, message, args.messages)
+            # The linear scan is slow enough at large sizes to need fewer rounds
+            slow = per_message(linear, message, max(10, args.messages * 200 // len(terms)))
+            print(f'{len(terms):8d} {matcher.patterns:7d} {build_ms:9.1f} {name:8} '
+                  f'{len(message):6d} {fast:13.1f} {slow:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Cookie size and per-request cost: signed-cookie sessions vs. server-side sessions.
+
+Usage: python benchmarks/bench_sessions.py [--requests 2000]
+
+A user signs up, logs in and completes a PHQ-9, then the Cookie header the
+browser would send on every later request is measured. "cookie (before)"
+adds the recommendation list that assessment_result used to store in the
+session. The timings are per request for a page that reads the session
+(/assessment) and one served from the page cache (/resources).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import app as app_module  # noqa: E402
+import recommendations  # noqa: E402
+import session_store  # noqa: E402
+from flask.sessions import SecureCookieSessionInterface  # noqa: E402
+
+app = app_module.app
+
+
+def cookie_header(client):
+    name = app.config['SESSION_COOKIE_NAME']
+    cookie = client.get_cookie(name)
+    return len(f'{name}={cookie.value}') if cookie else 0
+
+
+def run(label, interface, requests, legacy=False):
+    app.session_interface = interface
+    client = app.test_client()
+    username = f'bench{abs(hash(label))}'
+    client.post('/signup', data={'username': username, 'email': f'{username}@example.com',
+                                 'password': 'benchmark-password'})
+    client.post('/login', data={'username': username, 'password': 'benchmark-password'})
+    client.post('/assessment/phq9', data={f'q{i}': '2' for i in range(1, 10)})
+    client.get('/assessment/result?type=phq9&score=18')
+    if legacy:
+        with client.session_transaction() as session:
+            band = recommendations.lookup('phq9', 18)
+            session['current_recommendations'] = list(band.recommendations)
+
+    timings = {}
+    for path in ('/assessment', '/resources'):
+        client.get(path)
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(path)
+        timings[path] = (time.perf_counter() - started) / requests * 1e6
+    size = cookie_header(client)
+    print(f'{label:16} {size:6d} {timings["/assessment"]:12.1f} {timings["/resources"]:12.1f}')
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app_module.create_app({'DATABASE': os.path.join(tmp, 'bench.db'), 'RATELIMIT_ENABLED': False})
+        store = session_store.SQLiteSessionStore(os.path.join(tmp, 'sessions.db'))
+
+        print(f'{"session":16} {"cookie B":>6} {"/assessment us":>12} {"/resources us":>12}')
+        before = run('cookie (before)', SecureCookieSessionInterface(), args.requests, legacy=True)
+        run('cookie', SecureCookieSessionInterface(), args.requests)
+        after = run('sqlite', session_store.ServerSessionInterface(store), args.requests)
+        print(f'Cookie header bytes saved per request: {before - after} ({before} -> {after})')
+        print(f'session store: {store.stats()}')
+    app_module.passwords.shutdown()
+
+
+if __name__ == '__main__':
+    main()
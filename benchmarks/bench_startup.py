@@ -0,0 +1,120 @@
+"""Worker cold start: import time of app.py and time to the first response.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--import-budget-ms 600] [--startup-budget-ms 1500]
+
+Each run is a fresh interpreter. ``import`` is the cumulative ``-X importtime``
+figure for ``app``; ``startup`` is import + create_app() + a first ``GET /``
+on a scratch database. Medians are checked against the budgets, and the
+modules that only chat or insights requests need must not be imported at
+startup. Exits 1 when a check fails, so CI can run it as a gate.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Loaded on first use by the routes that need them
+DEFERRED = ('openai', 'pydantic', 'httpx', 'numpy')
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app({'RATELIMIT_ENABLED': False})
+created = time.perf_counter()
+response = flask_app.test_client().get('/')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'startup_ms': (served - started) * 1000,
+    'deferred_loaded': [name for name in %r if name in sys.modules],
+}))
+''' % (DEFERRED,)
+
+
+def parse_importtime(stderr):
+    """Map module name to (self_us, cumulative_us) from ``-X importtime`` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def run_python(args, env, cwd):
+    result = subprocess.run([sys.executable, *args], env=env, cwd=cwd,
+                            capture_output=True, text=True, check=True)
+    return result.stdout, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=600)
+    parser.add_argument('--startup-budget-ms', type=float, default=1500)
+    parser.add_argument('--top', type=int, default=10, help='heaviest imports to list')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ,
+               'PYTHONPATH': ROOT,
+               'DATABASE_PATH': os.path.join(tmp, 'startup.db'),
+               'SESSION_DATABASE': os.path.join(tmp, 'sessions.db'),
+               'RATELIMIT_STORAGE_URI': 'memory://',
+               'JINJA_CACHE_DIR': ''}
+        imports, startups = [], []
+        for _ in range(args.runs):
+            _, stderr = run_python(['-X', 'importtime', '-c', 'import app'], env, tmp)
+            modules = parse_importtime(stderr)
+            imports.append((modules['app'][1] / 1000, modules))
+            stdout, _ = run_python(['-c', STARTUP_SCRIPT], env, tmp)
+            startups.append(json.loads(stdout.splitlines()[-1]))
+        _, stderr = run_python(['-X', 'importtime', '-c', 'import openai, numpy'], env, tmp)
+        deferred_cost = parse_importtime(stderr)
+
+    imports.sort(key=lambda item: item[0])
+    import_ms, modules = imports[len(imports) // 2]
+    print(f'import app: median {import_ms:.1f} ms '
+          f'(min {imports[0][0]:.1f}, max {imports[-1][0]:.1f}, {args.runs} runs)')
+    for key in ('create_app_ms', 'first_request_ms', 'startup_ms'):
+        print(f'{key[:-3]:>13}: median {statistics.median(s[key] for s in startups):.1f} ms')
+
+    print('\nheaviest imports under app (cumulative ms):')
+    top = sorted(((cumulative, name) for name, (_, cumulative) in modules.items()
+                  if name != 'app' and '.' not in name), reverse=True)[:args.top]
+    for cumulative, name in top:
+        print(f'  {name:24} {cumulative / 1000:8.1f}')
+    print('deferred until first use (cumulative ms when imported alone):')
+    for name in DEFERRED:
+        if name in deferred_cost:
+            print(f'  {name:24} {deferred_cost[name][1] / 1000:8.1f}')
+
+    failures = []
+    eager = sorted({name for name in DEFERRED if name in modules}
+                   | {name for s in startups for name in s['deferred_loaded']})
+    if eager:
+        failures.append(f'imported at startup: {", ".join(eager)}')
+    if import_ms > args.import_budget_ms:
+        failures.append(f'import {import_ms:.1f} ms > budget {args.import_budget_ms:.0f} ms')
+    startup_ms = statistics.median(s['startup_ms'] for s in startups)
+    if startup_ms > args.startup_budget_ms:
+        failures.append(f'startup {startup_ms:.1f} ms > budget {args.startup_budget_ms:.0f} ms')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    if failures:
+        sys.exit(1)
+    print('OK: within budget')
+
+
+if __name__ == '__main__':
+    main()
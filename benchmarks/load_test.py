@@ -0,0 +1,308 @@
+"""Concurrent load test of the main routes, with JSON results.
+
+Usage: python benchmarks/load_test.py [--rows 10000] [--concurrency 8] [--seconds 20]
+                                      [--latency 0.2] [--output results.json]
+
+Seeds a scratch database (see seed_data.py), starts the app with the
+threaded Werkzeug server in a child process and the stub OpenAI server in
+this one, then runs --concurrency virtual users. Each logs in once as its
+own seeded user, takes a PHQ-9 so it can chat, and then picks requests from
+the --mix weights until time is up. Rate limiting is off for the run.
+
+The report has throughput and p50/p95/p99 latency per route plus run
+metadata (commit, scale, settings), so two commits can be compared with
+a JSON diff.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import seed_data  # noqa: E402
+import stub_openai  # noqa: E402
+
+DEFAULT_MIX = 'mood_get=30,mood_post=15,assessment_post=10,assessment_result=20,chat=15,login=10'
+PHQ9_FORM = {f'q{i}': '2' for i in range(1, 10)}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve(port, env):
+    os.environ.update(env)
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from werkzeug.serving import make_server
+
+    import app as app_module
+    flask_app = app_module.create_app({'RATELIMIT_ENABLED': False})
+    # Exit cleanly on terminate() so the password pool workers are reaped too
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        make_server('127.0.0.1', port, flask_app, threaded=True).serve_forever()
+    finally:
+        app_module.passwords.shutdown()
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('app server did not start')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class VirtualUser:
+    def __init__(self, port, user_id):
+        self.port = port
+        self.user_id = user_id
+        self.cookies = {}
+        # Logging in clears the session, including the assessment chat needs
+        self.assessed = False
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, form=None, body=None):
+        headers = {}
+        if form is not None:
+            body = urllib.parse.urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for attempt in range(2):
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed the keep-alive connection; reconnect once
+                self.conn.close()
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or ():
+            name, _, rest = header.partition('=')
+            value = rest.split(';', 1)[0]
+            if 'Max-Age=0' in header or 'expires=Thu, 01 Jan 1970' in header:
+                self.cookies.pop(name, None)
+            else:
+                self.cookies[name] = value
+        return response.status
+
+    def login(self):
+        self.assessed = False
+        return self.request('POST', '/login', form={
+            'username': seed_data.username(self.user_id), 'password': seed_data.PASSWORD})
+
+    def mood_get(self):
+        return self.request('GET', '/mood')
+
+    def mood_post(self):
+        return self.request('POST', '/mood', form={'mood': str(random.randint(1, 5)),
+                                                   'notes': 'load test'})
+
+    def assessment_post(self):
+        status = self.request('POST', '/assessment/phq9', form=PHQ9_FORM)
+        self.assessed = status == 302
+        return status
+
+    def assessment_result(self):
+        return self.request('GET', '/assessment/result?type=phq9&score=18')
+
+    def chat(self):
+        return self.request('POST', '/chat', body={
+            'message': 'How can I sleep better this week?',
+            'context': {'user_id': self.user_id, 'type': 'phq9',
+                        'recommendations': ['Keep a regular sleep schedule']},
+        })
+
+
+def run_load(port, users, concurrency, seconds, mix):
+    routes, weights = zip(*mix.items())
+    results = {route: [] for route in routes}
+    statuses = {route: {} for route in routes}
+    lock = threading.Lock()
+    window = {}
+
+    def open_window():
+        window['started'] = time.perf_counter()
+        window['stop'] = window['started'] + seconds
+
+    # Every user is logged in before the clock starts
+    start_barrier = threading.Barrier(concurrency, action=open_window)
+
+    def worker(idx):
+        user = VirtualUser(port, idx % users + 1)
+        rng = random.Random(idx)
+        try:
+            if user.login() != 302 or 'session' not in user.cookies:
+                raise RuntimeError(f'login failed for {seed_data.username(user.user_id)}')
+            user.assessment_post()
+        except BaseException:
+            start_barrier.abort()
+            raise
+        start_barrier.wait()
+        local = {route: [] for route in routes}
+        local_statuses = {route: {} for route in routes}
+        stop = window['stop']
+        while time.perf_counter() < stop:
+            route = rng.choices(routes, weights)[0]
+            if route == 'chat' and not user.assessed:
+                user.assessment_post()
+            started = time.perf_counter()
+            status = getattr(user, route)()
+            local[route].append(time.perf_counter() - started)
+            counts = local_statuses[route]
+            counts[status] = counts.get(status, 0) + 1
+        with lock:
+            for route in routes:
+                results[route].extend(local[route])
+                for status, count in local_statuses[route].items():
+                    statuses[route][status] = statuses[route].get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - window['started']
+
+    report = {}
+    all_latencies = []
+    all_statuses = {}
+    for route in routes:
+        latencies = sorted(results[route])
+        all_latencies.extend(latencies)
+        report[route] = summarize(latencies, statuses[route], elapsed)
+        for status, count in statuses[route].items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    return report, summarize(sorted(all_latencies), all_statuses, elapsed)
+
+
+def summarize(latencies, statuses, elapsed):
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'statuses': {str(status): statuses[status] for status in sorted(statuses)},
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        route, _, weight = part.partition('=')
+        if not hasattr(VirtualUser, route):
+            raise argparse.ArgumentTypeError(f'unknown route {route!r}')
+        if float(weight) > 0:
+            mix[route] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000, help='rows to seed (1k to 1M)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub OpenAI latency (s)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument('--hash-method', default=None,
+                        help='PASSWORD_HASH_METHOD for seeded users and the server')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    stub = stub_openai.start(latency=args.latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, 'bench.db')
+        env = {
+            'DATABASE_PATH': database,
+            'SESSION_DATABASE': os.path.join(tmp, 'sessions.db'),
+            'RATELIMIT_STORAGE_URI': 'memory://',
+            'OPENAI_API_KEY': 'stub',
+            'OPENAI_BASE_URL': stub_openai.base_url(stub),
+        }
+        if args.hash_method:
+            env['PASSWORD_HASH_METHOD'] = args.hash_method
+        os.environ.update(env)
+        users = seed_data.seed(database, args.rows, args.seed, hash_method=args.hash_method)
+
+        port = free_port()
+        server = multiprocessing.get_context('spawn').Process(
+            target=serve, args=(port, env))  # not a daemon: the password pool forks
+        server.start()
+        try:
+            wait_until_up(port)
+            routes, total = run_load(port, users, args.concurrency, args.seconds, args.mix)
+        finally:
+            server.terminate()
+            server.join()
+            stub.shutdown()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'rows': args.rows,
+            'seed': args.seed,
+            'concurrency': args.concurrency,
+            'seconds': args.seconds,
+            'stub_latency': args.latency,
+            'mix': args.mix,
+        },
+        'routes': routes,
+        'total': total,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Seed a database with synthetic users, mood entries and assessments.
+
+Usage: python benchmarks/seed_data.py bench.db [--rows 100000] [--seed 42]
+
+``--rows`` is the total across the three tables (1% users, 10% assessments,
+the rest mood entries spread over the last year). The same --rows and --seed
+always produce the same data. Every user is ``user<N>`` with the password
+``benchmark-password``. Never point this at the real mental_health.db.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import db  # noqa: E402
+import mood_rollups  # noqa: E402
+import population_rollups  # noqa: E402
+import recommendations  # noqa: E402
+import schema  # noqa: E402
+
+PASSWORD = 'benchmark-password'
+BATCH = 10000
+NOTES = ['slept well', 'busy day at work', 'went for a walk', 'tired', '', 'saw friends',
+         'anxious before the meeting', 'quiet evening']
+
+
+def username(user_id):
+    return f'user{user_id}'
+
+
+def split_rows(rows):
+    users = max(10, rows // 100)
+    assessments = rows // 10
+    return users, assessments, max(0, rows - users - assessments)
+
+
+def batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(path, rows, seed=42, hash_method=None):
+    """Create the schema at ``path`` and fill it; returns the user count."""
+    rng = random.Random(seed)
+    users, assessments, moods = split_rows(rows)
+    now = datetime.datetime(2026, 1, 1)
+    password = generate_password_hash(
+        PASSWORD, method=hash_method or os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+
+    def timestamp():
+        moment = now - datetime.timedelta(seconds=rng.randrange(365 * 86400))
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+    def assessment_rows():
+        for _ in range(assessments):
+            kind = rng.choice(('phq9', 'gad7'))
+            score = rng.randint(0, 27 if kind == 'phq9' else 21)
+            yield (rng.randint(1, users), kind, score,
+                   recommendations.lookup(kind, score).id, timestamp())
+
+    def mood_rows():
+        for _ in range(moods):
+            yield rng.randint(1, users), rng.randint(1, 5), rng.choice(NOTES), timestamp()
+
+    conn = db.connect(path)
+    try:
+        schema.init_db(conn)
+        with conn:
+            for batch in batched((username(i), f'{username(i)}@example.com', password)
+                                 for i in range(1, users + 1)):
+                conn.executemany('INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                                 batch)
+            for batch in batched(assessment_rows()):
+                conn.executemany('''
+                    INSERT INTO assessments (user_id, assessment_type, score, band_id, timestamp)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', batch)
+            for batch in batched(mood_rows()):
+                conn.executemany(
+                    'INSERT INTO mood_entries (user_id, mood, notes, timestamp) VALUES (?, ?, ?, ?)',
+                    batch)
+            mood_rollups.rebuild(conn)
+            population_rollups.rebuild(conn)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        sys.exit(f'{args.database} already exists; seed a fresh file')
+    users = seed(args.database, args.rows, args.seed)
+    print(f'Seeded {args.database}: {users} users, {args.rows} rows')
+
+
+if __name__ == '__main__':
+    main()
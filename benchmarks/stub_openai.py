@@ -0,0 +1,128 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Usage: python benchmarks/stub_openai.py [--port 8765] [--latency 0.5] [--token-delay 0.02]
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1 and any
+OPENAI_API_KEY. Both plain and ``stream: true`` requests are supported.
+``--fail-rate`` makes a fraction of requests return 500 to exercise the
+error paths.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("Start small: pick one activity you used to enjoy and schedule ten "
+         "minutes of it tomorrow morning. Notice how you feel afterwards and "
+         "write it down. Small steps add up - you are doing great.")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.0
+    token_delay = 0.0
+    fail_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        time.sleep(self.latency)
+
+        if random.random() < self.fail_rate:
+            self._send_json(500, {'error': {'message': 'stub failure', 'type': 'server_error'}})
+            return
+
+        created = int(time.time())
+        model = request.get('model', 'gpt-3.5-turbo')
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': REPLY},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {'prompt_tokens': 100, 'completion_tokens': len(REPLY.split()),
+                          'total_tokens': 100 + len(REPLY.split())},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for word in REPLY.split(' '):
+            self._write_chunk({'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk',
+                               'created': created, 'model': model,
+                               'choices': [{'index': 0, 'delta': {'content': word + ' '},
+                                            'finish_reason': None}]})
+            time.sleep(self.token_delay)
+        self._write_raw(b'data: [DONE]\n\n')
+        self._write_raw(b'')
+
+    def _write_chunk(self, body):
+        self._write_raw(f'data: {json.dumps(body)}\n\n'.encode())
+
+    def _write_raw(self, data):
+        self.wfile.write(f'{len(data):X}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+
+def start(port=0, latency=0.0, token_delay=0.0, fail_rate=0.0):
+    """Start the stub in a daemon thread and return the server."""
+    handler = type('Handler', (StubHandler,), {
+        'latency': latency, 'token_delay': token_delay, 'fail_rate': fail_rate,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5,
+                        help='seconds before the first byte of each response')
+    parser.add_argument('--token-delay', type=float, default=0.02,
+                        help='seconds between streamed tokens')
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = start(args.port, args.latency, args.token_delay, args.fail_rate)
+    print(f'Stub OpenAI listening on {base_url(server)}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
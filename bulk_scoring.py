@@ -0,0 +1,164 @@
+"""Vectorized validation and scoring of uploaded questionnaire batches.
+
+Partner clinics upload many screening responses at once, as CSV (a
+``respondent`` column plus ``q1``..``qN``) or NDJSON (one
+``{"respondent": ..., "answers": [...]}`` object per line). Parsing only
+splits the upload into a respondents list and an N x items matrix of answer
+strings; everything after that works on whole arrays: one ``searchsorted``
+against the allowed answer strings finds every invalid cell and converts the
+rest, a row sum gives every total, ``searchsorted`` maps the totals to bands
+and one column comparison per flag evaluates item flags.
+"""
+import csv
+import io
+import json
+from collections import namedtuple
+
+import numpy as np
+
+MAX_ERRORS = 100
+
+Upload = namedtuple('Upload', 'lines respondents cells')
+ScoredBatch = namedtuple('ScoredBatch', 'respondents answers totals band_ids severities flags')
+
+
+class BatchError(ValueError):
+    """The upload is malformed or has invalid rows; ``errors`` says where."""
+
+    def __init__(self, errors, invalid_rows=None):
+        super().__init__(f'{invalid_rows or len(errors)} invalid rows')
+        self.errors = errors[:MAX_ERRORS]
+        self.invalid_rows = invalid_rows or len(errors)
+
+
+def parse_csv(text, questionnaire):
+    """Split a CSV upload; the header must name q1..qN and may name ``respondent``."""
+    reader = csv.reader(io.StringIO(text))
+    # Blank lines are skipped as in the rows below, so a blank upload is empty in both formats
+    header = next((row for row in reader if any(field.strip() for field in row)), None)
+    if header is None:
+        raise ValueError('No responses in upload')
+    header = [name.strip().lower() for name in header]
+    items = [f'q{i}' for i in range(1, len(questionnaire.items) + 1)]
+    unknown = sorted(set(header) - set(items) - {'respondent'})
+    missing = [item for item in items if item not in header]
+    if unknown or missing or len(set(header)) != len(header):
+        raise BatchError([{'line': reader.line_num,
+                           'error': f'header must be respondent,{",".join(items)}'
+                                    f' (missing: {missing or "-"}, unknown: {unknown or "-"})'}])
+    columns = [header.index(item) for item in items]
+    respondent = header.index('respondent') if 'respondent' in header else None
+
+    lines, respondents, cells, errors = [], [], [], []
+    for row in reader:
+        if not any(field.strip() for field in row):
+            continue
+        if len(row) != len(header):
+            errors.append({'line': reader.line_num, 'error': f'expected {len(header)} fields, got {len(row)}'})
+            continue
+        lines.append(reader.line_num)
+        respondents.append(row[respondent].strip() if respondent is not None else str(reader.line_num))
+        cells.append([row[i] for i in columns])
+    if errors:
+        raise BatchError(errors)
+    return Upload(lines, respondents, cells)
+
+
+def parse_ndjson(text, questionnaire):
+    """Split an NDJSON upload of ``{"respondent", "answers"}`` objects.
+
+    A missing respondent defaults to the line number, as in parse_csv; null
+    or any other non-scalar value rejects the row.
+    """
+    size = len(questionnaire.items)
+    lines, respondents, cells, errors = [], [], [], []
+    for number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            errors.append({'line': number, 'error': 'not valid JSON'})
+            continue
+        answers = record.get('answers') if isinstance(record, dict) else None
+        if not isinstance(answers, list) or len(answers) != size:
+            errors.append({'line': number, 'error': f'"answers" must be a list of {size} values'})
+            continue
+        respondent = record.get('respondent', number)
+        if type(respondent) not in (str, int):
+            errors.append({'line': number, 'error': '"respondent" must be a string or an integer'})
+            continue
+        lines.append(number)
+        respondents.append(str(respondent))
+        # Only JSON integers are answers; anything else (true, 1.0, "1") fails validation
+        cells.append([str(value) if type(value) is int else json.dumps(value) for value in answers])
+    if errors:
+        raise BatchError(errors)
+    return Upload(lines, respondents, cells)
+
+
+PARSERS = {'csv': parse_csv, 'ndjson': parse_ndjson}
+
+
+def validate(questionnaire, upload):
+    """Return the answers as an int matrix, or raise BatchError naming each bad row."""
+    cells = np.char.strip(np.array(upload.cells, dtype=str).reshape(len(upload.cells), -1))
+    values = np.arange(questionnaire.min_value, questionnaire.max_value + 1)
+    # Sorted as strings ('10' < '2'), so keep each string's value alongside it
+    order = np.argsort(values.astype(str))
+    allowed, allowed_values = values.astype(str)[order], values[order]
+    position = np.minimum(np.searchsorted(allowed, cells), len(allowed) - 1)
+    valid = allowed[position] == cells
+    bad_rows = np.flatnonzero(~valid.all(axis=1))
+    if bad_rows.size:
+        first_bad = np.argmin(valid[bad_rows], axis=1)
+        raise BatchError([
+            {'line': upload.lines[row],
+             'error': f'q{item + 1} must be a whole number from {values[0]} to {values[-1]}, '
+                      f'got {str(cells[row, item])!r}'}
+            for row, item in zip(bad_rows[:MAX_ERRORS].tolist(), first_bad[:MAX_ERRORS].tolist())
+        ], invalid_rows=int(bad_rows.size))
+    return allowed_values[position].astype(np.int16)
+
+
+def score(questionnaire, respondents, answers):
+    totals = answers.sum(axis=1, dtype=np.int32)
+    bands = questionnaire.bands
+    lower_bounds = np.array([band.min_score for band in bands])
+    index = np.clip(np.searchsorted(lower_bounds, totals, side='right') - 1, 0, len(bands) - 1)
+    band_ids = np.array([band.id for band in bands])[index]
+    severities = np.array([band.severity for band in bands], dtype=object)[index]
+    flags = {flag.name: answers[:, flag.item - 1] >= flag.min_value for flag in questionnaire.flags}
+    return ScoredBatch(respondents, answers, totals, band_ids, severities, flags)
+
+
+def score_upload(questionnaire, fmt, text, max_rows):
+    """Parse, validate and score one upload.
+
+    Raises BatchError for malformed or invalid rows, ValueError for an empty
+    upload and OverflowError for one over ``max_rows``.
+    """
+    upload = PARSERS[fmt](text, questionnaire)
+    if not upload.cells:
+        raise ValueError('No responses in upload')
+    if len(upload.cells) > max_rows:
+        raise OverflowError(f'At most {max_rows} responses per upload')
+    return score(questionnaire, upload.respondents, validate(questionnaire, upload))
+
+
+def flag_lists(batch):
+    """Per row, the names of the flags it raised, as a tuple."""
+    names = list(batch.flags)
+    # Each row's flags as a bitmask, then one shared tuple per distinct mask
+    masks = np.zeros(len(batch.respondents), dtype=np.int64)
+    for bit, name in enumerate(names):
+        masks |= batch.flags[name].astype(np.int64) << bit
+    combinations = [tuple(name for bit, name in enumerate(names) if mask >> bit & 1)
+                    for mask in range(2 ** len(names))]
+    return [combinations[mask] for mask in masks.tolist()]
+
+
+def result_rows(batch):
+    """``(respondent, score, band_id, severity, flags)`` tuples for storing and returning."""
+    return list(zip(batch.respondents, batch.totals.tolist(), batch.band_ids.tolist(),
+                    batch.severities.tolist(), flag_lists(batch)))
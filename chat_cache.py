@@ -0,0 +1,150 @@
+"""Opt-in cache for first-turn chat answers.
+
+Answers are keyed by assessment type, severity band, the recommendations in
+the prompt and the normalized question. The key never includes the user, so
+only prompts built from that shared context (no user ID, no exact score) may
+be cached; ``app.prepare_chat`` takes care of that.
+"""
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import db
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_question(text):
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = _PUNCTUATION.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def cache_key(assessment_type, severity, recommendations, question):
+    parts = [assessment_type, severity, *recommendations, normalize_question(question)]
+    return hashlib.sha256('\x1f'.join(parts).encode()).hexdigest()
+
+
+class MemoryStore:
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries=1024, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """LRU with TTL in a table, shared by every worker using the database."""
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS chat_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    '''
+
+    def __init__(self, database, max_entries=1024, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = db.connect(database)
+        self._conn.execute(self.SCHEMA)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_cache_last_used ON chat_cache (last_used)')
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT response FROM chat_cache WHERE key = ? AND expires_at > ?',
+                (key, now)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE chat_cache SET last_used = ? WHERE key = ?', (now, key))
+            return row['response']
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO chat_cache (key, response, expires_at, last_used)
+                VALUES (?, ?, ?, ?)
+            ''', (key, value, now + self.ttl, now))
+            self._conn.execute('DELETE FROM chat_cache WHERE expires_at <= ?', (now,))
+            self._conn.execute('''
+                DELETE FROM chat_cache WHERE key IN (
+                    SELECT key FROM chat_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            ''', (self.max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM chat_cache').fetchone()[0]
+
+
+class ChatCache:
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.store.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self.store),
+        }
+
+
+def from_config(kind, database, max_entries, ttl):
+    """Build the cache named by CHAT_CACHE ('memory', 'sqlite'), or None."""
+    if kind == 'memory':
+        return ChatCache(MemoryStore(max_entries, ttl))
+    if kind == 'sqlite':
+        return ChatCache(SQLiteStore(database, max_entries, ttl))
+    return None
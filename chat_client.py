@@ -0,0 +1,236 @@
+"""Shared OpenAI client with a retry budget and a circuit breaker.
+
+One client (and its keep-alive connection pool) is created lazily per process
+and reused by every chat request; the ``openai`` package itself is only
+imported then. Calls that fail with connection errors, timeouts or 5xx
+responses are retried with jittered exponential backoff, but only while the
+retry budget allows it, and a circuit breaker stops calling the upstream
+altogether once its recent error rate crosses a threshold.
+"""
+import bisect
+import random
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the breaker is open."""
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed bucket bounds (in seconds)."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def snapshot(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            cumulative['+Inf' if bound == float('inf') else str(bound)] = running
+        return {'buckets': cumulative, 'count': running, 'sum': round(total, 6)}
+
+
+class RetryBudget:
+    """Allows retries only up to a fraction of recent request volume.
+
+    Keeps a retry storm from multiplying load on an upstream that is already
+    struggling: over the last ``window`` seconds, retries may not exceed
+    ``ratio`` of requests, plus a small floor so idle processes can still retry.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=3, window=10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        for events in (self._requests, self._retries):
+            while events and events[0] < now - self.window:
+                events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = max(self.min_retries, self.ratio * len(self._requests))
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    """Closed → open when the windowed failure rate trips, half-open after
+    ``cooldown`` seconds, then closed again on a successful probe."""
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window=30.0, cooldown=15.0):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.trips = 0
+        self._outcomes = deque()
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record(self, success):
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open(now)
+
+    def _open(self, now):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._outcomes.clear()
+
+    def snapshot(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                'state': self.state,
+                'trips': self.trips,
+                'window_calls': calls,
+                'window_failures': failures,
+            }
+
+
+def is_upstream_failure(e):
+    """Errors that say the upstream is unhealthy, as opposed to bad requests."""
+    import openai
+    if isinstance(e, openai.APIConnectionError):  # Includes APITimeoutError
+        return True
+    return isinstance(e, openai.APIStatusError) and e.status_code >= 500
+
+
+class UpstreamClient:
+    def __init__(self, api_key=None, base_url=None, timeout=10.0, max_connections=20,
+                 max_attempts=3, backoff_base=0.2, backoff_cap=2.0,
+                 retry_budget=None, breaker=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyHistogram()
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    def _build_client(self):
+        # Imported here: the SDK (with pydantic and httpx) takes most of a
+        # second to import, and only chat requests need it
+        import openai
+        # Build Limits from the SDK's own HTTP library rather than importing it
+        limits = type(openai.DEFAULT_CONNECTION_LIMITS)(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=30.0,
+        )
+        http_client = openai.DefaultHttpxClient(limits=limits)
+        # Retries are handled here so they can be budgeted and seen by the breaker
+        return openai.OpenAI(api_key=self.api_key, base_url=self.base_url,
+                             timeout=self.timeout, max_retries=0,
+                             http_client=http_client)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def create_chat_completion(self, **kwargs):
+        """``chat.completions.create`` guarded by the breaker and retry budget."""
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError('Upstream circuit is open')
+
+            started = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self.latency.observe(time.perf_counter() - started)
+                failure = is_upstream_failure(e)
+                self.breaker.record(success=not failure)
+                attempt += 1
+                if (not failure or attempt >= self.max_attempts
+                        or not self.retry_budget.try_spend()):
+                    raise
+                time.sleep(self.backoff(attempt))
+                continue
+
+            self.latency.observe(time.perf_counter() - started)
+            self.breaker.record(success=True)
+            return response
+
+    def snapshot(self):
+        return {
+            'breaker': self.breaker.snapshot(),
+            'latency_seconds': self.latency.snapshot(),
+        }
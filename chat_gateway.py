@@ -0,0 +1,182 @@
+"""Bounded execution of upstream chat calls.
+
+Chat completions run on a small fixed pool of worker threads instead of the
+request threads, with a hard cap on how many may wait for a worker. When the
+queue is full, callers get GatewayBusyError straight away (surfaced as 429
+with Retry-After) rather than tying up another web worker on the upstream. Callers that wait
+on the result hold a request thread meanwhile, so they have a separate,
+smaller cap (``max_blocking``) sized from the web server's thread count.
+
+Work can also be submitted as a job and polled for later. Job state lives in
+a SQLite file, so any worker process can answer the poll.
+"""
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+
+class GatewayBusyError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f'Chat queue is full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class SQLiteJobStore:
+    """Chat job status in a SQLite file shared by every worker process.
+
+    A job is ``queued``, ``running``, ``done`` (with ``response``) or
+    ``error`` (with ``error`` and ``code``). Rows expire ``ttl`` seconds
+    after the job was created.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS chat_jobs (
+            id TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            status TEXT NOT NULL,
+            result TEXT,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    '''
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, database, ttl=600):
+        self.ttl = ttl
+        self._conn = db.connect(database)
+        self._conn.execute(self.SCHEMA)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_jobs_expires ON chat_jobs (expires_at)')
+        self._conn.commit()
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def create(self, owner, status='queued', **result):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT INTO chat_jobs (id, owner, status, result, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, str(owner), status, json.dumps(result), now + self.ttl))
+            if now - self._last_sweep >= self.SWEEP_INTERVAL:
+                self._last_sweep = now
+                self._conn.execute('DELETE FROM chat_jobs WHERE expires_at <= ?', (now,))
+        return job_id
+
+    def update(self, job_id, status, **result):
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE chat_jobs SET status = ?, result = ? WHERE id = ?',
+                               (status, json.dumps(result), job_id))
+
+    def delete(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM chat_jobs WHERE id = ?', (job_id,))
+
+    def get(self, job_id, owner):
+        """``{'status': ..., **result}``, or None if unknown, expired or not owned."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, result FROM chat_jobs WHERE id = ? AND owner = ? AND expires_at > ?',
+                (job_id, str(owner), time.time())).fetchone()
+        if row is None:
+            return None
+        return {'status': row['status'], **json.loads(row['result'])}
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM chat_jobs WHERE expires_at > ?', (time.time(),)).fetchone()[0]
+
+
+class ChatGateway:
+    def __init__(self, jobs, describe_error, max_workers=4, max_queue=16, max_blocking=4):
+        """``describe_error(exc)`` maps a failed job's exception to ``(message, code)``."""
+        self.jobs = jobs
+        self.describe_error = describe_error
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_blocking = max_blocking
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='chat')
+        self._pending = 0
+        self._blocking = 0
+        self._service_time = 2.0  # EWMA of seconds per call, seeded pessimistically
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        waiting = max(0, self._pending - self.max_workers) + 1
+        return max(1, math.ceil(waiting * self._service_time / self.max_workers))
+
+    def submit(self, fn, *args, blocking=False, **kwargs):
+        """Queue ``fn`` for a worker or raise GatewayBusyError if full.
+
+        Pass ``blocking=True`` when the calling request thread will wait for
+        the result; those calls also count against ``max_blocking``.
+        """
+        with self._lock:
+            if (self._pending >= self.max_workers + self.max_queue
+                    or blocking and self._blocking >= self.max_blocking):
+                self.rejected += 1
+                raise GatewayBusyError(self.retry_after())
+            self._pending += 1
+            self._blocking += blocking
+
+        def run():
+            started = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self._pending -= 1
+                    self._blocking -= blocking
+                    self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+
+        return self._executor.submit(run)
+
+    def submit_job(self, owner, fn, *args, **kwargs):
+        """Queue ``fn`` as a job and return its id; raises GatewayBusyError if full."""
+        job_id = self.jobs.create(owner)
+
+        def run_job():
+            self.jobs.update(job_id, 'running')
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                message, code = self.describe_error(e)
+                self.jobs.update(job_id, 'error', error=message, code=code)
+            else:
+                self.jobs.update(job_id, 'done', response=result)
+
+        try:
+            self.submit(run_job)
+        except GatewayBusyError:
+            self.jobs.delete(job_id)
+            raise
+        return job_id
+
+    def completed_job(self, owner, result):
+        """Register a job whose result is already known (crisis or cache hit)."""
+        return self.jobs.create(owner, 'done', response=result)
+
+    def job(self, job_id, owner):
+        """Return the job's status dict, or None if unknown, expired or not owned."""
+        return self.jobs.get(job_id, owner)
+
+    def stats(self):
+        jobs = self.jobs.count()
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'queue_limit': self.max_queue,
+                'blocking_limit': self.max_blocking,
+                'blocking': self._blocking,
+                'in_flight': min(self._pending, self.max_workers),
+                'queued': max(0, self._pending - self.max_workers),
+                'rejected': self.rejected,
+                'service_time_seconds': round(self._service_time, 3),
+                'jobs': jobs,
+            }
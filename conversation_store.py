@@ -0,0 +1,71 @@
+"""Server-side chat history, one conversation per user and assessment result.
+
+Messages are stored with their token counts, so assembling a prompt reads
+the counts instead of re-tokenizing the history on every turn.
+"""
+import prompt_builder
+
+HISTORY_LIMIT = 40
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS conversations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        assessment_type TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_conversations_user ON conversations (user_id)',
+    '''
+    CREATE TABLE IF NOT EXISTS conversation_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id INTEGER NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('user', 'assistant')),
+        content TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (conversation_id) REFERENCES conversations (id)
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_conversation_messages
+    ON conversation_messages (conversation_id, id)
+    ''',
+]
+
+
+def init_schema(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def start(conn, user_id, assessment_type, score):
+    """Open a conversation and return its id."""
+    return conn.execute(
+        'INSERT INTO conversations (user_id, assessment_type, score) VALUES (?, ?, ?)',
+        (user_id, assessment_type, score)).lastrowid
+
+
+def owns(conn, conversation_id, user_id):
+    return conn.execute('SELECT 1 FROM conversations WHERE id = ? AND user_id = ?',
+                        (conversation_id, user_id)).fetchone() is not None
+
+
+def recent_messages(conn, conversation_id, limit=HISTORY_LIMIT):
+    """The last ``limit`` messages, oldest first, as HistoryMessage tuples."""
+    rows = conn.execute('''
+        SELECT role, content, tokens FROM conversation_messages
+        WHERE conversation_id = ? ORDER BY id DESC LIMIT ?
+    ''', (conversation_id, limit)).fetchall()
+    return [prompt_builder.HistoryMessage(*row) for row in reversed(rows)]
+
+
+def append_turn(conn, conversation_id, question, answer):
+    conn.executemany('''
+        INSERT INTO conversation_messages (conversation_id, role, content, tokens)
+        VALUES (?, ?, ?, ?)
+    ''', [(conversation_id, 'user', question, prompt_builder.count_tokens(question)),
+          (conversation_id, 'assistant', answer, prompt_builder.count_tokens(answer))])
@@ -0,0 +1,94 @@
+"""Streaming CSV and NDJSON export of a user's mood and assessment history.
+
+Rows come from one open cursor through ``fetchmany`` and are encoded (and
+optionally gzipped) one batch at a time, so an export holds a single batch
+in memory whether the history has ten rows or ten million.
+"""
+import csv
+import datetime
+import io
+import json
+import zlib
+
+BATCH_SIZE = 1000
+GZIP_LEVEL = 6
+
+# Mood rows are read in (user_id, timestamp) index order; assessments in id
+# order, which is insertion order, so neither query needs a sort
+DATASETS = {
+    'mood': (('id', 'timestamp', 'mood', 'notes'), '''
+        SELECT id, timestamp, mood, notes FROM mood_entries
+        WHERE user_id = ? AND timestamp >= ? AND timestamp < ?
+        ORDER BY timestamp, id
+    '''),
+    'assessments': (('id', 'timestamp', 'assessment_type', 'score'), '''
+        SELECT id, timestamp, assessment_type, score FROM assessments
+        WHERE user_id = ? AND timestamp >= ? AND timestamp < ?
+        ORDER BY id
+    '''),
+}
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def parse_date_range(start, end):
+    """Turn optional inclusive ``YYYY-MM-DD`` bounds into a half-open timestamp range.
+
+    Raises ValueError for malformed dates or an empty range. The bounds stay
+    ISO strings: ``timestamp`` has NUMERIC affinity, so a bare number such as
+    ``'9999'`` would be compared as an integer and match nothing.
+    """
+    first = datetime.date.fromisoformat(start) if start else None
+    last = datetime.date.fromisoformat(end) if end else None
+    if first and last and first > last:
+        raise ValueError('start must not be after end')
+    return (first.isoformat() if first else '',
+            (last + datetime.timedelta(days=1)).isoformat() if last else '9999-12-31')
+
+
+def iter_batches(conn, dataset, user_id, start, end, batch_size=BATCH_SIZE):
+    cursor = conn.execute(DATASETS[dataset][1], (user_id, start, end))
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                      for row in rows)
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(conn, dataset, fmt, user_id, start, end, gzip=False):
+    """Yield the encoded export of ``dataset`` for one user as bytes chunks."""
+    columns = DATASETS[dataset][0]
+    batches = iter_batches(conn, dataset, user_id, start, end)
+    encode = csv_chunks if fmt == 'csv' else ndjson_chunks
+    chunks = (chunk.encode() for chunk in encode(columns, batches))
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,122 @@
+"""Write-behind group commit for SQLite.
+
+Request threads hand their write to ``GroupCommitWriter.submit`` and block
+until it is durable. A single writer thread drains the queue every few
+milliseconds and applies everything it collected in one transaction, so N
+concurrent requests cost one commit instead of N commits fighting over the
+database write lock. Each write runs under its own savepoint: one failing
+write (say an IntegrityError) is rolled back and reported to its caller
+without affecting the rest of the group.
+"""
+import bisect
+import queue
+import threading
+import time
+
+import db
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def snapshot(self):
+        cumulative, running = {}, 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            running += count
+            cumulative[str(bound)] = running
+        return {'buckets': cumulative, 'count': running, 'sum': round(self.sum, 6)}
+
+
+class _Write:
+    __slots__ = ('fn', 'done', 'result', 'error')
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitWriter:
+    BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+    def __init__(self, database, max_batch=256, max_delay=0.002, pragmas=db.PRAGMAS):
+        self.database = database
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.pragmas = pragmas
+        self.batch_sizes = _Histogram(self.BATCH_BUCKETS)
+        self.commit_latency = _Histogram(self.LATENCY_BUCKETS)
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, timeout=30):
+        """Run ``fn(conn)`` in the next group and return its result once
+        the group has committed. Exceptions raised by ``fn`` are re-raised."""
+        write = _Write(fn)
+        self._queue.put(write)
+        if not write.done.wait(timeout):
+            raise TimeoutError('Group commit did not complete in time')
+        if write.error is not None:
+            raise write.error
+        return write.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = db.connect(self.database, self.pragmas)
+        conn.isolation_level = None  # Transactions are managed explicitly below
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                for write in batch:
+                    conn.execute('SAVEPOINT write')
+                    try:
+                        write.result = write.fn(conn)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO write')
+                        write.error = e
+                    conn.execute('RELEASE write')
+                conn.execute('COMMIT')
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                for write in batch:
+                    write.error = write.error or e
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self.batch_sizes.observe(len(batch))
+                self.commit_latency.observe(elapsed)
+            for write in batch:
+                write.done.set()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'batch_size': self.batch_sizes.snapshot(),
+                'commit_latency_seconds': self.commit_latency.snapshot(),
+            }
@@ -1,61 +1,37 @@
+"""Create or migrate the database schema: python init_db.py [path]
+
+The app does the same on boot (see create_app); this is for preparing a
+database ahead of a deploy. The path defaults to DATABASE_PATH.
+"""
+import os
 import sqlite3
+import sys
 from datetime import datetime
 
-def init_db():
+from dotenv import load_dotenv
+
+import db
+import schema
+
+
+def init_db(path):
     """Initialize the database with required tables and schema."""
     conn = None
     try:
-        conn = sqlite3.connect('mental_health.db')
-        c = conn.cursor()
-        
-        # Create users table (if not already existing)
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create assessments table with FIXED schema
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS assessments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                assessment_type TEXT CHECK(assessment_type IN ('phq9', 'gad7')) NOT NULL,
-                score INTEGER NOT NULL CHECK(score >= 0),
-                recommendation TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # Create mood_entries table with FIXED schema
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS mood_entries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                mood INTEGER NOT NULL CHECK(mood BETWEEN 1 AND 5),
-                notes TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # Add indexes
-        c.execute('CREATE INDEX IF NOT EXISTS idx_assessments_user ON assessments (user_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_mood_user ON mood_entries (user_id)')
-        
-        conn.commit()
-        print(f"Database initialized successfully at {datetime.now()}!")
-        
+        conn = db.connect(path)
+        migrated = schema.init_db(conn)
+        print(f"Database {path} initialized successfully at {datetime.now()}!"
+              + (f" Migrated {migrated} assessments." if migrated else ""))
     except sqlite3.Error as e:
         print(f"Error initializing database: {e}")
+        return False
     finally:
         if conn:
             conn.close()
+    return True
+
 
 if __name__ == '__main__':
-    init_db()
\ No newline at end of file
+    load_dotenv()
+    path = sys.argv[1] if len(sys.argv) > 1 else os.getenv('DATABASE_PATH', 'mental_health.db')
+    sys.exit(0 if init_db(path) else 1)
@@ -0,0 +1,267 @@
+"""In-process request metrics in the Prometheus text format.
+
+Counters and histograms are plain objects updated under a lock, cheap enough
+to leave on. Each request also collects a small breakdown (SQL, template and
+upstream time) in ``g`` for the slow-request log. Numbers are per process:
+with several workers, each scrape of /metrics sees the worker that served it.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def lines(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_format_labels(self.labels, labels)} {value}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def lines(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total))
+                            for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in series:
+            yield from histogram_lines(self.name, self.labels, labels, self.buckets, counts, total)
+
+
+def histogram_lines(name, label_names, labels, buckets, counts, total):
+    running = 0
+    for bound, count in zip(buckets + ('+Inf',), counts):
+        running += count
+        le = (('le', bound if bound == '+Inf' else repr(float(bound))),)
+        yield f'{name}_bucket{_format_labels(label_names, labels, le)} {running}'
+    yield f'{name}_sum{_format_labels(label_names, labels)} {total}'
+    yield f'{name}_count{_format_labels(label_names, labels)} {running}'
+
+
+class SnapshotHistogram:
+    """Exposes a histogram kept elsewhere through its ``snapshot()`` dict
+    (cumulative ``buckets``, ``count`` and ``sum``), as produced by
+    chat_client.LatencyHistogram and the group-commit writer."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, snapshot):
+        self.name = name
+        self.help = help
+        self.snapshot = snapshot
+
+    def lines(self):
+        snap = self.snapshot()
+        if snap is None:
+            return
+        for bound, cumulative in snap['buckets'].items():
+            le = (('le', bound if bound == '+Inf' else repr(float(bound))),)
+            yield f'{self.name}_bucket{_format_labels((), (), le)} {cumulative}'
+        yield f'{self.name}_sum {snap["sum"]}'
+        yield f'{self.name}_count {snap["count"]}'
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot_histogram(self, name, help, snapshot):
+        return self.register(SnapshotHistogram(name, help, snapshot))
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        return self.register(Histogram(name, help, buckets, labels))
+
+    def collector(self, fn):
+        """Register ``fn()`` to refresh gauges right before each scrape."""
+        self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        for collect in self.collectors:
+            collect()
+        out = []
+        for metric in self.metrics:
+            out.append(f'# HELP {metric.name} {metric.help}')
+            out.append(f'# TYPE {metric.name} {metric.kind}')
+            out.extend(metric.lines())
+        return '\n'.join(out) + '\n'
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request.',
+    labels=('endpoint', 'method', 'status'))
+REQUEST_QUERIES = registry.histogram(
+    'http_request_sql_queries', 'SQL statements executed per request.',
+    buckets=COUNT_BUCKETS, labels=('endpoint',))
+QUERY_SECONDS = registry.histogram(
+    'sql_query_duration_seconds', 'Time spent in a single SQL statement.',
+    buckets=QUERY_BUCKETS)
+TEMPLATE_SECONDS = registry.histogram(
+    'template_render_duration_seconds', 'Time spent rendering a template.',
+    labels=('template',))
+OPENAI_TOKENS = registry.counter(
+    'openai_tokens_total', 'Tokens reported by the OpenAI API.', labels=('kind',))
+RATELIMIT_REJECTIONS = registry.counter(
+    'ratelimit_rejections_total', 'Requests rejected by the rate limiter.',
+    labels=('endpoint',))
+SLOW_REQUESTS = registry.counter(
+    'slow_requests_total', 'Requests slower than SLOW_REQUEST_MS.', labels=('endpoint',))
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'sql', 'template', 'upstream', '_render_started')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.upstream = 0.0
+        self._render_started = []
+
+
+def current_stats():
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+def record_query(seconds):
+    QUERY_SECONDS.observe(seconds)
+    stats = current_stats()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql += seconds
+
+
+def record_token_usage(usage):
+    if usage is not None:
+        OPENAI_TOKENS.inc('prompt', amount=usage.prompt_tokens)
+        OPENAI_TOKENS.inc('completion', amount=usage.completion_tokens)
+
+
+@contextmanager
+def upstream_phase():
+    """Count the enclosed wait on the upstream towards the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_stats()
+        if stats is not None:
+            stats.upstream += time.perf_counter() - started
+
+
+def _before_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats._render_started.append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats._render_started:
+        elapsed = time.perf_counter() - stats._render_started.pop()
+        stats.template += elapsed
+        TEMPLATE_SECONDS.observe(elapsed, template.name or '<string>')
+
+
+def init_app(app):
+    """Time every request and log the ones slower than SLOW_REQUEST_MS."""
+    app.config.setdefault('SLOW_REQUEST_MS', 0)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+
+    @app.before_request
+    def start_request_stats():
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def finish_request_stats(response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(elapsed, endpoint, request.method, str(response.status_code))
+        REQUEST_QUERIES.observe(stats.queries, endpoint)
+
+        threshold = app.config['SLOW_REQUEST_MS']
+        if threshold and elapsed * 1000 >= threshold:
+            SLOW_REQUESTS.inc(endpoint)
+            other = elapsed - stats.sql - stats.template - stats.upstream
+            app.logger.warning(
+                'Slow request %s %s -> %s in %.1fms: sql %.1fms (%d queries), '
+                'template %.1fms, upstream %.1fms, other %.1fms',
+                request.method, request.path, response.status_code, elapsed * 1000,
+                stats.sql * 1000, stats.queries, stats.template * 1000,
+                stats.upstream * 1000, other * 1000)
+        return response
@@ -0,0 +1,251 @@
+"""Per-user mood insights computed with NumPy.
+
+A user's mood entries and assessment scores are loaded into arrays with one
+query and every metric (rolling means, volatility, streaks, weekday means,
+trend, correlation with PHQ-9/GAD-7 scores) is computed over whole arrays.
+The arrays are cached per user and patched in place when ``mood()`` inserts
+or ``delete_mood()`` removes an entry, so a page view only re-runs the
+vectorized maths. A small fingerprint query (entry and assessment counts and
+max ids) catches writes made elsewhere, such as another worker or a batch
+upload, and reloads the user.
+"""
+import datetime
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import questionnaires
+
+# julianday(date(ts)) minus this is the date's proleptic ordinal (date.toordinal())
+ORDINAL_EPOCH = 1721424.5
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+ASSESSMENT_KINDS = tuple(questionnaires.REGISTRY)
+# The registered questionnaires all ask about the last two weeks
+ASSESSMENT_WINDOW_DAYS = 14
+MIN_CORRELATION_PAIRS = 3
+RECENT_DAYS = 30
+ROLLING_SERIES_DAYS = 90
+
+# Mood rows are tagged -1, assessments with their index in ASSESSMENT_KINDS
+_KIND_CODE = ' '.join(f"WHEN '{kind}' THEN {i}" for i, kind in enumerate(ASSESSMENT_KINDS))
+LOAD_SQL = f'''
+    SELECT -1, id, julianday(date(timestamp)) - {ORDINAL_EPOCH}, mood
+    FROM mood_entries WHERE user_id = ?
+    UNION ALL
+    SELECT CASE assessment_type {_KIND_CODE} END,
+           id, julianday(date(timestamp)) - {ORDINAL_EPOCH}, score
+    FROM assessments WHERE user_id = ? AND assessment_type IN ({', '.join(repr(kind) for kind in ASSESSMENT_KINDS)})
+'''
+
+FINGERPRINT_SQL = '''
+    SELECT (SELECT COUNT(*) FROM mood_entries WHERE user_id = :user),
+           (SELECT MAX(id) FROM mood_entries WHERE user_id = :user),
+           (SELECT COUNT(*) FROM assessments WHERE user_id = :user),
+           (SELECT MAX(id) FROM assessments WHERE user_id = :user)
+'''
+
+
+def day_number(timestamp):
+    """Ordinal day of a stored ``YYYY-MM-DD HH:MM:SS`` timestamp."""
+    return datetime.date.fromisoformat(timestamp[:10]).toordinal()
+
+
+def utc_today():
+    return datetime.datetime.now(datetime.timezone.utc).date().toordinal()
+
+
+def _number(value, digits=2):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+class UserSeries:
+    """One user's entries as parallel arrays, plus the last computed insights."""
+
+    __slots__ = ('ids', 'days', 'moods', 'assessment_kinds', 'assessment_days',
+                 'assessment_scores', 'assessment_fingerprint', 'insights', 'insights_day')
+
+    def __init__(self, rows, assessment_fingerprint):
+        data = np.array(rows, dtype=np.int64).reshape(-1, 4)
+        moods = data[:, 0] == -1
+        self.ids = data[moods, 1]
+        self.days = data[moods, 2]
+        self.moods = data[moods, 3]
+        self.assessment_kinds = data[~moods, 0]
+        self.assessment_days = data[~moods, 2]
+        self.assessment_scores = data[~moods, 3]
+        self.assessment_fingerprint = assessment_fingerprint
+        self.insights = None
+        self.insights_day = None
+
+    def fingerprint(self):
+        max_id = int(self.ids.max()) if len(self.ids) else None
+        return (len(self.ids), max_id, *self.assessment_fingerprint)
+
+    def add(self, entry_id, day, mood):
+        if entry_id in self.ids:
+            return
+        self.ids = np.append(self.ids, entry_id)
+        self.days = np.append(self.days, day)
+        self.moods = np.append(self.moods, mood)
+        self.insights = None
+
+    def remove(self, entry_id):
+        keep = self.ids != entry_id
+        self.ids, self.days, self.moods = self.ids[keep], self.days[keep], self.moods[keep]
+        self.insights = None
+
+
+def compute_insights(series, today):
+    """All insight metrics for one user's arrays, as a JSON-ready dict."""
+    days, moods = series.days, series.moods
+    insights = {'entries': int(len(days)), 'days_logged': 0,
+                'rolling_mean': {'7d': None, '30d': None},
+                'volatility_30d': None, 'day_to_day_change_30d': None,
+                'streak': {'current': 0, 'longest': 0},
+                'weekday_means': dict.fromkeys(WEEKDAYS), 'trend_per_week_30d': None,
+                'assessments': {}, 'rolling': {'labels': [], '7d': [], '30d': []}}
+    if not len(days):
+        return insights
+
+    # Daily totals on a dense calendar from the first entry up to today
+    first = int(days.min())
+    length = max(today, int(days.max())) - first + 1
+    offsets = days - first
+    counts = np.bincount(offsets, minlength=length)
+    sums = np.bincount(offsets, weights=moods, minlength=length)
+    logged = counts > 0
+    daily = np.divide(sums, counts, out=np.full(length, np.nan), where=logged)
+    cum_sums = np.concatenate(([0.0], np.cumsum(sums)))
+    cum_counts = np.concatenate(([0], np.cumsum(counts)))
+
+    def window_mean(ends, window):
+        # Mean of all entries on days (end - window, end]; NaN where there are none
+        ends = np.clip(ends, -1, length - 1)
+        starts = np.maximum(ends + 1 - window, 0)
+        total = cum_sums[ends + 1] - cum_sums[starts]
+        count = cum_counts[ends + 1] - cum_counts[starts]
+        return np.divide(total, count, out=np.full(np.shape(total), np.nan), where=count > 0)
+
+    last = length - 1
+    insights['days_logged'] = int(logged.sum())
+    insights['rolling_mean'] = {f'{w}d': _number(window_mean(np.array([last]), w)[0])
+                                for w in (7, 30)}
+
+    recent = daily[-RECENT_DAYS:]
+    recent_logged = recent[~np.isnan(recent)]
+    if len(recent_logged) >= 2:
+        insights['volatility_30d'] = _number(recent_logged.std(ddof=1))
+        insights['day_to_day_change_30d'] = _number(np.abs(np.diff(recent_logged)).mean())
+        x = np.flatnonzero(~np.isnan(recent))
+        if x[-1] > x[0]:
+            insights['trend_per_week_30d'] = _number(np.polyfit(x, recent_logged, 1)[0] * 7)
+
+    # Runs of consecutive logged days
+    logged_days = np.flatnonzero(logged)
+    breaks = np.flatnonzero(np.diff(logged_days) != 1)
+    run_starts = np.concatenate(([0], breaks + 1))
+    run_ends = np.concatenate((breaks, [len(logged_days) - 1]))
+    run_lengths = run_ends - run_starts + 1
+    # Today's entry may still be coming, so a streak ending yesterday is current
+    current = int(run_lengths[-1]) if logged_days[-1] >= last - 1 else 0
+    insights['streak'] = {'current': current, 'longest': int(run_lengths.max())}
+
+    weekdays = (days - 1) % 7
+    weekday_counts = np.bincount(weekdays, minlength=7)
+    weekday_sums = np.bincount(weekdays, weights=moods, minlength=7)
+    weekday_means = np.divide(weekday_sums, weekday_counts, out=np.full(7, np.nan),
+                              where=weekday_counts > 0)
+    insights['weekday_means'] = {name: _number(v) for name, v in zip(WEEKDAYS, weekday_means)}
+
+    for code, kind in enumerate(ASSESSMENT_KINDS):
+        taken = series.assessment_kinds == code
+        if not taken.any():
+            continue
+        order = np.argsort(series.assessment_days[taken], kind='stable')
+        scores = series.assessment_scores[taken][order]
+        mood_before = window_mean(series.assessment_days[taken][order] - first,
+                                  ASSESSMENT_WINDOW_DAYS)
+        paired = ~np.isnan(mood_before)
+        correlation = None
+        if (paired.sum() >= MIN_CORRELATION_PAIRS and scores[paired].std() > 0
+                and mood_before[paired].std() > 0):
+            correlation = _number(np.corrcoef(scores[paired], mood_before[paired])[0, 1])
+        insights['assessments'][kind] = {
+            'count': int(taken.sum()),
+            'latest_score': int(scores[-1]),
+            'mood_before_latest': _number(mood_before[-1]),
+            'pairs': int(paired.sum()),
+            'mood_correlation': correlation,
+        }
+
+    span = min(ROLLING_SERIES_DAYS, length)
+    ends = np.arange(length - span, length)
+    insights['rolling'] = {
+        'labels': [datetime.date.fromordinal(first + int(i)).isoformat() for i in ends],
+        '7d': [_number(v) for v in window_mean(ends, 7)],
+        '30d': [_number(v) for v in window_mean(ends, 30)],
+    }
+    return insights
+
+
+class InsightsCache:
+    def __init__(self, max_users=256):
+        self.max_users = max_users
+        self.hits = 0
+        self.loads = 0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, conn, user_id, fingerprint):
+        rows = conn.execute(LOAD_SQL, (user_id, user_id)).fetchall()
+        series = UserSeries([tuple(row) for row in rows], fingerprint[2:])
+        with self._lock:
+            self.loads += 1
+            self._users[user_id] = series
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return series
+
+    def get(self, conn, user_id, today=None):
+        """Insights for ``user_id``, reloading only if the tables changed behind our back."""
+        today = utc_today() if today is None else today
+        fingerprint = tuple(conn.execute(FINGERPRINT_SQL, {'user': user_id}).fetchone())
+        with self._lock:
+            series = self._users.get(user_id)
+            if series is not None and series.fingerprint() == fingerprint:
+                self.hits += 1
+                self._users.move_to_end(user_id)
+                if series.insights is not None and series.insights_day == today:
+                    return series.insights
+            else:
+                series = None
+        if series is None:
+            series = self._load(conn, user_id, fingerprint)
+        insights = compute_insights(series, today)
+        with self._lock:
+            series.insights, series.insights_day = insights, today
+        return insights
+
+    def record_mood(self, user_id, entry_id, timestamp, mood):
+        """Fold a committed entry into the cached arrays, if the user is cached."""
+        with self._lock:
+            series = self._users.get(user_id)
+            if series is not None:
+                series.add(entry_id, day_number(timestamp), mood)
+
+    def remove_mood(self, user_id, entry_id):
+        with self._lock:
+            series = self._users.get(user_id)
+            if series is not None:
+                series.remove(entry_id)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'loads': self.loads, 'users': len(self._users)}
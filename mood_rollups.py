@@ -0,0 +1,190 @@
+"""Per-user daily/weekly/monthly mood rollups and chart downsampling.
+
+Rollups are kept in step with ``mood_entries`` by ``record_mood``,
+``remove_mood`` and ``refresh_buckets`` so the chart never has to scan a
+user's raw history.
+"""
+import json
+
+# Bucket start expression and bucket length for each resolution
+RESOLUTIONS = {
+    'day': ("date({ts})", '+1 day'),
+    'week': ("date({ts}, 'weekday 0', '-6 days')", '+7 days'),  # Monday start
+    'month': ("strftime('%Y-%m-01', {ts})", '+1 month'),
+}
+
+# Longest span (in days) served by each source before moving to a coarser one
+RAW_MAX_DAYS = 14
+RESOLUTION_MAX_DAYS = {'day': 730, 'week': 365 * 10}
+
+DEFAULT_POINTS = 120
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS mood_rollups (
+        user_id INTEGER NOT NULL,
+        resolution TEXT NOT NULL CHECK(resolution IN ('day', 'week', 'month')),
+        bucket DATE NOT NULL,
+        count INTEGER NOT NULL,
+        sum INTEGER NOT NULL,
+        min INTEGER NOT NULL,
+        max INTEGER NOT NULL,
+        PRIMARY KEY (user_id, resolution, bucket)
+    ) WITHOUT ROWID
+    ''',
+]
+
+
+def init_schema(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+    has_rollups = conn.execute('SELECT 1 FROM mood_rollups LIMIT 1').fetchone()
+    has_entries = conn.execute('SELECT 1 FROM mood_entries LIMIT 1').fetchone()
+    if has_entries and not has_rollups:
+        rebuild(conn)
+
+
+def rebuild(conn, user_id=None):
+    """Recompute rollups from raw entries, for one user or everyone."""
+    where, params = ('WHERE user_id = ?', (user_id,)) if user_id is not None else ('', ())
+    conn.execute(f'DELETE FROM mood_rollups {where}', params)
+    for resolution, (bucket_expr, _) in RESOLUTIONS.items():
+        bucket = bucket_expr.format(ts='timestamp')
+        conn.execute(f'''
+            INSERT INTO mood_rollups (user_id, resolution, bucket, count, sum, min, max)
+            SELECT user_id, ?, {bucket}, COUNT(*), SUM(mood), MIN(mood), MAX(mood)
+            FROM mood_entries {where}
+            GROUP BY user_id, {bucket}
+        ''', (resolution, *params))
+
+
+def record_mood(conn, entry_id):
+    """Fold a freshly inserted mood entry into every rollup resolution."""
+    for resolution, (bucket_expr, _) in RESOLUTIONS.items():
+        conn.execute(f'''
+            INSERT INTO mood_rollups (user_id, resolution, bucket, count, sum, min, max)
+            SELECT user_id, ?, {bucket_expr.format(ts='timestamp')}, 1, mood, mood, mood
+            FROM mood_entries WHERE id = ?
+            ON CONFLICT (user_id, resolution, bucket) DO UPDATE SET
+                count = count + 1,
+                sum = sum + excluded.sum,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max)
+        ''', (resolution, entry_id))
+
+
+def remove_mood(conn, user_id, timestamp):
+    """Refresh the buckets that held a deleted entry."""
+    refresh_buckets(conn, user_id, [timestamp])
+
+
+def refresh_buckets(conn, user_id, timestamps):
+    """Recompute every bucket touched by ``timestamps`` from the raw rows.
+
+    Used after deletes, since min/max cannot be decremented, and after batch
+    inserts so each bucket is written once per batch instead of once per row.
+    Each recompute is bounded by the bucket length.
+    """
+    for resolution, (bucket_expr, length) in RESOLUTIONS.items():
+        buckets = conn.execute(f'''
+            SELECT DISTINCT {bucket_expr.format(ts='value')} FROM json_each(?)
+        ''', (json.dumps(list(timestamps)),)).fetchall()
+        for (bucket,) in buckets:
+            stats = conn.execute(f'''
+                SELECT COUNT(*), SUM(mood), MIN(mood), MAX(mood)
+                FROM mood_entries
+                WHERE user_id = ? AND timestamp >= ? AND timestamp < date(?, '{length}')
+            ''', (user_id, bucket, bucket)).fetchone()
+            if stats[0]:
+                conn.execute('''
+                    INSERT OR REPLACE INTO mood_rollups
+                        (user_id, resolution, bucket, count, sum, min, max)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, resolution, bucket, *stats))
+            else:
+                conn.execute('''
+                    DELETE FROM mood_rollups
+                    WHERE user_id = ? AND resolution = ? AND bucket = ?
+                ''', (user_id, resolution, bucket))
+
+
+def pick_resolution(span_days):
+    if span_days <= RAW_MAX_DAYS:
+        return 'raw'
+    for resolution, max_days in RESOLUTION_MAX_DAYS.items():
+        if span_days <= max_days:
+            return resolution
+    return 'month'
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of ``(x, y, label)`` points.
+
+    Keeps the first and last point and, for every bucket in between, the
+    point forming the largest triangle with its neighbours, which preserves
+    the visual shape of the series.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, len(points))
+        avg_range = points[avg_start:avg_end]
+        avg_x = sum(p[0] for p in avg_range) / len(avg_range)
+        avg_y = sum(p[1] for p in avg_range) / len(avg_range)
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        ax, ay = points[a][0], points[a][1]
+        best_area, best = -1.0, range_start
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best_area, best = area, j
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+def chart_series(conn, user_id, days=None, max_points=DEFAULT_POINTS):
+    """Return chart labels/values for the last ``days`` days (all if None)."""
+    if days is None:
+        first = conn.execute('''
+            SELECT MIN(bucket) FROM mood_rollups WHERE user_id = ? AND resolution = 'month'
+        ''', (user_id,)).fetchone()[0]
+        if first is None:
+            return {'resolution': 'raw', 'labels': [], 'values': []}
+        start = first
+        span_days = conn.execute("SELECT julianday('now') - julianday(?)", (first,)).fetchone()[0]
+    else:
+        start = conn.execute("SELECT datetime('now', ?)", (f'-{int(days)} days',)).fetchone()[0]
+        span_days = days
+
+    resolution = pick_resolution(span_days)
+    if resolution == 'raw':
+        rows = conn.execute('''
+            SELECT julianday(timestamp), mood, timestamp
+            FROM mood_entries
+            WHERE user_id = ? AND timestamp >= ?
+            ORDER BY timestamp, id
+        ''', (user_id, start)).fetchall()
+    else:
+        first_bucket = RESOLUTIONS[resolution][0].format(ts='?')
+        rows = conn.execute(f'''
+            SELECT julianday(bucket), ROUND(CAST(sum AS REAL) / count, 2), bucket
+            FROM mood_rollups
+            WHERE user_id = ? AND resolution = ? AND bucket >= {first_bucket}
+            ORDER BY bucket
+        ''', (user_id, resolution, start)).fetchall()
+
+    points = lttb([tuple(row) for row in rows], max_points)
+    return {
+        'resolution': resolution,
+        'labels': [p[2] for p in points],
+        'values': [p[1] for p in points],
+    }
@@ -0,0 +1,144 @@
+"""Full-text search over mood journal notes with SQLite FTS5.
+
+``mood_notes_fts`` is an external-content index: the notes text lives only
+in ``mood_entries`` and triggers keep the index in step with every insert,
+delete and update, whichever code path writes. Each document also indexes
+an ``owner`` token (``u<user_id>``) so a query is answered by intersecting
+the user's doclist with the terms' doclists instead of matching every
+user's notes and filtering afterwards. Results are ranked with BM25 over
+the notes column only.
+
+Usage: python mood_search.py rebuild [path]    # re-index every note from mood_entries
+       python mood_search.py optimize [path]   # merge index segments into one
+       python mood_search.py check [path]      # verify the index matches mood_entries
+"""
+import html
+import os
+import re
+import sys
+
+MAX_TERMS = 16
+SNIPPET_TOKENS = 16
+# Control characters cannot appear in stored notes' HTML, so they delimit the
+# highlighted terms until the snippet has been escaped
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+SCHEMA = [
+    # Only rows with notes are indexed; the view is also what FTS5 reads back
+    # for snippets and what 'rebuild' re-indexes from
+    '''
+    CREATE VIEW IF NOT EXISTS mood_notes_source AS
+    SELECT id, notes, 'u' || user_id AS owner FROM mood_entries WHERE notes <> ''
+    ''',
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS mood_notes_fts USING fts5(
+        notes, owner,
+        content = 'mood_notes_source', content_rowid = 'id',
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS mood_notes_fts_insert AFTER INSERT ON mood_entries BEGIN
+        INSERT INTO mood_notes_fts (rowid, notes, owner)
+        SELECT new.id, new.notes, 'u' || new.user_id WHERE new.notes <> '';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS mood_notes_fts_delete AFTER DELETE ON mood_entries BEGIN
+        INSERT INTO mood_notes_fts (mood_notes_fts, rowid, notes, owner)
+        SELECT 'delete', old.id, old.notes, 'u' || old.user_id WHERE old.notes <> '';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS mood_notes_fts_update AFTER UPDATE OF notes, user_id ON mood_entries BEGIN
+        INSERT INTO mood_notes_fts (mood_notes_fts, rowid, notes, owner)
+        SELECT 'delete', old.id, old.notes, 'u' || old.user_id WHERE old.notes <> '';
+        INSERT INTO mood_notes_fts (rowid, notes, owner)
+        SELECT new.id, new.notes, 'u' || new.user_id WHERE new.notes <> '';
+    END
+    ''',
+]
+
+SEARCH_SQL = f'''
+    SELECT e.id, e.mood, e.timestamp,
+           snippet(mood_notes_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS}) AS snippet
+    FROM mood_notes_fts
+    JOIN mood_entries e ON e.id = mood_notes_fts.rowid
+    WHERE mood_notes_fts MATCH :query
+      AND e.timestamp >= :start AND e.timestamp < :end
+    ORDER BY bm25(mood_notes_fts, 1.0, 0.0), e.id DESC
+    LIMIT :limit OFFSET :offset
+'''
+
+
+def init_schema(conn):
+    """Create the index and triggers; a new index is filled from existing notes."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'mood_notes_fts'").fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    conn.execute("INSERT INTO mood_notes_fts (mood_notes_fts) VALUES ('rebuild')")
+
+
+def optimize(conn):
+    conn.execute("INSERT INTO mood_notes_fts (mood_notes_fts) VALUES ('optimize')")
+
+
+def check(conn):
+    """Raise sqlite3.DatabaseError if the index disagrees with mood_entries."""
+    conn.execute("INSERT INTO mood_notes_fts (mood_notes_fts, rank) VALUES ('integrity-check', 1)")
+
+
+def build_query(text):
+    """Turn free text into an FTS5 query of quoted terms, all required.
+
+    A trailing ``*`` on a word keeps it as a prefix search; every other
+    FTS5 operator is treated as plain text. Returns None when no terms remain.
+    """
+    terms = re.findall(r'(\w+)(\*?)', text or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    return ' AND '.join(f'"{word}"{star}' for word, star in terms)
+
+
+def highlight(snippet):
+    """Escape a snippet for HTML and wrap the matched terms in <mark>."""
+    return (html.escape(snippet)
+            .replace(_MARK_START, '<mark>')
+            .replace(_MARK_END, '</mark>'))
+
+
+def search(conn, user_id, query, start='', end='9999-12-31', limit=20, offset=0):
+    """One page of the user's entries matching ``query`` (from build_query), best first.
+
+    ``start``/``end`` bound the timestamp as a half-open range, as returned
+    by export.parse_date_range. Returns (rows, has_more).
+    """
+    rows = conn.execute(SEARCH_SQL, {
+        'query': f'owner : "u{int(user_id)}" AND ({query})',
+        'start': start, 'end': end, 'limit': limit + 1, 'offset': offset,
+    }).fetchall()
+    return rows[:limit], len(rows) > limit
+
+
+if __name__ == '__main__':
+    import db
+    from dotenv import load_dotenv
+
+    commands = {'rebuild': rebuild, 'optimize': optimize, 'check': check}
+    if len(sys.argv) not in (2, 3) or sys.argv[1] not in commands:
+        sys.exit(__doc__.split('\n\n')[-1])
+    load_dotenv()
+    path = sys.argv[2] if len(sys.argv) == 3 else os.getenv('DATABASE_PATH', 'mental_health.db')
+    conn = db.connect(path)
+    try:
+        with conn:
+            commands[sys.argv[1]](conn)
+    finally:
+        conn.close()
+    print(f'{sys.argv[1]}: ok ({path})')
@@ -0,0 +1,88 @@
+"""Rendered-page cache and conditional GET for mostly static routes.
+
+Pages like the landing page only change with the navbar's login state, so
+their rendered bytes are kept per (endpoint, username) variant and served with
+a strong ETag; a matching If-None-Match gets a bodiless 304. Anonymous pages
+may be cached by browsers for ``max_age`` seconds (PAGE_CACHE_MAX_AGE by
+default), signed-in pages must be revalidated. Requests with pending flash
+messages bypass the cache, as does debug mode so template edits show up
+immediately.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+
+class PageCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+def auth_variant():
+    """The part of the session the navbar renders: who is logged in, if anyone."""
+    return session.get('username') if 'user_id' in session else None
+
+
+def cached_page(cache, max_age=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_app.debug or '_flashes' in session:
+                response = make_response(view(*args, **kwargs))
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+
+            user = auth_variant()
+            key = (request.endpoint, user, tuple(sorted(kwargs.items())))
+            entry = cache.get(key)
+            if entry is None:
+                body = make_response(view(*args, **kwargs)).get_data()
+                entry = (body, hashlib.sha256(body).hexdigest()[:32])
+                cache.set(key, entry)
+
+            body, etag = entry
+            response = current_app.response_class(body, mimetype='text/html')
+            response.set_etag(etag)
+            if user is None:
+                response.cache_control.public = True
+                response.cache_control.max_age = (
+                    max_age if max_age is not None else current_app.config.get('PAGE_CACHE_MAX_AGE', 300))
+            else:
+                response.cache_control.private = True
+                response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
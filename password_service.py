@@ -0,0 +1,75 @@
+"""Password hashing off the request threads.
+
+Hashing and verification are deliberately slow, so they run in a small
+process pool instead of on web workers. The number of outstanding jobs is
+capped: once ``max_pending`` are queued, new requests fail fast with
+PasswordServiceBusy rather than stacking up behind a login storm.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when too many hash/verify jobs are already waiting."""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(stored_hash, password):
+    return check_password_hash(stored_hash, password)
+
+
+def hash_method(stored_hash):
+    """The method prefix of a werkzeug hash, e.g. ``pbkdf2:sha256:600000``."""
+    return stored_hash.split('$', 1)[0]
+
+
+class PasswordService:
+    def __init__(self, method='pbkdf2:sha256', max_workers=2, max_pending=64):
+        self.method = method
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._current_method = None
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        if not self.max_workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise PasswordServiceBusy('Password hashing queue is full')
+        try:
+            if self._executor is None:
+                with self._lock:
+                    if self._executor is None:
+                        # spawn: never fork a process that is running request threads
+                        self._executor = ProcessPoolExecutor(
+                            self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run(_verify, stored_hash, password)
+
+    def current_method(self):
+        """The full method string (with default cost filled in) new hashes use."""
+        if self._current_method is None:
+            self._current_method = hash_method(self.hash(''))
+        return self._current_method
+
+    def needs_rehash(self, stored_hash):
+        return hash_method(stored_hash) != self.current_method()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
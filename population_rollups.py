@@ -0,0 +1,286 @@
+"""Weekly population-level rollups for clinical oversight dashboards.
+
+Three tables are kept in step with every write, the same way ``mood_rollups``
+is for per-user charts:
+
+- ``population_band_weekly``: assessments per week, type and severity band
+- ``population_band_moves``: per week and type, how many assessments landed
+  in each band given the user's previous band of that type
+- ``population_mood_weekly``: mood entries, their sum and the number of
+  distinct users who logged a mood, per week
+
+Dashboards read a handful of rows per week, whatever the number of users.
+Weeks start on Monday, as in ``mood_rollups``.
+
+``backfill`` rebuilds everything from history one chunk of users per
+transaction. While it runs, ``population_backfill`` holds the first user id
+not yet rebuilt; live writes for users at or above it are left to the
+backfill, so rows are neither missed nor counted twice and an interrupted
+backfill resumes where it stopped.
+
+Usage: python population_rollups.py backfill [path] [--restart]
+"""
+import json
+import os
+import sys
+
+import mood_rollups
+
+CHUNK_USERS = 500
+
+WEEK = mood_rollups.RESOLUTIONS['week'][0]
+# Users below this id are reflected in the rollups; everyone when no backfill runs
+BACKFILLED_BELOW = '(SELECT COALESCE(MAX(next_user_id), 9223372036854775807) FROM population_backfill)'
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS population_band_weekly (
+        week DATE NOT NULL,
+        assessment_type TEXT NOT NULL,
+        band_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (week, assessment_type, band_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS population_band_moves (
+        week DATE NOT NULL,
+        assessment_type TEXT NOT NULL,
+        from_band_id INTEGER NOT NULL,
+        to_band_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (week, assessment_type, from_band_id, to_band_id)
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS population_mood_weekly (
+        week DATE PRIMARY KEY,
+        entries INTEGER NOT NULL,
+        mood_sum INTEGER NOT NULL,
+        users INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS population_backfill (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        next_user_id INTEGER NOT NULL
+    )
+    ''',
+    # Finds a user's previous assessment of the same type
+    'CREATE INDEX IF NOT EXISTS idx_assessments_user_type ON assessments (user_id, assessment_type)',
+]
+
+
+def init_schema(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'population_mood_weekly'").fetchone()
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild(conn)
+
+
+def record_assessment(conn, assessment_id):
+    """Fold a freshly inserted assessment into its week's band and move counts."""
+    conn.execute(f'''
+        INSERT INTO population_band_weekly (week, assessment_type, band_id, count)
+        SELECT {WEEK.format(ts='timestamp')}, assessment_type, band_id, 1
+        FROM assessments WHERE id = ? AND user_id < {BACKFILLED_BELOW}
+        ON CONFLICT (week, assessment_type, band_id) DO UPDATE SET count = count + 1
+    ''', (assessment_id,))
+    conn.execute(f'''
+        INSERT INTO population_band_moves (week, assessment_type, from_band_id, to_band_id, count)
+        SELECT {WEEK.format(ts='a.timestamp')}, a.assessment_type, p.band_id, a.band_id, 1
+        FROM assessments a
+        JOIN assessments p ON p.id = (
+            SELECT id FROM assessments
+            WHERE user_id = a.user_id AND assessment_type = a.assessment_type AND id < a.id
+            ORDER BY id DESC LIMIT 1)
+        WHERE a.id = ? AND a.user_id < {BACKFILLED_BELOW}
+        ON CONFLICT (week, assessment_type, from_band_id, to_band_id) DO UPDATE SET count = count + 1
+    ''', (assessment_id,))
+
+
+def record_mood(conn, entry_id):
+    """Fold a freshly inserted mood entry into its week."""
+    week = WEEK.format(ts='e.timestamp')
+    conn.execute(f'''
+        INSERT INTO population_mood_weekly (week, entries, mood_sum, users)
+        SELECT {week}, 1, e.mood, NOT EXISTS (
+            SELECT 1 FROM mood_entries o
+            WHERE o.user_id = e.user_id AND o.id <> e.id
+              AND o.timestamp >= {week} AND o.timestamp < date({week}, '+7 days'))
+        FROM mood_entries e WHERE e.id = ? AND e.user_id < {BACKFILLED_BELOW}
+        ON CONFLICT (week) DO UPDATE SET
+            entries = entries + 1,
+            mood_sum = mood_sum + excluded.mood_sum,
+            users = users + excluded.users
+    ''', (entry_id,))
+
+
+def mood_weeks(conn, user_id, timestamps):
+    """The user's ``(entries, mood sum)`` in each week touched by ``timestamps``.
+
+    Taken before and after a batch insert or a delete; ``apply_mood_weeks``
+    turns the difference into population deltas.
+    """
+    weeks = conn.execute(f'''
+        SELECT DISTINCT {WEEK.format(ts='value')} FROM json_each(?)
+    ''', (json.dumps(list(timestamps)),)).fetchall()
+    return {week: tuple(conn.execute('''
+        SELECT COUNT(*), COALESCE(SUM(mood), 0) FROM mood_entries
+        WHERE user_id = ? AND timestamp >= ? AND timestamp < date(?, '+7 days')
+    ''', (user_id, week, week)).fetchone()) for (week,) in weeks}
+
+
+def apply_mood_weeks(conn, user_id, before):
+    """Apply the change in the user's weeks since ``before`` (from mood_weeks)."""
+    if user_id >= conn.execute(f'SELECT {BACKFILLED_BELOW}').fetchone()[0]:
+        return
+    after = mood_weeks(conn, user_id, before)
+    for week, (entries, mood_sum) in after.items():
+        old_entries, old_sum = before[week]
+        if (entries, mood_sum) == (old_entries, old_sum):
+            continue
+        conn.execute('''
+            INSERT INTO population_mood_weekly (week, entries, mood_sum, users)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (week) DO UPDATE SET
+                entries = entries + excluded.entries,
+                mood_sum = mood_sum + excluded.mood_sum,
+                users = users + excluded.users
+        ''', (week, entries - old_entries, mood_sum - old_sum, (entries > 0) - (old_entries > 0)))
+        conn.execute('DELETE FROM population_mood_weekly WHERE week = ? AND entries <= 0', (week,))
+
+
+def start_backfill(conn):
+    """Empty the rollups and mark every user as not yet rebuilt."""
+    for table in ('population_band_weekly', 'population_band_moves', 'population_mood_weekly'):
+        conn.execute(f'DELETE FROM {table}')
+    conn.execute('INSERT OR REPLACE INTO population_backfill (id, next_user_id) VALUES (1, 0)')
+
+
+def backfill_chunk(conn, chunk_users=CHUNK_USERS):
+    """Rebuild the next ``chunk_users`` users' history; returns False once done."""
+    row = conn.execute('SELECT next_user_id FROM population_backfill').fetchone()
+    if row is None:
+        return False
+    low = row[0]
+    high = conn.execute('SELECT id FROM users WHERE id >= ? ORDER BY id LIMIT 1 OFFSET ?',
+                        (low, chunk_users)).fetchone()
+    # The last chunk is open-ended so rows of users without a users row count too
+    high = high[0] if high else 9223372036854775807
+    users = {'low': low, 'high': high}
+
+    conn.execute(f'''
+        INSERT INTO population_band_weekly (week, assessment_type, band_id, count)
+        SELECT {WEEK.format(ts='timestamp')}, assessment_type, band_id, COUNT(*)
+        FROM assessments WHERE user_id >= :low AND user_id < :high
+        GROUP BY 1, 2, 3
+        ON CONFLICT (week, assessment_type, band_id) DO UPDATE SET count = count + excluded.count
+    ''', users)
+    conn.execute(f'''
+        INSERT INTO population_band_moves (week, assessment_type, from_band_id, to_band_id, count)
+        SELECT week, assessment_type, from_band_id, band_id, COUNT(*)
+        FROM (
+            SELECT {WEEK.format(ts='timestamp')} AS week, assessment_type, band_id,
+                   LAG(band_id) OVER (PARTITION BY user_id, assessment_type ORDER BY id) AS from_band_id
+            FROM assessments WHERE user_id >= :low AND user_id < :high
+        )
+        WHERE from_band_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (week, assessment_type, from_band_id, to_band_id) DO UPDATE SET
+            count = count + excluded.count
+    ''', users)
+    conn.execute(f'''
+        INSERT INTO population_mood_weekly (week, entries, mood_sum, users)
+        SELECT week, SUM(entries), SUM(mood_sum), COUNT(*)
+        FROM (
+            SELECT {WEEK.format(ts='timestamp')} AS week, COUNT(*) AS entries, SUM(mood) AS mood_sum
+            FROM mood_entries WHERE user_id >= :low AND user_id < :high
+            GROUP BY user_id, 1
+        )
+        WHERE true
+        GROUP BY week
+        ON CONFLICT (week) DO UPDATE SET
+            entries = entries + excluded.entries,
+            mood_sum = mood_sum + excluded.mood_sum,
+            users = users + excluded.users
+    ''', users)
+
+    if high == 9223372036854775807:
+        conn.execute('DELETE FROM population_backfill')
+        return False
+    conn.execute('UPDATE population_backfill SET next_user_id = ?', (high,))
+    return True
+
+
+def rebuild(conn, chunk_users=CHUNK_USERS):
+    """Rebuild everything inside the caller's transaction."""
+    start_backfill(conn)
+    while backfill_chunk(conn, chunk_users):
+        pass
+
+
+def backfill(conn, chunk_users=CHUNK_USERS, restart=False):
+    """Rebuild from history, committing after each chunk; resumes unless ``restart``.
+
+    Returns the number of chunks processed.
+    """
+    with conn:
+        if restart or not conn.execute('SELECT 1 FROM population_backfill').fetchone():
+            start_backfill(conn)
+    chunks, more = 0, True
+    while more:
+        with conn:
+            more = backfill_chunk(conn, chunk_users)
+        chunks += 1
+    return chunks
+
+
+def week_range(conn, weeks):
+    """Monday of the week ``weeks - 1`` weeks ago and of the current week."""
+    return conn.execute(f'''
+        SELECT date({WEEK.format(ts="'now'")}, ?), {WEEK.format(ts="'now'")}
+    ''', (f'-{7 * (weeks - 1)} days',)).fetchone()
+
+
+def band_counts(conn, assessment_type, first, last):
+    return conn.execute('''
+        SELECT week, band_id, count FROM population_band_weekly
+        WHERE week >= ? AND week <= ? AND assessment_type = ?
+        ORDER BY week
+    ''', (first, last, assessment_type)).fetchall()
+
+
+def band_moves(conn, assessment_type, first, last):
+    return conn.execute('''
+        SELECT week, from_band_id, to_band_id, count FROM population_band_moves
+        WHERE week >= ? AND week <= ? AND assessment_type = ?
+        ORDER BY week
+    ''', (first, last, assessment_type)).fetchall()
+
+
+def mood_trend(conn, first, last):
+    return conn.execute('''
+        SELECT week, entries, mood_sum, users FROM population_mood_weekly
+        WHERE week >= ? AND week <= ?
+        ORDER BY week
+    ''', (first, last)).fetchall()
+
+
+if __name__ == '__main__':
+    import db
+    from dotenv import load_dotenv
+
+    args = [arg for arg in sys.argv[1:] if arg != '--restart']
+    if not args or args[0] != 'backfill' or len(args) > 2:
+        sys.exit(__doc__.split('\n\n')[-1])
+    load_dotenv()
+    path = args[1] if len(args) == 2 else os.getenv('DATABASE_PATH', 'mental_health.db')
+    conn = db.connect(path)
+    try:
+        chunks = backfill(conn, restart='--restart' in sys.argv)
+    finally:
+        conn.close()
+    print(f'backfill: {chunks} chunks of up to {CHUNK_USERS} users ({path})')
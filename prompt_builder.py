@@ -0,0 +1,146 @@
+"""Token-budgeted chat prompt assembly.
+
+Tokens are counted locally: with ``tiktoken`` when it is installed and its
+encoding can be loaded, otherwise with an estimate that errs slightly high.
+The system prompt depends only on the assessment context, so it is built and
+counted once per context and reused. History is fitted into the budget from
+the newest turn back; turns that do not fit are replaced by a short note
+listing what the user asked earlier, so no extra model call is needed.
+"""
+import logging
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+MODEL = 'gpt-3.5-turbo'
+# Each chat message is framed by a few tokens, and the reply is primed with three
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+SUMMARY_TOKENS = 120
+SUMMARY_QUESTION_WORDS = 20
+
+SYSTEM_TEMPLATE = """You are a mental health support assistant. Context:
+- Assessment: {assessment}
+- Recommendations: {recommendations}
+
+Guidelines:
+1. Provide practical, non-medical advice
+2. Focus on implementing recommendations
+3. Use simple language (8th grade level)
+4. Keep responses under 150 words
+5. Include concrete examples
+6. End with encouragement
+7. Never suggest medications"""
+
+_PIECES = re.compile(r'\w+|[^\w\s]')
+
+HistoryMessage = namedtuple('HistoryMessage', 'role content tokens')
+Prompt = namedtuple('Prompt', 'messages tokens kept dropped')
+
+logger = logging.getLogger(__name__)
+
+
+class PromptTooLong(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(MODEL)
+    except Exception:
+        # The BPE ranks are downloaded on first use, which can fail offline
+        logger.warning('tiktoken encoding unavailable; estimating token counts', exc_info=True)
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # About one token per short word or symbol, plus one per further four
+    # bytes of longer words (bytes, so non-Latin scripts are not undercounted)
+    total = 0
+    for piece in _PIECES.findall(text):
+        size = len(piece) if piece.isascii() else len(piece.encode())
+        total += 1 + (size - 1) // 4
+    return total
+
+
+@lru_cache(maxsize=512)
+def system_prompt(assessment, recommendations):
+    """Return ``(content, tokens)`` for one assessment context.
+
+    ``assessment`` is the line describing the result, e.g. ``PHQ9 (12/27)``;
+    ``recommendations`` a tuple of recommendation texts.
+    """
+    content = SYSTEM_TEMPLATE.format(assessment=assessment,
+                                     recommendations=', '.join(recommendations))
+    return content, count_tokens(content) + MESSAGE_OVERHEAD
+
+
+def summarize_questions(messages, max_tokens=SUMMARY_TOKENS):
+    """A note listing the user's questions in ``messages``, newest first."""
+    prefix = 'Earlier in this conversation the user asked about: '
+    used = count_tokens(prefix) + MESSAGE_OVERHEAD
+    questions = []
+    for message in reversed(messages):
+        if message.role != 'user':
+            continue
+        words = message.content.split()
+        question = ' '.join(words[:SUMMARY_QUESTION_WORDS]) + ('...' if len(words) > SUMMARY_QUESTION_WORDS else '')
+        cost = count_tokens(question) + 1
+        if used + cost > max_tokens:
+            break
+        questions.append(question)
+        used += cost
+    if not questions:
+        return None, 0
+    return prefix + '; '.join(questions), used
+
+
+def build(system, history, message, budget, summary_tokens=SUMMARY_TOKENS):
+    """Assemble the messages for one completion within ``budget`` tokens.
+
+    ``system`` is a ``system_prompt()`` result, ``history`` a list of
+    HistoryMessage oldest first. Raises PromptTooLong when the system prompt
+    and new message alone exceed the budget.
+    """
+    system_content, system_tokens = system
+    message_tokens = count_tokens(message) + MESSAGE_OVERHEAD
+    remaining = budget - system_tokens - message_tokens - REPLY_OVERHEAD
+    if remaining < 0:
+        raise PromptTooLong(f'message needs {message_tokens} tokens, '
+                            f'{budget - system_tokens - REPLY_OVERHEAD} available')
+
+    costs = [m.tokens + MESSAGE_OVERHEAD for m in history]
+    if sum(costs) > remaining:
+        # Something will be dropped: keep room for the note that replaces it
+        remaining -= min(summary_tokens, remaining)
+    start = len(history)
+    while start and costs[start - 1] <= remaining:
+        start -= 1
+        remaining -= costs[start]
+    # Never open the kept history with an answer to a dropped question
+    while start < len(history) and history[start].role != 'user':
+        remaining += costs[start]
+        start += 1
+
+    messages = [{'role': 'system', 'content': system_content}]
+    tokens = system_tokens + message_tokens + REPLY_OVERHEAD
+    if start:
+        note, note_tokens = summarize_questions(history[:start], summary_tokens)
+        if note:
+            messages.append({'role': 'system', 'content': note})
+            tokens += note_tokens
+    messages.extend({'role': m.role, 'content': m.content} for m in history[start:])
+    messages.append({'role': 'user', 'content': message})
+    tokens += sum(costs[start:])
+    return Prompt(messages, tokens, len(history) - start, start)
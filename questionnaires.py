@@ -0,0 +1,95 @@
+"""Questionnaire definitions: items, answer range, item flags and bands.
+
+Every screening instrument the app scores is described here once. The
+in-app assessment pages and the bulk scoring API both read this registry;
+severity bands (with their stable ids and recommendation texts) come from
+the recommendations catalog under the same key. Adding an instrument means
+adding its definition here and its bands there.
+"""
+from collections import namedtuple
+
+import recommendations
+
+Flag = namedtuple('Flag', 'name item min_value description')
+
+
+class Questionnaire(namedtuple('Questionnaire', 'key name title description items options flags')):
+    """One instrument. ``options`` are the answer labels for values 0..n-1;
+    ``flags`` mark single items that need follow-up whatever the total."""
+
+    __slots__ = ()
+
+    @property
+    def min_value(self):
+        return 0
+
+    @property
+    def max_value(self):
+        return len(self.options) - 1
+
+    @property
+    def max_score(self):
+        return len(self.items) * self.max_value
+
+    @property
+    def bands(self):
+        return recommendations.CATALOG[self.key]
+
+    def score(self, answers):
+        """Total of ``answers``, each clamped to the answer range."""
+        return sum(max(self.min_value, min(self.max_value, value)) for value in answers)
+
+    def flagged(self, answers):
+        """Names of the flags raised by ``answers``."""
+        return [flag.name for flag in self.flags if answers[flag.item - 1] >= flag.min_value]
+
+
+FREQUENCY_OPTIONS = ('Not at all', 'Several days', 'More than half the days', 'Nearly every day')
+
+PHQ9 = Questionnaire(
+    key='phq9',
+    name='PHQ-9',
+    title='PHQ-9 Depression Assessment',
+    description='Depression Assessment',
+    items=(
+        "Little interest or pleasure in doing things?",
+        "Feeling down, depressed, or hopeless?",
+        "Trouble falling/staying asleep, or sleeping too much?",
+        "Feeling tired or having little energy?",
+        "Poor appetite or overeating?",
+        "Feeling bad about yourself - worthlessness?",
+        "Trouble concentrating on things?",
+        "Moving/speaking slowly or being fidgety?",
+        "Thoughts of self-harm or suicide?",
+    ),
+    options=FREQUENCY_OPTIONS,
+    flags=(
+        # Any answer above "Not at all" on item 9 needs a same-day safety check
+        Flag('suicidal_ideation', 9, 1, 'Thoughts of self-harm or suicide'),
+    ),
+)
+
+GAD7 = Questionnaire(
+    key='gad7',
+    name='GAD-7',
+    title='GAD-7 Anxiety Assessment',
+    description='Anxiety Assessment',
+    items=(
+        "Feeling nervous, anxious, or on edge?",
+        "Not being able to stop worrying?",
+        "Worrying too much about different things?",
+        "Trouble relaxing?",
+        "Being so restless it's hard to sit still?",
+        "Becoming easily annoyed/irritable?",
+        "Feeling afraid of something awful happening?",
+    ),
+    options=FREQUENCY_OPTIONS,
+    flags=(),
+)
+
+REGISTRY = {questionnaire.key: questionnaire for questionnaire in (PHQ9, GAD7)}
+
+
+def get(key):
+    """The Questionnaire registered as ``key`` (case-insensitive), or None."""
+    return REGISTRY.get((key or '').lower())
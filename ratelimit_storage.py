@@ -0,0 +1,159 @@
+"""Rate-limit counters in a SQLite file shared by every worker on the host.
+
+The default in-memory storage is per process, so with N workers each one
+enforces its own copy of every limit. Pointing the limiter at
+``sqlite:///ratelimit.db`` (registered here as the ``sqlite`` scheme) keeps a
+single set of counters in a WAL-mode database instead. It needs no extra
+service, and counters are disposable, so the file is written with
+``synchronous=OFF``; put it on tmpfs (``sqlite:////dev/shm/ratelimit.db``)
+to skip the disk entirely.
+
+Fixed-window increments are one UPSERT statement, and sliding-window-counter
+checks read and bump both windows inside one ``BEGIN IMMEDIATE`` transaction,
+so concurrent workers can never both take the last slot.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from limits.storage import SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'OFF'),
+    ('busy_timeout', 5000),
+)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS ratelimit_counters (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL,
+        expires_at REAL NOT NULL
+    ) WITHOUT ROWID
+'''
+
+_INCR = '''
+    INSERT INTO ratelimit_counters (key, value, expires_at) VALUES (?1, ?2, ?3)
+    ON CONFLICT (key) DO UPDATE SET
+        value = CASE WHEN expires_at <= ?4 THEN excluded.value ELSE value + excluded.value END,
+        expires_at = CASE WHEN expires_at <= ?4 THEN excluded.expires_at ELSE expires_at END
+    RETURNING value
+'''
+
+_GET = 'SELECT value FROM ratelimit_counters WHERE key = ? AND expires_at > ?'
+
+# Expired rows are harmless (reads ignore them); sweep them now and then
+PURGE_EVERY = 1000
+
+
+def database_from_uri(uri):
+    """``sqlite:///relative.db`` or ``sqlite:////absolute/path.db``."""
+    path = uri.split('://', 1)[1]
+    return path[1:] if path.startswith('/') else path
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        self.database = database_from_uri(uri)
+        self._local = threading.local()
+        self._ops = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._conn.execute(SCHEMA)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    @property
+    def _conn(self):
+        # One connection per thread, and never one inherited across a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.database, isolation_level=None)
+            for name, value in PRAGMAS:
+                conn.execute(f'PRAGMA {name} = {value}')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _maybe_purge(self, conn, now):
+        self._ops += 1
+        if self._ops % PURGE_EVERY == 0:
+            conn.execute('DELETE FROM ratelimit_counters WHERE expires_at <= ?', (now,))
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        conn = self._conn
+        self._maybe_purge(conn, now)
+        # fetchall() steps the statement to completion so the write lock is released
+        return conn.execute(_INCR, (key, amount, now + expiry, now)).fetchall()[0][0]
+
+    def get(self, key):
+        row = self._conn.execute(_GET, (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._conn.execute(
+            'SELECT expires_at FROM ratelimit_counters WHERE key = ? AND expires_at > ?',
+            (key, now)).fetchone()
+        return row[0] if row else now
+
+    def clear(self, key):
+        self._conn.execute('DELETE FROM ratelimit_counters WHERE key = ?', (key,))
+
+    def check(self):
+        try:
+            self._conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._conn.execute('DELETE FROM ratelimit_counters').rowcount
+
+    def _window(self, conn, key, expiry, now):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous = conn.execute(_GET, (previous_key, now)).fetchone()
+        current = conn.execute(_GET, (current_key, now)).fetchone()
+        previous_count = previous[0] if previous else 0
+        current_count = current[0] if current else 0
+        if previous_count:
+            previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry
+        else:
+            previous_ttl = 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, (previous_count, previous_ttl, current_count, current_ttl)
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        now = time.time()
+        conn = self._conn
+        self._maybe_purge(conn, now)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current_key, (previous_count, previous_ttl, current_count, _) = \
+                self._window(conn, key, expiry, now)
+            weighted = previous_count * previous_ttl / expiry + current_count
+            allowed = math.floor(weighted) + amount <= limit
+            if allowed:
+                # Kept for two periods: it is the previous window in the next one
+                conn.execute(_INCR, (current_key, amount, now + 2 * expiry, now)).fetchall()
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+    def get_sliding_window(self, key, expiry):
+        return self._window(self._conn, key, expiry, time.time())[1]
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._conn.execute('DELETE FROM ratelimit_counters WHERE key IN (?, ?)',
+                           (previous_key, current_key))
@@ -0,0 +1,152 @@
+"""Versioned recommendation catalog for PHQ-9 and GAD-7 severity bands.
+
+Each band has a stable integer id. Assessments store that id instead of a
+copy of the recommendation text, and the texts live once in the
+``recommendation_bands`` table. Publishing changed texts means adding bands
+with new ids under a new ``CATALOG_VERSION``; old rows keep pointing at the
+bands they were scored against.
+"""
+import bisect
+import json
+from collections import namedtuple
+
+CATALOG_VERSION = 1
+
+Band = namedtuple('Band', 'id min_score max_score severity recommendations')
+
+CATALOG = {
+    'phq9': [
+        Band(1, 0, 4, "Minimal Depression", (
+            "Daily Practice: Maintain mood journaling with focus on positive experiences",
+            "Behavioral Activation: Schedule 1 pleasurable activity daily (e.g., 15-min walk, creative hobby)",
+            "Sleep Hygiene: Consistent sleep schedule (7-9 hours), no screens 1 hour before bed",
+            "Social Connection: Weekly social activity with friends/family",
+            "Monitoring: Retake PHQ-9 in 2 weeks or if symptoms worsen",
+        )),
+        Band(2, 5, 9, "Mild Depression", (
+            "Structured Program: 6-week online CBT program (30 mins/day) focusing on cognitive restructuring",
+            "Behavioral Activation: Graded task scheduling starting with small achievable goals",
+            "Physical Activity: 150 mins/week moderate exercise (e.g., brisk walking, yoga)",
+            "Social Prescription: Join local peer support group meeting weekly",
+            "Professional Check-in: Consult GP for baseline health check within 2 weeks",
+        )),
+        Band(3, 10, 14, "Moderate Depression", (
+            "Therapist Referral: Weekly CBT sessions for 8-12 weeks (45 mins/session)",
+            "Medication Options: Discuss SSRI antidepressants with psychiatrist",
+            "Safety Plan: Create crisis plan including emergency contacts",
+            "Workplace Support: Request occupational health assessment",
+            "Monitoring: Weekly PHQ-9 tracking with automatic alerts to designated contact",
+        )),
+        Band(4, 15, 19, "Moderately Severe Depression", (
+            "Urgent Care: Same-day mental health team assessment",
+            "Combination Therapy: SSRI medication + twice-weekly therapy sessions",
+            "Daily Check-ins: Automated safety check system with crisis team",
+            "Functional Support: Apply for temporary disability accommodations",
+            "Crisis Plan: 24/7 access to crisis hotline and emergency contacts",
+        )),
+        Band(5, 20, 27, "Severe Depression", (
+            "Immediate Care: Emergency psychiatric evaluation within 24 hours",
+            "Intensive Treatment: Consider day program or inpatient care",
+            "Medication Management: Daily monitoring of antidepressant regimen",
+            "Social Support: Activate caregiver support network",
+            "Safety Protocol: Remove access to potential self-harm means",
+        )),
+    ],
+    'gad7': [
+        Band(6, 0, 4, "Minimal Anxiety", (
+            "Preventive Practice: Daily 10-min mindfulness breathing exercises",
+            "Worry Management: Scheduled 15-min 'worry time' with journaling",
+            "Stress Reduction: Progressive muscle relaxation before bed",
+            "Lifestyle Balance: Maintain consistent work/leisure ratio",
+            "Education: Complete online anxiety psychoeducation course",
+        )),
+        Band(7, 5, 9, "Mild Anxiety", (
+            "CBT Tools: 8-week anxiety workbook with weekly exercises",
+            "Exposure Therapy: Gradual hierarchy practice for top 3 fears",
+            "Sleep Protocol: Implement strict caffeine curfew (none after 2pm)",
+            "Physical Regulation: Daily diaphragmatic breathing (4-7-8 technique)",
+            "Social Support: Bi-weekly anxiety management workshop",
+        )),
+        Band(8, 10, 14, "Moderate Anxiety", (
+            "Specialist Referral: Weekly therapy (CBT or ACT) for 12 weeks",
+            "Medication Options: Consider short-term anxiolytic use",
+            "Workplace Adjustments: Flexible hours during treatment phase",
+            "Sensory Regulation: Daily weighted blanket use (20 mins)",
+            "Crisis Prevention: Install panic button app with GPS alerts",
+        )),
+        Band(9, 15, 21, "Severe Anxiety", (
+            "Immediate Intervention: Daily therapist check-ins for 1 week",
+            "Medication Plan: SSRI/SNRI trial with weekly psychiatrist reviews",
+            "Functional Support: Temporary medical leave authorization",
+            "Safety Measures: 24/7 crisis text line integration",
+            "Intensive Program: 4-week anxiety disorder day treatment",
+        )),
+    ],
+}
+
+BANDS_BY_ID = {band.id: band for bands in CATALOG.values() for band in bands}
+_UPPER_BOUNDS = {kind: [band.max_score for band in bands] for kind, bands in CATALOG.items()}
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS recommendation_bands (
+        id INTEGER PRIMARY KEY,
+        catalog_version INTEGER NOT NULL,
+        assessment_type TEXT NOT NULL,
+        min_score INTEGER NOT NULL,
+        max_score INTEGER NOT NULL,
+        severity TEXT NOT NULL,
+        recommendations TEXT NOT NULL
+    )
+    ''',
+]
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def lookup(assessment_type, score):
+    """Return the Band covering ``score``, clamping out-of-range scores."""
+    bands = CATALOG[assessment_type]
+    index = bisect.bisect_left(_UPPER_BOUNDS[assessment_type], score)
+    return bands[min(index, len(bands) - 1)]
+
+
+def as_dict(band):
+    return {'severity': band.severity, 'recommendations': list(band.recommendations)}
+
+
+def init_schema(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+    conn.executemany('''
+        INSERT OR REPLACE INTO recommendation_bands
+            (id, catalog_version, assessment_type, min_score, max_score, severity, recommendations)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [(band.id, CATALOG_VERSION, kind, band.min_score, band.max_score,
+           band.severity, json.dumps(band.recommendations))
+          for kind, bands in CATALOG.items() for band in bands])
+
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(assessments)')]
+    if 'band_id' not in columns:
+        conn.execute('ALTER TABLE assessments ADD COLUMN band_id INTEGER REFERENCES recommendation_bands(id)')
+    return migrate_assessments(conn)
+
+
+def migrate_assessments(conn):
+    """Point legacy rows at their band and drop the stored str(dict) copy.
+
+    Returns the number of rows migrated.
+    """
+    migrated = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, assessment_type, score FROM assessments
+            WHERE band_id IS NULL
+            LIMIT ?
+        ''', (MIGRATION_BATCH_SIZE,)).fetchall()
+        if not rows:
+            return migrated
+        conn.executemany(
+            'UPDATE assessments SET band_id = ?, recommendation = NULL WHERE id = ?',
+            [(lookup(row[1], row[2]).id, row[0]) for row in rows])
+        migrated += len(rows)
@@ -0,0 +1,212 @@
+"""Crisis-language detection for the chat safety gate.
+
+Phrases come from a versioned JSON lexicon (see safety_lexicon.json) and are
+compiled once into an Aho-Corasick automaton, so checking a message costs one
+pass over its characters however many phrases there are. Messages and
+phrases go through the same normalization: compatibility forms folded,
+accents and case dropped, common digit/symbol substitutions undone, runs of
+punctuation and whitespace turned into one space, and spaced-out letters
+("s u i c i d e") joined. Phrases are padded with spaces, so they only match
+whole words; a trailing ``*`` makes a phrase a prefix ("suicid*").
+
+SafetyGate watches the lexicon file and swaps in a rebuilt matcher when it
+changes; a lexicon that fails to load is logged and the previous one kept.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque, namedtuple
+
+Match = namedtuple('Match', 'phrase category language start end')
+
+_COMBINING = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]')
+_SUBSTITUTIONS = {'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'}
+_UNICODE_FOLD = str.maketrans(_SUBSTITUTIONS)
+# ASCII fast path in one bytes.translate: lowercase, substitutions, the rest of
+# the non-alphanumerics to spaces
+_ASCII_FOLD = bytes(
+    [ord(_SUBSTITUTIONS.get(chr(c), chr(c).lower() if chr(c).isalnum() else ' ')) for c in range(128)]
+    + list(range(128, 256)))
+_SEPARATORS = re.compile(r'[\W_]+')
+# Four or more single characters separated by single spaces, in padded text
+_SPACED_LETTERS = re.compile(r' (?:\w ){4,}')
+
+logger = logging.getLogger(__name__)
+
+
+def _join_letters(match):
+    return f" {match.group().replace(' ', '')} "
+
+
+def normalize(text):
+    """Fold ``text`` to the form phrases are matched in, padded with spaces."""
+    if text.isascii():
+        text = text.encode().translate(_ASCII_FOLD).decode()
+    else:
+        text = _COMBINING.sub('', unicodedata.normalize('NFKD', text))
+        text = _SEPARATORS.sub(' ', text.casefold().translate(_UNICODE_FOLD))
+    return _SPACED_LETTERS.sub(_join_letters, f" {' '.join(text.split())} ")
+
+
+class Automaton:
+    """Aho-Corasick automaton over the characters of ``keys``."""
+
+    def __init__(self, keys):
+        goto, fail, out = [{}], [0], [[]]
+        for index, key in enumerate(keys):
+            state = 0
+            for ch in key:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    out.append([])
+                state = nxt
+            out[state].append(index)
+
+        # Breadth-first, so every fail target is finished before it is used
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                target = fail[state]
+                while target and ch not in goto[target]:
+                    target = fail[target]
+                fail[nxt] = goto[target].get(ch, 0)
+                out[nxt] += out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = [tuple(indices) for indices in out]
+
+    def __len__(self):
+        return len(self._goto)
+
+    def find(self, text):
+        """Yield ``(key_index, end)`` for every occurrence of every key."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for pos, ch in enumerate(text):
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if out[state]:
+                for index in out[state]:
+                    yield index, pos + 1
+
+
+def lexicon_phrases(lexicon):
+    """Yield ``(phrase, category, language)`` for every phrase in a lexicon dict."""
+    for category, languages in lexicon['categories'].items():
+        for language, phrases in languages.items():
+            for phrase in phrases:
+                yield phrase, category, language
+
+
+class SafetyMatcher:
+    def __init__(self, lexicon):
+        self.version = str(lexicon['version'])
+        self._terms = []
+        self._spans = []
+        keys = []
+        for phrase, category, language in lexicon_phrases(lexicon):
+            prefix = phrase.endswith('*')
+            words = normalize(phrase.rstrip('*')).strip()
+            if not words:
+                continue
+            # "self harm" also matches "selfharm" (and "#selfharm")
+            for variant in dict.fromkeys((words, words.replace(' ', ''))):
+                keys.append(f' {variant}' if prefix else f' {variant} ')
+                self._terms.append((phrase, category, language))
+                # Phrase length and trailing padding, to recover offsets from a key's end
+                self._spans.append((len(variant), 0 if prefix else 1))
+        self.patterns = len(keys)
+        self._automaton = Automaton(keys)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def scan(self, text):
+        """Return the Match for every lexicon phrase found in ``text``.
+
+        Offsets refer to the normalized text; each phrase is reported once.
+        """
+        normalized = normalize(text)
+        matches = {}
+        for index, end in self._automaton.find(normalized):
+            term = self._terms[index]
+            if term not in matches:
+                length, padding = self._spans[index]
+                stop = end - padding
+                matches[term] = Match(*term, stop - length, stop)
+        return list(matches.values())
+
+
+class SafetyGate:
+    """The matcher for a lexicon file, rebuilt when the file changes.
+
+    The file is checked at most every ``check_interval`` seconds (0 disables
+    reloading). A lexicon that fails to load at startup raises; later
+    failures are logged and the last good matcher stays in use.
+    """
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.matcher = SafetyMatcher.from_file(path)
+        self._stamp = self._file_stamp()
+        self._next_check = time.monotonic() + check_interval
+        self._reload_lock = threading.Lock()
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """Rebuild the matcher from the file; returns True if it was replaced."""
+        try:
+            # Taken first so a broken file is reported once, not on every check
+            self._stamp = self._file_stamp()
+            matcher = SafetyMatcher.from_file(self.path)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            logger.exception('Could not load safety lexicon %s; keeping version %s',
+                             self.path, self.matcher.version)
+            return False
+        previous, self.matcher = self.matcher, matcher
+        logger.info('Loaded safety lexicon %s version %s (%d patterns, was %s)',
+                    self.path, matcher.version, matcher.patterns, previous.version)
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if not self.check_interval or now < self._next_check:
+            return
+        # One thread checks and rebuilds; the others keep using the current matcher
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.check_interval
+            try:
+                changed = self._file_stamp() != self._stamp
+            except OSError:
+                changed = False
+            if changed:
+                self.reload()
+        finally:
+            self._reload_lock.release()
+
+    def scan(self, text):
+        """Return ``(lexicon_version, matches)`` for ``text``."""
+        self._maybe_reload()
+        matcher = self.matcher
+        return matcher.version, matcher.scan(text)
@@ -0,0 +1,106 @@
+"""The database schema, in one place.
+
+``init_db`` creates whatever is missing and runs pending migrations, so it
+is safe to run on every boot; create_app() runs it once per process and
+``python init_db.py`` runs it by hand.
+"""
+import re
+
+import conversation_store
+import mood_rollups
+import mood_search
+import population_rollups
+import recommendations
+import screenings
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS assessments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        assessment_type TEXT NOT NULL,
+        score INTEGER NOT NULL CHECK(score >= 0),
+        recommendation TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS mood_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        mood INTEGER NOT NULL CHECK(mood BETWEEN 1 AND 5),
+        notes TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_assessments_user ON assessments (user_id)',
+    # Serves per-user history ordered by time; supersedes idx_mood_user
+    'CREATE INDEX IF NOT EXISTS idx_mood_user_timestamp ON mood_entries (user_id, timestamp)',
+    'DROP INDEX IF EXISTS idx_mood_user',
+]
+
+
+def init_schema(conn):
+    """Apply the schema and migrations; returns the number of migrated assessments."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    # Idempotency key sent by offline clients replaying /api/mood/batch
+    mood_columns = [row[1] for row in conn.execute('PRAGMA table_info(mood_entries)')]
+    if 'client_key' not in mood_columns:
+        conn.execute('ALTER TABLE mood_entries ADD COLUMN client_key TEXT')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_mood_user_client_key
+        ON mood_entries (user_id, client_key) WHERE client_key IS NOT NULL
+    ''')
+    drop_assessment_type_check(conn)
+    mood_rollups.init_schema(conn)
+    mood_search.init_schema(conn)
+    conversation_store.init_schema(conn)
+    screenings.init_schema(conn)
+    migrated = recommendations.init_schema(conn)
+    # Needs every assessment's band_id, so it runs after the recommendations migration
+    population_rollups.init_schema(conn)
+    return migrated
+
+
+def drop_assessment_type_check(conn):
+    """Rebuild assessments without the old phq9/gad7 CHECK.
+
+    The questionnaire registry decides which types exist now; SQLite cannot
+    drop a constraint in place, so the table is copied under its stored
+    definition minus the CHECK.
+    """
+    sql = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'assessments'").fetchone()[0]
+    stripped = re.sub(r'\s*CHECK\s*\(\s*assessment_type\s+IN\s*\([^)]*\)\s*\)', '', sql)
+    if stripped == sql:
+        return
+    indexes = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'assessments' AND sql IS NOT NULL")]
+    conn.execute(re.sub(r'\bassessments\b', 'assessments_new', stripped, count=1))
+    conn.execute('INSERT INTO assessments_new SELECT * FROM assessments')
+    conn.execute('DROP TABLE assessments')
+    conn.execute('ALTER TABLE assessments_new RENAME TO assessments')
+    for index in indexes:
+        conn.execute(index)
+
+
+def init_db(conn):
+    """Run init_schema in one transaction, then compact the file if rows were migrated."""
+    with conn:
+        migrated = init_schema(conn)
+    if migrated:
+        # Reclaim the space freed by dropping the stored recommendation copies
+        conn.execute('VACUUM')
+    return migrated
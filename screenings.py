@@ -0,0 +1,60 @@
+"""Stored results of bulk-scored screening uploads.
+
+Each upload is a batch owned by the account that sent it; its rows are the
+clinic's respondents, not the account's own assessments, so they live apart
+from the ``assessments`` table and its history views.
+"""
+import json
+
+RESULT_COLUMNS = ('respondent', 'score', 'band_id', 'severity', 'flags')
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS screening_batches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        questionnaire TEXT NOT NULL,
+        format TEXT NOT NULL,
+        responses INTEGER NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_screening_batches_user ON screening_batches (user_id)',
+    '''
+    CREATE TABLE IF NOT EXISTS screenings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        batch_id INTEGER NOT NULL,
+        respondent TEXT NOT NULL,
+        answers TEXT NOT NULL,
+        score INTEGER NOT NULL,
+        band_id INTEGER NOT NULL,
+        flags TEXT,
+        FOREIGN KEY (batch_id) REFERENCES screening_batches (id),
+        FOREIGN KEY (band_id) REFERENCES recommendation_bands (id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_screenings_batch ON screenings (batch_id)',
+]
+
+
+def init_schema(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def store(conn, user_id, questionnaire, fmt, answers, results):
+    """Insert one batch; ``answers`` are per-row lists, ``results`` result tuples.
+
+    Returns the batch id.
+    """
+    batch_id = conn.execute('''
+        INSERT INTO screening_batches (user_id, questionnaire, format, responses)
+        VALUES (?, ?, ?, ?)
+    ''', (user_id, questionnaire, fmt, len(results))).lastrowid
+    conn.executemany('''
+        INSERT INTO screenings (batch_id, respondent, answers, score, band_id, flags)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', ((batch_id, respondent, json.dumps(row), total, band_id, ','.join(flags) or None)
+          for row, (respondent, total, band_id, _, flags) in zip(answers, results)))
+    return batch_id
@@ -0,0 +1,227 @@
+"""Server-side sessions behind an opaque id cookie.
+
+Flask's default session serializes everything into a signed cookie that is
+uploaded and verified on every request. Here the cookie only carries a random
+session id; the data lives in a store (SQLite by default) with an in-process
+LRU in front of it. Sessions are loaded lazily, so requests that never touch
+``session`` never reach the store, and only modified sessions are written.
+
+Clearing a session (login and logout both do) gives it a fresh id on save,
+so an id seen before login is never promoted to an authenticated session.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+
+import db
+
+
+class SQLiteSessionStore:
+    """Sessions in their own SQLite file, fronted by a per-process LRU.
+
+    Every save gives the row a new random ``version``. The file is separate
+    from the app database, so ``PRAGMA data_version`` changes only when
+    another process writes a session. Until it does, cached entries are
+    served as they are. After a change, each entry re-reads its own row's
+    version the next time it is used, and is reloaded only if that row
+    changed. The LRU holds the serialized data, so every load returns a
+    fresh copy.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    '''
+    SWEEP_INTERVAL = 300
+
+    def __init__(self, database, cache_size=1024):
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._conn = db.connect(database)
+        self._conn.execute(self.SCHEMA)
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(sessions)')}
+        if 'version' not in columns:
+            self._conn.execute('ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)')
+        self._conn.commit()
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def _read_data_version(self):
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _remember(self, sid, entry):
+        self._cache[sid] = entry
+        self._cache.move_to_end(sid)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _fresh(self, sid, entry, data_version):
+        """The cached entry if its row is unchanged, else None; marks it checked."""
+        payload, expires_at, version, checked = entry
+        if checked == data_version:
+            return entry
+        row = self._conn.execute('SELECT version FROM sessions WHERE id = ?', (sid,)).fetchone()
+        if row is None or row['version'] != version:
+            return None
+        entry = (payload, expires_at, version, data_version)
+        self._cache[sid] = entry
+        return entry
+
+    def load(self, sid):
+        """Return ``(data, expires_at)`` or None if unknown or expired."""
+        now = time.time()
+        with self._lock:
+            data_version = self._read_data_version()
+            entry = self._cache.get(sid)
+            if entry is not None:
+                entry = self._fresh(sid, entry, data_version)
+            if entry is not None:
+                self.hits += 1
+                self._cache.move_to_end(sid)
+            else:
+                self.misses += 1
+                row = self._conn.execute(
+                    'SELECT data, expires_at, version FROM sessions WHERE id = ?', (sid,)).fetchone()
+                if row is None:
+                    self._cache.pop(sid, None)
+                    return None
+                entry = (row['data'], row['expires_at'], row['version'], data_version)
+                self._remember(sid, entry)
+        payload, expires_at = entry[:2]
+        if expires_at <= now:
+            return None
+        return session_json_serializer.loads(payload), expires_at
+
+    def save(self, sid, data, expires_at):
+        payload = session_json_serializer.dumps(data)
+        # Random rather than a counter, so a deleted and re-created row never
+        # repeats the version another process has cached
+        version = secrets.randbits(62)
+        with self._lock, self._conn:
+            self._conn.execute('''
+                INSERT INTO sessions (id, data, expires_at, version) VALUES (?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    data = excluded.data, expires_at = excluded.expires_at, version = excluded.version
+            ''', (sid, payload, expires_at, version))
+            self._remember(sid, (payload, expires_at, version, self._read_data_version()))
+            self._sweep()
+
+    def delete(self, sid):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM sessions WHERE id = ?', (sid,))
+            self._cache.pop(sid, None)
+
+    def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        self._conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'cached': len(self._cache)}
+
+
+class ServerSession(SessionMixin):
+    def __init__(self, store, sid=None):
+        self.store = store
+        self.sid = sid
+        self.expires_at = None
+        self.modified = False
+        self.regenerate = False
+        self._data = None
+
+    @property
+    def data(self):
+        if self._data is None:
+            loaded = self.store.load(self.sid) if self.sid else None
+            if loaded is None:
+                self._data = {}
+            else:
+                self._data, self.expires_at = loaded
+            self.accessed = True
+        return self._data
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self.data[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+        self.modified = True
+        self.regenerate = True
+
+
+class ServerSessionInterface(SessionInterface):
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        # Only remember the id here; the store is read on first access
+        return ServerSession(self.store, request.cookies.get(self.get_cookie_name(app)))
+
+    def save_session(self, app, session, response):
+        if not session.loaded:
+            return
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        response.vary.add('Cookie')
+
+        if not session:
+            # Logged out, or the cookie names a session that no longer exists
+            if session.sid:
+                if session.expires_at is not None:
+                    self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        # Unmodified sessions are only rewritten once half their lifetime is used
+        stale = session.expires_at is None or session.expires_at - now < lifetime / 2
+        if not (session.modified or stale):
+            return
+
+        sid = session.sid
+        # Never adopt an id the store did not issue, and rotate after clear()
+        if sid is None or session.regenerate or session.expires_at is None:
+            if sid is not None:
+                self.store.delete(sid)
+            sid = secrets.token_urlsafe(32)
+        self.store.save(sid, dict(session), now + lifetime)
+        response.set_cookie(name, sid, expires=self.get_expiration_time(app, session),
+                            httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                            secure=self.get_cookie_secure(app),
+                            samesite=self.get_cookie_samesite(app))